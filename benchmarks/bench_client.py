@@ -0,0 +1,98 @@
+"""Per-page latency benchmark: one AsyncClient per page vs the pooled client.
+
+Usage:
+    uv run python benchmarks/bench_client.py [pages] [page_size]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+
+def load_dotenv(path: str = ".env") -> None:
+    if not os.path.isfile(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            key = key.strip()
+            value = value.strip().strip("'").strip('"')
+            if key and key not in os.environ:
+                os.environ[key] = value
+
+
+load_dotenv()
+
+import httpx
+
+from nightscout_mcp import server as ns
+
+
+def _page_params(page: int, page_size: int) -> dict:
+    # Consecutive one-day windows walking back from now
+    now = int(datetime.now(timezone.utc).timestamp() * 1000)
+    end_ts = now - page * 86400000
+    return {
+        "count": page_size,
+        "find[date][$gte]": end_ts - 86400000,
+        "find[date][$lt]": end_ts,
+        "find[type]": "sgv",
+    }
+
+
+async def _bench_fresh_client(pages: int, page_size: int) -> list[float]:
+    client = ns.NightscoutClient()
+    url = f"{client.base_url}/api/v1/entries"
+    timings = []
+    for page in range(pages):
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=ns.HTTP_TIMEOUT) as http:
+            await client._get_json_with_fallback(http, url, _page_params(page, page_size))
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def _bench_pooled_client(pages: int, page_size: int) -> list[float]:
+    client = ns.NightscoutClient()
+    timings = []
+    try:
+        for page in range(pages):
+            started = time.perf_counter()
+            await client.fetch("/api/v1/entries", _page_params(page, page_size))
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        await client.aclose()
+    return timings
+
+
+def _report(label: str, timings: list[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{label:14} pages={len(timings):3}  "
+        f"first={timings[0]:8.1f} ms  "
+        f"mean={statistics.mean(timings):8.1f} ms  "
+        f"p50={statistics.median(timings):8.1f} ms  "
+        f"p95={p95:8.1f} ms"
+    )
+
+
+def main() -> None:
+    if not os.environ.get("NIGHTSCOUT_URL"):
+        raise SystemExit("Missing NIGHTSCOUT_URL in environment.")
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 288
+
+    print(f"Per-page latency, {pages} pages x {page_size} entries (HTTP/2: {ns.HTTP2})\n")
+    _report("fresh client", asyncio.run(_bench_fresh_client(pages, page_size)))
+    _report("pooled client", asyncio.run(_bench_pooled_client(pages, page_size)))
+
+
+if __name__ == "__main__":
+    main()
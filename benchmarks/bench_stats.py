@@ -0,0 +1,108 @@
+"""Statistics benchmark and parity check: pure Python vs the NumPy fast path.
+
+Every run first checks that both paths produce exactly the same stats as
+the reference multi-pass formulas, for several TIR ranges, then times them.
+
+Usage:
+    uv run --extra fast python benchmarks/bench_stats.py [sizes...]
+"""
+
+import random
+import sys
+import time
+
+from nightscout_mcp import server as ns
+from nightscout_mcp import stats as stats_module
+
+TIR_RANGES = [
+    (70, 140),
+    (3.9 * 18.0182, 10.0 * 18.0182),
+    (70, 180),
+    (80, 260),
+]
+
+
+def reference_stats(sgv_values: list[int], low: float, high: float) -> dict:
+    """Multi-pass formulas, kept as the source of truth for parity."""
+    n = len(sgv_values)
+    avg = sum(sgv_values) / n
+    variance = sum((v - avg) ** 2 for v in sgv_values) / n
+    std_dev = variance ** 0.5
+    cv = (std_dev / avg * 100) if avg > 0 else 0
+    return {
+        "count": n,
+        "avg": round(avg, 1),
+        "avg_formatted": ns.format_glucose_short(avg),
+        "std_dev": round(std_dev, 1),
+        "std_dev_formatted": ns.format_glucose_short(std_dev),
+        "cv": round(cv, 1),
+        "min": min(sgv_values),
+        "max": max(sgv_values),
+        "tir": round(sum(1 for v in sgv_values if low <= v <= high) / n * 100, 1),
+        "very_low_pct": round(sum(1 for v in sgv_values if v < 54) / n * 100, 1),
+        "low_pct": round(sum(1 for v in sgv_values if 54 <= v < 70) / n * 100, 1),
+        "above_target_pct": round(sum(1 for v in sgv_values if high < v <= 180) / n * 100, 1),
+        "high_pct": round(sum(1 for v in sgv_values if 180 < v <= 250) / n * 100, 1),
+        "very_high_pct": round(sum(1 for v in sgv_values if v > 250) / n * 100, 1),
+        "a1c": round((avg + 46.7) / 28.7, 1),
+    }
+
+
+def synthetic_values(n: int, seed: int = 42) -> list[int]:
+    rng = random.Random(seed)
+    values = []
+    level = 120.0
+    for _ in range(n):
+        level += rng.gauss(0, 4) + (130 - level) * 0.02
+        level = min(max(level, 40), 420)
+        values.append(int(round(level)))
+    return values
+
+
+def with_numpy(enabled: bool, saved=stats_module.np):
+    stats_module.np = saved if enabled else None
+
+
+def check_parity(values: list[int]) -> None:
+    for low, high in TIR_RANGES:
+        expected = reference_stats(values, low, high)
+        for enabled in (False, True):
+            with_numpy(enabled)
+            got = ns.calculate_stats(values, low, high)
+            mismatched = {k: (v, got[k]) for k, v in expected.items() if got[k] != v}
+            if mismatched:
+                path = "numpy" if enabled else "python"
+                raise SystemExit(f"Parity failure ({path}, n={len(values)}, TIR {low:.1f}-{high:.1f}): {mismatched}")
+    with_numpy(True)
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 100_000, 1_000_000]
+    if stats_module.np is None:
+        print("NumPy is not installed; install the `fast` extra to compare paths.\n")
+
+    print(f"{'readings':>10} │ {'reference':>10} │ {'python':>10} │ {'numpy':>10}")
+    for n in sizes:
+        values = synthetic_values(n)
+        check_parity(values)
+        repeat = 5 if n <= 100_000 else 2
+        reference = timed(lambda: reference_stats(values, ns.GLUCOSE_LOW, ns.GLUCOSE_HIGH), repeat)
+        with_numpy(False)
+        python = timed(lambda: ns.calculate_stats(values), repeat)
+        with_numpy(True)
+        fast = timed(lambda: ns.calculate_stats(values), repeat) if stats_module.np is not None else float("nan")
+        print(f"{n:>10,} │ {reference:>8.1f}ms │ {python:>8.1f}ms │ {fast:>8.1f}ms")
+    print("\nParity: OK")
+
+
+if __name__ == "__main__":
+    main()
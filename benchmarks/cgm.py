@@ -0,0 +1,242 @@
+"""Synthetic CGM data: realistic 5-minute series, treatments and device status.
+
+Readings are kept in typed arrays so that years of data fit in a few MB;
+full Nightscout documents are rendered on demand.
+
+The series has meal peaks and a dawn rise, random signal losses, a
+warm-up gap at every sensor change, night-time compression lows,
+occasional sensor error codes and a second uploader that re-uploads part
+of the readings with its own ids and a few seconds of offset.
+"""
+
+import math
+import random
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+INTERVAL_MS = 5 * 60 * 1000
+DAY_MS = 86400000
+HOUR_MS = 3600000
+# srvModified is the reading date plus this upload delay
+UPLOAD_LAG_MS = 30 * 1000
+
+UPLOADERS = ("xDrip-DexcomG6", "AndroidAPS-DexcomG6")
+DIRECTIONS = (
+    "DoubleUp", "SingleUp", "FortyFiveUp", "Flat",
+    "FortyFiveDown", "SingleDown", "DoubleDown", "NOT COMPUTABLE",
+)
+NOT_COMPUTABLE = DIRECTIONS.index("NOT COMPUTABLE")
+# Dexcom error codes stored as sgv
+SENSOR_ERRORS = (1, 5, 9, 10)
+MEALS = ((7.5, 60), (13.0, 75), (19.0, 70))  # (hour, carbs g)
+SENSOR_DAYS = 10
+WARMUP_MS = 2 * HOUR_MS
+
+
+def iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def direction_code(rate: float) -> int:
+    """Trend code for a rate of change in mg/dL per minute."""
+    for code, limit in enumerate((3, 2, 1, -1, -2, -3)):
+        if rate > limit:
+            return code
+    return DIRECTIONS.index("DoubleDown")
+
+
+class Dataset:
+    """`days` of synthetic data ending at `end_ms`, reproducible from `seed`."""
+
+    def __init__(self, days: float, end_ms: int, seed: int = 1, second_uploader: float = 0.1):
+        self.days = days
+        self.end_ms = end_ms - end_ms % INTERVAL_MS
+        self.start_ms = self.end_ms - int(days * DAY_MS)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # Entry columns, sorted by date
+        self.dates = array("q")
+        self.sgv = array("H")
+        self.delta = array("h")
+        self.directions = array("b")
+        self.uploader = array("b")
+        self.serial = array("l")
+        # Treatments, sorted by date
+        self.treatments: list[dict] = []
+        self.treatment_dates: list[int] = []
+        self._generate(second_uploader)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    # Generation
+
+    def _meal_effect(self, ts: int) -> float:
+        hour = (ts % DAY_MS) / HOUR_MS
+        effect = 0.0
+        for meal_hour, carbs in MEALS:
+            t = hour - meal_hour
+            if t < 0:
+                t += 24
+            if t < 4:
+                # Rise over ~1 hour, decay over the next three
+                effect += carbs * 1.1 * (t / 1.0) * math.exp(1 - t / 1.0)
+        # Dawn phenomenon
+        effect += 20 * math.exp(-((hour - 6) ** 2) / 2)
+        return effect
+
+    def _generate(self, second_uploader: float) -> None:
+        """Fill the columns; second_uploader is the share of time both uploaders run."""
+        rng = self.rng
+        # Dual-upload episodes last 39 readings on average
+        dual_start = second_uploader / (39 * (1 - second_uploader)) if second_uploader < 1 else 1.0
+        rows = []
+        level = 0.0
+        gap_until = 0
+        compression_until = 0
+        compression_depth = 0.0
+        dual_until = 0
+        previous = {}
+        serial = 0
+        for ts in range(self.start_ms, self.end_ms, INTERVAL_MS):
+            since_sensor = (ts - self.start_ms) % (SENSOR_DAYS * DAY_MS)
+            if since_sensor < WARMUP_MS:
+                continue
+            if ts < gap_until:
+                continue
+            if rng.random() < 0.002:
+                # Signal loss: 10 minutes to 1.5 hours, rarely a day or two
+                gap_until = ts + (rng.randint(1, 2) * DAY_MS if rng.random() < 0.005 else rng.randint(2, 18) * INTERVAL_MS)
+                continue
+            level = level * 0.97 + rng.gauss(0, 6)
+            value = 110 + self._meal_effect(ts) + level
+            hour = (ts % DAY_MS) / HOUR_MS
+            if hour < 6 and ts >= compression_until and rng.random() < 0.002:
+                compression_until = ts + rng.randint(4, 9) * INTERVAL_MS
+                compression_depth = rng.uniform(40, 80)
+            if ts < compression_until:
+                value = min(value, 45 + compression_depth * 0.3 + rng.uniform(-3, 3))
+            value = int(round(min(max(value, 40), 400)))
+            if rng.random() < 0.001:
+                value = rng.choice(SENSOR_ERRORS)
+            if ts >= dual_until and rng.random() < dual_start:
+                dual_until = ts + rng.randint(6, 72) * INTERVAL_MS
+            uploaders = (0, 1) if ts < dual_until else (0,)
+            for uploader in uploaders:
+                date = ts + (rng.randint(1000, 20000) if uploader else rng.randint(0, 500))
+                last = previous.get(uploader)
+                if last is None or value < 39 or last[1] < 39:
+                    delta, code = 0, NOT_COMPUTABLE
+                else:
+                    delta = value - last[1]
+                    code = direction_code(delta / ((date - last[0]) / 60000))
+                previous[uploader] = (date, value)
+                rows.append((date, value, delta, code, uploader, serial))
+                serial += 1
+            self._treatments_at(ts)
+        rows.sort()
+        for date, value, delta, code, uploader, n in rows:
+            self.dates.append(date)
+            self.sgv.append(value)
+            self.delta.append(delta)
+            self.directions.append(code)
+            self.uploader.append(uploader)
+            self.serial.append(n)
+        self.treatments.sort(key=lambda t: t["date"])
+        self.treatment_dates = [t["date"] for t in self.treatments]
+
+    def _treatments_at(self, ts: int) -> None:
+        rng = self.rng
+        minute = (ts % DAY_MS) // 60000
+        for meal_hour, carbs in MEALS:
+            if minute == int(meal_hour * 60) - 10:
+                grams = max(10, int(rng.gauss(carbs, 15)))
+                self._add_treatment(ts, "Meal Bolus", insulin=round(grams / 10, 1), carbs=grams)
+        if minute % 120 == 0:
+            self._add_treatment(ts, "Temp Basal", absolute=round(rng.uniform(0.3, 1.5), 2), duration=30)
+        if rng.random() < 0.003:
+            self._add_treatment(ts, "Correction Bolus", insulin=round(rng.uniform(0.5, 3), 1))
+        if minute == 21 * 60 and rng.random() < 0.3:
+            self._add_treatment(ts, "Carb Correction", carbs=rng.randint(10, 25))
+
+    def _add_treatment(self, ts: int, event_type: str, **fields) -> None:
+        doc = {
+            "_id": f"{self.seed:04x}{len(self.treatments) + 1:020x}",
+            "eventType": event_type,
+            "created_at": iso(ts),
+            "date": ts,
+            "enteredBy": "AndroidAPS",
+        }
+        doc.update(fields)
+        self.treatments.append(doc)
+
+    # Documents
+
+    def entry(self, i: int) -> dict:
+        """Entry i as a full Nightscout document."""
+        date = self.dates[i]
+        return {
+            "_id": f"{self.seed:04x}{self.uploader[i]:02x}{self.serial[i]:018x}",
+            "device": UPLOADERS[self.uploader[i]],
+            "date": date,
+            "dateString": iso(date),
+            "sgv": self.sgv[i],
+            "delta": self.delta[i],
+            "direction": DIRECTIONS[self.directions[i]],
+            "type": "sgv",
+            "filtered": self.sgv[i] * 1000,
+            "unfiltered": self.sgv[i] * 1000,
+            "rssi": 100,
+            "noise": 1,
+            "sysTime": iso(date),
+            "utcOffset": 0,
+            "srvModified": date + UPLOAD_LAG_MS,
+            "srvCreated": date + UPLOAD_LAG_MS,
+        }
+
+    def entry_range(self, start_ms: int | None = None, end_ms: int | None = None) -> range:
+        """Indexes of entries in [start_ms, end_ms), newest first."""
+        lo = 0 if start_ms is None else bisect_left(self.dates, start_ms)
+        hi = len(self.dates) if end_ms is None else bisect_left(self.dates, end_ms)
+        return range(hi - 1, lo - 1, -1)
+
+    def treatment_range(self, start_ms: int | None = None, end_ms: int | None = None) -> list[dict]:
+        """Treatments in [start_ms, end_ms), newest first."""
+        lo = 0 if start_ms is None else bisect_left(self.treatment_dates, start_ms)
+        hi = len(self.treatments) if end_ms is None else bisect_right(self.treatment_dates, end_ms - 1)
+        return self.treatments[lo:hi][::-1]
+
+    def devicestatus(self, count: int) -> list[dict]:
+        """The `count` most recent device status records, newest first."""
+        docs = []
+        for k in range(count):
+            ts = self.end_ms - k * INTERVAL_MS
+            hours = (ts - self.start_ms) / HOUR_MS
+            docs.append({
+                "_id": f"{self.seed:04x}ds{k:018x}",
+                "device": "openaps://AndroidAPS",
+                "created_at": iso(ts),
+                "uploader": {"battery": 100 - int(hours * 2) % 80},
+                "pump": {
+                    "clock": iso(ts),
+                    "reservoir": round(200 - (hours % 72) * 2.5, 1),
+                    "battery": {"percent": 100 - int(hours / 24) % 100},
+                    "status": {"status": "normal", "timestamp": iso(ts)},
+                },
+            })
+        return docs
+
+    def status(self, now_ms: int) -> dict:
+        return {
+            "status": "ok",
+            "name": "nightscout-standin",
+            "version": "15.0.2",
+            "serverTime": iso(now_ms),
+            "serverTimeEpoch": now_ms,
+            "apiEnabled": True,
+            "settings": {
+                "units": "mg/dl",
+                "thresholds": {"bgHigh": 260, "bgTargetTop": 180, "bgTargetBottom": 80, "bgLow": 55},
+            },
+        }
@@ -0,0 +1,61 @@
+"""Compare two benchmark result files written by benchmarks/run.py.
+
+Prints the change of every timing and request count per scenario and
+exits with status 1 if any timing got slower by more than the threshold.
+
+Usage:
+    uv run python benchmarks/compare.py BASE.json NEW.json [--threshold 20] [--min-ms 1]
+"""
+
+import argparse
+import json
+import sys
+
+TIMINGS = ("cold_ms", "warm_ms", "cached_ms")
+COUNTS = ("cold_requests", "warm_requests")
+
+
+def load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {s["name"]: s for s in report["scenarios"]}
+
+
+def change(base: float, new: float) -> float:
+    return (new - base) / base * 100 if base else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=20, help="regression threshold, %% (default 20)")
+    parser.add_argument("--min-ms", type=float, default=1, help="ignore timings below this many ms in both runs (default 1)")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    regressions = []
+    print(f"{'scenario':28} │ {'cold':>18} │ {'warm':>18} │ {'cached':>18} │ requests")
+    for name, b in base.items():
+        n = new.get(name)
+        if n is None:
+            continue
+        cells = []
+        for key in TIMINGS:
+            pct = change(b[key], n[key])
+            flag = ""
+            if pct > args.threshold and max(b[key], n[key]) >= args.min_ms:
+                flag = " !"
+                regressions.append(f"{name} {key}")
+            cells.append(f"{n[key]:8.1f}ms {pct:+5.0f}%{flag:2}")
+        requests = " ".join(f"{b[k]}→{n[k]}" for k in COUNTS)
+        print(f"{name:28} │ " + " │ ".join(cells) + f" │ {requests}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:g}%: " + ", ".join(regressions))
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
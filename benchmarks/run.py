@@ -0,0 +1,215 @@
+"""Timed tool scenarios against the local Nightscout stand-in.
+
+Generates a synthetic dataset (5 years by default), serves it with the
+stand-in and calls every tool over ranges from 6 hours to 5 years. Each
+scenario is timed three ways:
+
+- cold: new client, empty on-disk caches, empty response cache
+- warm: same client and on-disk caches, response cache cleared
+- cached: repeated call answered by the response cache
+
+Results are printed and written as JSON; compare two runs with
+benchmarks/compare.py. NIGHTSCOUT_* settings from the environment apply,
+so configurations can be compared (e.g. NIGHTSCOUT_STORE=true).
+
+Usage:
+    uv run python benchmarks/run.py [--days 1830] [--latency 20] [--jitter 5] [--v1]
+                                    [--slow-rate 0.05 --slow-ms 1000] [--error-rate 0.02]
+                                    [--repeat 3] [--only analyze] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from cgm import Dataset
+from standin import StandIn
+
+DAY = 1.0
+NOW_YEAR = datetime.now(timezone.utc).year
+
+# (name, tool, arguments, days of data the scenario spans)
+SCENARIOS = [
+    ("glucose_current", "glucose_current", {}, 0),
+    ("glucose_history_6h", "glucose_history", {"hours": 6}, 0.25),
+    ("glucose_history_24h", "glucose_history", {"hours": 24}, DAY),
+    ("analyze_7d", "analyze", {"from": "7d"}, 7),
+    ("analyze_30d", "analyze", {"from": "30d"}, 30),
+    ("analyze_90d", "analyze", {"from": "90d"}, 90),
+    ("analyze_1y", "analyze", {"from": "1y"}, 365),
+    ("analyze_5y", "analyze", {"from": "5y"}, 5 * 365),
+    ("analyze_monthly_this_year", "analyze_monthly", {"year": NOW_YEAR}, 365),
+    ("analyze_monthly_last_year", "analyze_monthly", {"year": NOW_YEAR - 1}, 730),
+    ("treatments_24h", "treatments", {"hours": 24}, DAY),
+    ("insulin_log_24h", "insulin_log", {"hours": 24}, DAY),
+    ("pump_reservoir", "pump_reservoir", {}, 0),
+    ("devices", "devices", {"count": 5}, 0),
+    ("status", "status", {}, 0),
+]
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Runner:
+    def __init__(self, ns, standin: StandIn, cache_dir: str, repeat: int):
+        self.ns = ns
+        self.standin = standin
+        self.cache_dir = cache_dir
+        self.repeat = repeat
+
+    async def reset(self) -> None:
+        """Fresh client and empty caches, as after a restart with a new cache dir."""
+        ns = self.ns
+        client = ns.current_client()
+        await client.aclose()
+        for db in (client.store, client.results):
+            if db is not None:
+                db.close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        ns.default_tenant.client = ns.NightscoutClient()
+        self.clear_responses()
+
+    def clear_responses(self) -> None:
+        if self.ns.responses is not None:
+            self.ns.responses.clear()
+
+    async def call(self, tool: str, arguments: dict) -> dict:
+        self.standin.reset_counters()
+        started = time.perf_counter()
+        result = await self.ns.call_tool(tool, dict(arguments))
+        elapsed = (time.perf_counter() - started) * 1000
+        text = result[0].text if result else ""
+        return {
+            "ms": elapsed,
+            "requests": self.standin.requests,
+            "bytes": self.standin.bytes_sent,
+            "error": text if text.startswith(self.ns.t("error", error="").strip()) else None,
+        }
+
+    async def scenario(self, name: str, tool: str, arguments: dict) -> dict:
+        await self.reset()
+        cold = await self.call(tool, arguments)
+        warm = []
+        cached = []
+        for _ in range(self.repeat):
+            self.clear_responses()
+            warm.append(await self.call(tool, arguments))
+            cached.append(await self.call(tool, arguments))
+        return {
+            "name": name,
+            "tool": tool,
+            "arguments": arguments,
+            "cold_ms": round(cold["ms"], 2),
+            "cold_requests": cold["requests"],
+            "cold_bytes": cold["bytes"],
+            "warm_ms": round(statistics.median(r["ms"] for r in warm), 2),
+            "warm_requests": warm[-1]["requests"],
+            "cached_ms": round(statistics.median(r["ms"] for r in cached), 3),
+            "error": cold["error"] or warm[-1]["error"],
+        }
+
+
+def print_table(results: list[dict]) -> None:
+    print(f"{'scenario':28} │ {'cold':>10} │ {'reqs':>5} │ {'warm':>9} │ {'reqs':>4} │ {'cached':>8}")
+    for r in results:
+        line = (
+            f"{r['name']:28} │ {r['cold_ms']:8.1f}ms │ {r['cold_requests']:5} │ "
+            f"{r['warm_ms']:7.1f}ms │ {r['warm_requests']:4} │ {r['cached_ms']:6.3f}ms"
+        )
+        if r["error"]:
+            line += f"  {r['error'][:60]}"
+        print(line)
+
+
+async def run_scenarios(runner: Runner, scenarios: list) -> list[dict]:
+    results = []
+    try:
+        for name, tool, arguments, _ in scenarios:
+            results.append(await runner.scenario(name, tool, arguments))
+    finally:
+        await runner.ns.current_client().aclose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the MCP tools against a local Nightscout stand-in.")
+    parser.add_argument("--days", type=float, default=1830, help="days of synthetic data (default 1830, ~5 years)")
+    parser.add_argument("--latency", type=float, default=20, help="stand-in latency per request, ms (default 20)")
+    parser.add_argument("--jitter", type=float, default=5, help="random extra latency up to this many ms (default 5)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--v1", action="store_true", help="serve API v1 only")
+    parser.add_argument("--slow-rate", type=float, default=0, help="share of stand-in responses delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=1000, help="extra delay of slow responses, ms (default 1000)")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of stand-in responses answered with 503")
+    parser.add_argument("--repeat", type=int, default=3, help="warm and cached repetitions (default 3)")
+    parser.add_argument("--only", help="run only scenarios whose name contains this text")
+    parser.add_argument("--output", help="JSON results file (default benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    print(f"Generating {args.days:g} days of synthetic CGM data...")
+    dataset = Dataset(args.days, int(time.time() * 1000), seed=args.seed)
+    scenarios = [s for s in SCENARIOS if s[3] <= args.days and (not args.only or args.only in s[0])]
+
+    cache_dir = tempfile.mkdtemp(prefix="nightscout-bench-")
+    with StandIn(
+        dataset, args.latency, args.jitter, v3=not args.v1,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms, error_rate=args.error_rate,
+    ) as standin:
+        # Configuration is read when the server module is imported
+        os.environ["NIGHTSCOUT_URL"] = standin.url
+        os.environ.pop("NIGHTSCOUT_API_SECRET", None)
+        os.environ["NIGHTSCOUT_CACHE_DIR"] = cache_dir
+        from nightscout_mcp import server as ns
+
+        print(
+            f"{len(dataset):,} entries, {len(dataset.treatments):,} treatments; "
+            f"latency {args.latency:g}+{args.jitter:g} ms, API {'v1' if args.v1 else 'v3'}\n"
+        )
+        try:
+            results = asyncio.run(run_scenarios(Runner(ns, standin, cache_dir, args.repeat), scenarios))
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    print_table(results)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "dataset": {"days": args.days, "seed": args.seed, "entries": len(dataset), "treatments": len(dataset.treatments)},
+        "standin": {
+            "latency_ms": args.latency, "jitter_ms": args.jitter, "api": "v1" if args.v1 else "v3",
+            "slow_rate": args.slow_rate, "slow_ms": args.slow_ms, "error_rate": args.error_rate,
+        },
+        "config": {k: v for k, v in sorted(os.environ.items()) if k.startswith("NIGHTSCOUT_") and k not in ("NIGHTSCOUT_URL", "NIGHTSCOUT_CACHE_DIR")},
+        "repeat": args.repeat,
+        "scenarios": results,
+    }
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Local Nightscout stand-in serving a synthetic Dataset over HTTP.
+
+Implements the parts of the Nightscout API the client relies on:
+
+- /api/v1/entries, /api/v1/entries/sgv: count, find[date][$gte|$gt|$lt|$lte], find[type]
+- /api/v1/count/entries/where: find[date][$gte|$gt|$lt|$lte], find[type]
+- /api/v1/treatments: count, find[created_at][$gte|$lt], find[insulin][$gt], find[carbs][$gt]
+- /api/v1/devicestatus: count
+- /api/v1/status
+- /api/v3/entries: limit, skip, date$gte|$gt|$lt|$lte, type$eq, sort$desc, fields
+- /api/v3/entries/history/{lastModified}: limit
+
+Every path also answers with a `.json` suffix. Each response is delayed
+by `latency_ms` plus up to `jitter_ms`, served from a thread per
+connection with HTTP/1.1 keep-alive. To exercise retries and hedging, a
+share `slow_rate` of responses can be delayed by another `slow_ms`, and a
+share `error_rate` answered with 503.
+
+Usage:
+    python benchmarks/standin.py [--days 30] [--port 8990] [--latency 50] [--v1]
+                                 [--slow-rate 0.05 --slow-ms 1000] [--error-rate 0.02]
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cgm import UPLOAD_LAG_MS, Dataset
+
+V1_DEFAULT_COUNT = 10
+V3_DEFAULT_LIMIT = 100
+V3_MAX_LIMIT = 1000
+
+
+def _number(value: str) -> float:
+    return float(value)
+
+
+def _timestamp(value: str) -> int:
+    """Epoch ms from a number or an ISO date string."""
+    try:
+        return int(float(value))
+    except ValueError:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def _bounds(query: dict, key: str, fmt: str) -> tuple[int | None, int | None]:
+    """[start, end) from $gte/$gt/$lt/$lte operators on a field."""
+    start = end = None
+    for op, value in (("$gte", 0), ("$gt", 1), ("$lt", 0), ("$lte", 1)):
+        raw = query.get(fmt.format(key=key, op=op))
+        if raw is None:
+            continue
+        ts = _timestamp(raw)
+        if op in ("$gte", "$gt"):
+            start = ts + value
+        else:
+            end = ts + value
+    return start, end
+
+
+class StandIn:
+    """HTTP stand-in for a Nightscout site backed by `dataset`."""
+
+    def __init__(
+        self,
+        dataset: Dataset,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        v3: bool = True,
+        port: int = 0,
+        slow_rate: float = 0,
+        slow_ms: float = 0,
+        error_rate: float = 0,
+    ):
+        self.dataset = dataset
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.v3 = v3
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandIn":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def __enter__(self) -> "StandIn":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # Routing
+
+    def respond(self, path: str, query: dict) -> object | None:
+        """Body for a GET, or None for 404."""
+        if path.endswith(".json"):
+            path = path[:-5]
+        ds = self.dataset
+        if path in ("/api/v1/entries", "/api/v1/entries/sgv"):
+            if query.get("find[type]", "sgv") != "sgv":
+                return []
+            start, end = _bounds(query, "date", "find[{key}][{op}]")
+            count = int(_number(query.get("count", V1_DEFAULT_COUNT)))
+            return [ds.entry(i) for i in ds.entry_range(start, end)[:count]]
+        if path == "/api/v1/count/entries/where":
+            if query.get("find[type]", "sgv") != "sgv":
+                return []
+            start, end = _bounds(query, "date", "find[{key}][{op}]")
+            return [{"_id": "sgv", "count": len(ds.entry_range(start, end))}]
+        if path == "/api/v1/treatments":
+            start, end = _bounds(query, "created_at", "find[{key}][{op}]")
+            docs = ds.treatment_range(start, end)
+            for field in ("insulin", "carbs"):
+                minimum = query.get(f"find[{field}][$gt]")
+                if minimum is not None:
+                    docs = [t for t in docs if t.get(field, 0) > _number(minimum)]
+            return docs[:int(_number(query.get("count", V1_DEFAULT_COUNT)))]
+        if path == "/api/v1/devicestatus":
+            return ds.devicestatus(int(_number(query.get("count", V1_DEFAULT_COUNT))))
+        if path == "/api/v1/status":
+            return ds.status(int(time.time() * 1000))
+        if not self.v3:
+            return None
+        if path == "/api/v3/entries":
+            if query.get("type$eq", "sgv") != "sgv":
+                return {"status": 200, "result": []}
+            start, end = _bounds(query, "date", "{key}{op}")
+            limit = min(int(_number(query.get("limit", V3_DEFAULT_LIMIT))), V3_MAX_LIMIT)
+            skip = int(_number(query.get("skip", 0)))
+            indexes = ds.entry_range(start, end)
+            if "sort" in query:
+                indexes = indexes[::-1]
+            docs = [self._v3_entry(i) for i in indexes[skip:skip + limit]]
+            return {"status": 200, "result": self._project(docs, query.get("fields"))}
+        if path.startswith("/api/v3/entries/history/"):
+            last_modified = int(path.rsplit("/", 1)[1])
+            limit = min(int(_number(query.get("limit", V3_DEFAULT_LIMIT))), V3_MAX_LIMIT)
+            indexes = ds.entry_range(last_modified - UPLOAD_LAG_MS + 1, None)[::-1]
+            docs = [self._v3_entry(i) for i in indexes[:limit]]
+            return {"status": 200, "result": self._project(docs, query.get("fields"))}
+        if path == "/api/v3/version":
+            return {"status": 200, "result": {"version": "15.0.2", "apiVersion": "3.0.4"}}
+        return None
+
+    def _v3_entry(self, i: int) -> dict:
+        doc = self.dataset.entry(i)
+        doc["identifier"] = doc["_id"]
+        doc["isValid"] = True
+        return doc
+
+    @staticmethod
+    def _project(docs: list[dict], fields: str | None) -> list[dict]:
+        if not fields or fields == "_all":
+            return docs
+        keep = fields.split(",")
+        return [{k: d[k] for k in keep if k in d} for d in docs]
+
+    def _handler(self) -> type:
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; without this, Nagle's
+            # algorithm and delayed ACKs add ~40 ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                body = standin.respond(url.path, query)
+                delay_ms = standin.latency_ms + random.uniform(0, standin.jitter_ms)
+                if standin.slow_rate and random.random() < standin.slow_rate:
+                    delay_ms += standin.slow_ms
+                if delay_ms:
+                    time.sleep(delay_ms / 1000)
+                if standin.error_rate and random.random() < standin.error_rate:
+                    data, code = b'{"status":503,"message":"Service unavailable"}', 503
+                elif body is None:
+                    data, code = b'{"status":404,"message":"Not found"}', 404
+                else:
+                    data, code = json.dumps(body, separators=(",", ":")).encode("utf-8"), 200
+                with standin._lock:
+                    standin.requests += 1
+                    standin.bytes_sent += len(data)
+                try:
+                    self.send_response(code)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (e.g. a hedged request that lost)
+                    self.close_connection = True
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve synthetic CGM data as a Nightscout stand-in.")
+    parser.add_argument("--days", type=float, default=30, help="days of data (default 30)")
+    parser.add_argument("--port", type=int, default=8990)
+    parser.add_argument("--latency", type=float, default=0, help="added latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="random extra latency up to this many ms")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--v1", action="store_true", help="serve API v1 only")
+    parser.add_argument("--slow-rate", type=float, default=0, help="share of responses delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=1000, help="extra delay of slow responses, ms (default 1000)")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of responses answered with 503")
+    args = parser.parse_args()
+
+    dataset = Dataset(args.days, int(time.time() * 1000), seed=args.seed)
+    standin = StandIn(
+        dataset, args.latency, args.jitter, v3=not args.v1, port=args.port,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms, error_rate=args.error_rate,
+    )
+    print(f"Serving {len(dataset):,} entries at {standin.url} (Ctrl+C to stop)")
+    try:
+        standin._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
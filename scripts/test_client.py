@@ -188,6 +188,13 @@ async def _call_all() -> None:
     await _call_devices()
 
 
+async def _run_and_close(fn: Callable[[], Awaitable[None]]) -> None:
+    try:
+        await fn()
+    finally:
+        await ns.current_client().aclose()
+
+
 def _read_str(prompt: str, default: str = "") -> str:
     suffix = f" [{default}]" if default else ""
     value = input(f"{prompt}{suffix}: ").strip()
@@ -233,7 +240,7 @@ def main() -> None:
             continue
         _, fn = MENU[choice]
         try:
-            asyncio.run(fn())
+            asyncio.run(_run_and_close(fn))
         except Exception as exc:
             print(t("error", error=exc))
 
@@ -0,0 +1,172 @@
+"""Caches for computed results."""
+
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from .stats import GlucoseHistogram
+from .store import DAY_MS, connect_private, default_cache_dir, site_key
+
+# Bump when the meaning of cached values changes
+RESULT_CACHE_VERSION = 1
+
+RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    counts BLOB NOT NULL,
+    overflow TEXT NOT NULL,
+    errors INTEGER NOT NULL,
+    created INTEGER NOT NULL,
+    PRIMARY KEY (start, end, version)
+);
+"""
+
+
+def results_path_for(base_url: str) -> str:
+    return os.path.join(default_cache_dir(), f"results-{site_key(base_url)}.sqlite3")
+
+
+class ResultCache:
+    """Permanent cache of glucose histograms for closed periods.
+
+    A period is immutable once it ended more than `grace_ms` ago: its
+    histogram is stored on disk and reused for any TIR thresholds and
+    display units, which are applied when the result is rendered. Periods
+    still open are never stored. Entries are dropped when the entry store
+    reports a late change to one of their days.
+    """
+
+    def __init__(self, path: str, grace_ms: int):
+        self.grace_ms = grace_ms
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        if path != ":memory:":
+            try:
+                self.db = connect_private(path)
+            except (OSError, sqlite3.Error):
+                path = ":memory:"
+        if path == ":memory:":
+            self.db = sqlite3.connect(path)
+        self.path = path
+        self.db.executescript(RESULTS_SCHEMA)
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def is_closed(self, end_ts: int, now_ms: int | None = None) -> bool:
+        """True if a period ending at end_ts can no longer change."""
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        return end_ts <= now_ms - self.grace_ms
+
+    def get(self, start_ts: int, end_ts: int) -> GlucoseHistogram | None:
+        if not self.is_closed(end_ts):
+            return None
+        row = self.db.execute(
+            "SELECT counts, overflow, errors FROM results WHERE start = ? AND end = ? AND version = ?",
+            (start_ts, end_ts, RESULT_CACHE_VERSION),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return GlucoseHistogram.from_record(*row)
+
+    def put(self, start_ts: int, end_ts: int, hist: GlucoseHistogram) -> None:
+        if not self.is_closed(end_ts):
+            return
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results (start, end, version, counts, overflow, errors, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (start_ts, end_ts, RESULT_CACHE_VERSION, *hist.to_record(), int(time.time() * 1000)),
+            )
+        self.stores += 1
+
+    def invalidate_days(self, days: set[int]) -> None:
+        """Drop cached periods overlapping any of the given UTC days."""
+        if not days:
+            return
+        with self.db:
+            for day in days:
+                cursor = self.db.execute(
+                    "DELETE FROM results WHERE start < ? AND end > ?",
+                    (day + DAY_MS, day),
+                )
+                self.invalidations += cursor.rowcount
+
+    def stats(self) -> dict:
+        count = self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+        }
+
+
+class ResponseCache:
+    """In-memory LRU cache of tool responses with per-entry expiry.
+
+    Entries are evicted least recently used first once their total size
+    exceeds `max_bytes`; expired entries are dropped on lookup.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (expires_at, size, value)
+        self._entries: OrderedDict[str, tuple[float, int, object]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, now: float | None = None):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > (time.monotonic() if now is None else now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self._drop(key)
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value, size: int, ttl: float, now: float | None = None) -> None:
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        expires_at = (time.monotonic() if now is None else now) + ttl
+        self._entries[key] = (expires_at, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
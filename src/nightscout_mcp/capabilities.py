@@ -0,0 +1,96 @@
+"""What a Nightscout site supports, probed once and kept on disk.
+
+The probe runs a handful of small requests when a site is first used:
+which entries routes answer, whether API v3 projects fields and how large
+a page it accepts, whether the count endpoint works, whether v1 paths
+need the `.json` suffix to return JSON, how the client authenticates and
+which compression the server applies. The result is written to a small
+JSON file per site and reused until it is older than the TTL, so later
+processes route every request directly to the right form.
+"""
+
+import json
+import os
+import time
+
+from .store import default_cache_dir, site_key
+
+# Bumped when fields change; profiles of other versions are probed again
+VERSION = 1
+
+
+def capabilities_path_for(base_url: str) -> str:
+    return os.path.join(default_cache_dir(), f"capabilities-{site_key(base_url)}.json")
+
+
+class Capabilities:
+    """Probe results for one site."""
+
+    __slots__ = (
+        "server_version", "api_v3", "v3_projection", "v3_max_limit", "v1_sgv", "count",
+        "json_suffix", "auth", "compression", "probed_at",
+    )
+
+    def __init__(self):
+        # Nightscout version from /api/v1/status, if it answered
+        self.server_version: str | None = None
+        self.api_v3 = False
+        self.v3_projection = False
+        # Largest API v3 `limit` accepted
+        self.v3_max_limit = 0
+        self.v1_sgv = False
+        # /api/v1/count/entries/where answers
+        self.count = False
+        # v1 paths return JSON only with the .json suffix
+        self.json_suffix = False
+        # "token", "api-secret" or "none"; "rejected" if the server refused it
+        self.auth = "none"
+        # Content-Encoding of responses ("identity" if none)
+        self.compression = "identity"
+        self.probed_at = 0.0
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Capabilities":
+        caps = cls()
+        for name in cls.__slots__:
+            if name not in data:
+                raise ValueError(f"missing {name}")
+            setattr(caps, name, data[name])
+        return caps
+
+
+def load_capabilities(path: str, ttl_s: float) -> Capabilities | None:
+    """Profile stored at `path` if it is younger than ttl_s, else None."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != VERSION:
+            return None
+        caps = Capabilities.from_dict(data["capabilities"])
+    except (OSError, ValueError, TypeError, KeyError, AttributeError):
+        return None
+    if not isinstance(caps.probed_at, (int, float)) or time.time() - caps.probed_at > ttl_s:
+        return None
+    return caps
+
+
+def save_capabilities(path: str, caps: Capabilities) -> None:
+    """Write the profile atomically; errors are ignored (the next process probes again)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": VERSION, "capabilities": caps.as_dict()}, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def forget_capabilities(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
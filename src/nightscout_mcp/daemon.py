@@ -0,0 +1,284 @@
+"""Local cache daemon shared by several nightscout-mcp processes.
+
+Usage:
+    python -m nightscout_mcp.daemon --socket PATH [--timeout 30] [--max-connections 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .cache import ResponseCache
+
+# A message is a length-prefixed JSON header and a length-prefixed payload
+LENGTH = struct.Struct(">I")
+# How long a spawned daemon has to start listening
+SPAWN_WAIT_S = 3.0
+# How long direct mode lasts before the daemon is tried again
+RETRY_S = 30.0
+# Idle connections kept per process
+MAX_IDLE_CONNECTIONS = 8
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[dict, bytes]:
+    size = LENGTH.unpack(await reader.readexactly(LENGTH.size))[0]
+    header = json.loads(await reader.readexactly(size))
+    size = LENGTH.unpack(await reader.readexactly(LENGTH.size))[0]
+    return header, await reader.readexactly(size)
+
+
+def encode_message(header: dict, payload: bytes = b"") -> bytes:
+    data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return LENGTH.pack(len(data)) + data + LENGTH.pack(len(payload)) + payload
+
+
+class CacheDaemon:
+    """The daemon: upstream GETs with single-flight, and a response cache."""
+
+    def __init__(self, socket_path: str, cache_bytes: int, idle_s: float, timeout: float, max_connections: int):
+        self.socket_path = socket_path
+        self.idle_s = idle_s
+        self.responses = ResponseCache(cache_bytes)
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.clients = 0
+        self.last_active = time.monotonic()
+        self.requests = 0
+        self.upstream = 0
+        self.coalesced = 0
+
+    async def serve(self) -> None:
+        # The socket is created owner-only; there is no window with wider permissions
+        umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path)
+        finally:
+            os.umask(umask)
+        try:
+            async with server:
+                while self.clients or time.monotonic() - self.last_active < self.idle_s:
+                    await asyncio.sleep(min(5.0, self.idle_s))
+        finally:
+            await self.http.aclose()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    header, payload = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                self.last_active = time.monotonic()
+                self.requests += 1
+                reply, body = await self._handle(header, payload)
+                writer.write(encode_message(reply, body))
+                await writer.drain()
+        finally:
+            self.clients -= 1
+            self.last_active = time.monotonic()
+            writer.close()
+
+    async def _handle(self, header: dict, payload: bytes) -> tuple[dict, bytes]:
+        op = header.get("op")
+        if op == "get":
+            return await self._get(header)
+        if op == "cache_get":
+            value = self.responses.get(header["key"])
+            return ({"hit": True}, value) if value is not None else ({"hit": False}, b"")
+        if op == "cache_put":
+            self.responses.put(header["key"], payload, len(header["key"]) + len(payload), header["ttl"])
+            return {}, b""
+        if op == "stats":
+            return {
+                "pid": os.getpid(),
+                "clients": self.clients,
+                "requests": self.requests,
+                "upstream": self.upstream,
+                "coalesced": self.coalesced,
+                "responses": self.responses.stats(),
+            }, b""
+        return {"error": f"unknown op {op!r}"}, b""
+
+    async def _get(self, header: dict) -> tuple[dict, bytes]:
+        key = json.dumps([header["url"], header.get("params"), header.get("headers")], sort_keys=True)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(header))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget_inflight(key, done))
+        else:
+            self.coalesced += 1
+        try:
+            resp = await asyncio.shield(task)
+        except httpx.HTTPError as e:
+            return {"error": str(e) or type(e).__name__}, b""
+        return {
+            "status": resp.status_code,
+            "content_type": resp.headers.get("content-type", ""),
+            "retry_after": resp.headers.get("retry-after"),
+        }, resp.content
+
+    def _forget_inflight(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _fetch(self, header: dict) -> httpx.Response:
+        self.upstream += 1
+        return await self.http.get(header["url"], params=header.get("params"), headers=header.get("headers"))
+
+
+class DaemonLink:
+    """A process's connection to the daemon, spawning it if needed.
+
+    Every method returns None when the daemon cannot be used, and the
+    caller then does the work itself.
+    """
+
+    def __init__(self, socket_path: str, spawn_args: list[str]):
+        self.socket_path = socket_path
+        self.spawn_args = spawn_args
+        self.down_until = 0.0
+        self.fallbacks = 0
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def _open(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        try:
+            return await asyncio.open_unix_connection(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            pass
+        self.spawn()
+        deadline = time.monotonic() + SPAWN_WAIT_S
+        while True:
+            await asyncio.sleep(0.05)
+            try:
+                return await asyncio.open_unix_connection(self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+
+    def spawn(self) -> None:
+        """Start a daemon in the background; it exits if another one holds the lock."""
+        os.makedirs(os.path.dirname(self.socket_path) or ".", mode=0o700, exist_ok=True)
+        subprocess.Popen(
+            [sys.executable, "-m", "nightscout_mcp.daemon", "--socket", self.socket_path, *self.spawn_args],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    async def request(self, header: dict, payload: bytes = b"") -> tuple[dict, bytes] | None:
+        if time.monotonic() < self.down_until:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections belong to the loop that opened them
+            self._idle = []
+            self._loop = loop
+        conn = None
+        try:
+            conn = self._idle.pop() if self._idle else await self._open()
+            conn[1].write(encode_message(header, payload))
+            await conn[1].drain()
+            reply = await read_message(conn[0])
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            if conn is not None:
+                conn[1].close()
+            self.down_until = time.monotonic() + RETRY_S
+            self.fallbacks += 1
+            return None
+        except asyncio.CancelledError:
+            # The reply may still arrive: the connection cannot be reused
+            if conn is not None:
+                conn[1].close()
+            raise
+        if len(self._idle) < MAX_IDLE_CONNECTIONS:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        return reply
+
+    async def get(
+        self, url: str, params: dict | None, headers: dict, timeout: float | None = None,
+    ) -> httpx.Response | None:
+        """GET through the daemon; raises httpx.TransportError for upstream failures.
+
+        Without a reply within `timeout` seconds it raises httpx.ReadTimeout,
+        as a direct request would.
+        """
+        request = httpx.Request("GET", url, params=params)
+        try:
+            reply = await asyncio.wait_for(
+                self.request({"op": "get", "url": url, "params": params, "headers": headers}), timeout,
+            )
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout("no reply from the cache daemon in time", request=request) from None
+        if reply is None:
+            return None
+        header, body = reply
+        if "error" in header:
+            raise httpx.TransportError(header["error"], request=request)
+        response_headers = {"content-type": header["content_type"]}
+        if header.get("retry_after"):
+            response_headers["retry-after"] = header["retry_after"]
+        return httpx.Response(header["status"], content=body, headers=response_headers, request=request)
+
+    async def cache_get(self, key: str) -> list[str] | None:
+        reply = await self.request({"op": "cache_get", "key": key})
+        if reply is None or not reply[0].get("hit"):
+            return None
+        return json.loads(reply[1])
+
+    async def cache_put(self, key: str, texts: list[str], ttl: float) -> None:
+        await self.request({"op": "cache_put", "key": key, "ttl": ttl}, json.dumps(texts).encode("utf-8"))
+
+    async def stats(self) -> dict | None:
+        reply = await self.request({"op": "stats"})
+        return reply[0] if reply is not None else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cache daemon shared by nightscout-mcp processes.")
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--cache-mb", type=float, default=32)
+    parser.add_argument("--idle-minutes", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--max-connections", type=int, default=10)
+    args = parser.parse_args()
+
+    import fcntl
+
+    # One daemon per socket: whoever holds the lock serves, others leave
+    lock = open(args.socket + ".lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return
+    try:
+        os.unlink(args.socket)
+    except FileNotFoundError:
+        pass
+    daemon = CacheDaemon(
+        args.socket, int(args.cache_mb * 1024 * 1024), args.idle_minutes * 60, args.timeout, args.max_connections,
+    )
+    asyncio.run(daemon.serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""MCP over streamable HTTP: many sessions served by one process."""
+
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator
+from urllib.parse import parse_qsl, urlencode
+
+import uvicorn
+from mcp.server import Server
+from mcp.server.streamable_http import MCP_SESSION_ID_HEADER
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.types import Receive, Scope, Send
+
+MCP_PATH = "/mcp"
+TENANT_HEADER = "x-nightscout-tenant"
+# How often idle sessions are looked for, s
+REAP_INTERVAL_S = 60
+
+
+class SessionLimiter:
+    """ASGI wrapper around the session manager enforcing the limits.
+
+    Sessions are tracked from the traffic itself: an id is added when a
+    response issues it in the Mcp-Session-Id header and dropped after a
+    successful DELETE or once the manager answers 400/404 for it.
+    """
+
+    def __init__(self, manager: StreamableHTTPSessionManager, max_sessions: int, max_inflight: int, idle_s: float):
+        self.manager = manager
+        self.max_sessions = max_sessions
+        self.max_inflight = max_inflight
+        self.idle_s = idle_s
+        self.inflight = 0
+        # Initialize requests whose response (with the new id) has not started yet
+        self.opening = 0
+        # Issued session id -> time of its last request
+        self.sessions: dict[str, float] = {}
+        # Session id -> tenant named at initialize
+        self.session_tenants: dict[str, str] = {}
+        self.rejected = 0
+        self.reaped = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.manager.handle_request(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        session_id = headers.get(MCP_SESSION_ID_HEADER.encode())
+        if session_id is None:
+            if len(self.sessions) + self.opening >= self.max_sessions:
+                await self._reject(scope, receive, send, "Too many sessions")
+                return
+        if scope["method"] != "POST":
+            await self._handle(scope, receive, send, session_id)
+            return
+        if self.inflight >= self.max_inflight:
+            await self._reject(scope, receive, send, "Too many requests in flight")
+            return
+        self.inflight += 1
+        try:
+            await self._handle(scope, receive, send, session_id)
+        finally:
+            self.inflight -= 1
+
+    async def _handle(self, scope: Scope, receive: Receive, send: Send, session_id: bytes | None) -> None:
+        if session_id is not None:
+            known = session_id.decode()
+            if known in self.sessions:
+                self.sessions[known] = time.monotonic()
+            scope = with_tenant(scope, self.session_tenants.get(known))
+
+            async def send_closing(message: dict) -> None:
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    # Terminated or unknown ids get 404/400 from the manager
+                    if status in (400, 404) or (scope["method"] == "DELETE" and status < 400):
+                        self._forget(known)
+                await send(message)
+
+            await self.manager.handle_request(scope, receive, send_closing)
+            return
+
+        self.opening += 1
+        opened = False
+        tenant = request_tenant(scope)
+
+        async def send_tracking(message: dict) -> None:
+            nonlocal opened
+            if not opened:
+                opened = True
+                self.opening -= 1
+                # A new session's id arrives in the response headers
+                for name, value in message.get("headers", ()):
+                    if name.decode().lower() == MCP_SESSION_ID_HEADER:
+                        self.sessions[value.decode()] = time.monotonic()
+                        if tenant:
+                            self.session_tenants[value.decode()] = tenant
+            await send(message)
+
+        try:
+            await self.manager.handle_request(scope, receive, send_tracking)
+        finally:
+            if not opened:
+                self.opening -= 1
+
+    def _forget(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+        self.session_tenants.pop(session_id, None)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send, message: str) -> None:
+        self.rejected += 1
+        response = JSONResponse(
+            {"jsonrpc": "2.0", "id": None, "error": {"code": -32000, "message": message}},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+        await response(scope, receive, send)
+
+    async def _terminate(self, session_id: str) -> None:
+        # A DELETE through the manager, as a client leaving would send it
+        scope = {
+            "type": "http",
+            "method": "DELETE",
+            "path": MCP_PATH,
+            "raw_path": MCP_PATH.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "scheme": "http",
+            "http_version": "1.1",
+            "headers": [(MCP_SESSION_ID_HEADER.encode(), session_id.encode())],
+            "client": None,
+            "server": None,
+        }
+
+        async def receive() -> dict:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def discard(message: dict) -> None:
+            pass
+
+        await self.manager.handle_request(scope, receive, discard)
+
+    async def reap_idle(self) -> None:
+        """Terminate sessions idle for longer than idle_s, periodically."""
+        while True:
+            await asyncio.sleep(min(REAP_INTERVAL_S, self.idle_s))
+            deadline = time.monotonic() - self.idle_s
+            for session_id, seen in list(self.sessions.items()):
+                if seen >= deadline:
+                    continue
+                self._forget(session_id)
+                try:
+                    await self._terminate(session_id)
+                except Exception:
+                    continue
+                self.reaped += 1
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "rejected": self.rejected,
+            "reaped": self.reaped,
+        }
+
+
+def request_tenant(scope: Scope) -> str | None:
+    """Tenant named by a request: the X-Nightscout-Tenant header, then ?tenant=."""
+    for name, value in scope["headers"]:
+        if name.lower() == TENANT_HEADER.encode() and value:
+            return value.decode()
+    return dict(parse_qsl(scope.get("query_string", b"").decode())).get("tenant") or None
+
+
+def with_tenant(scope: Scope, tenant: str | None) -> Scope:
+    """Copy of `scope` naming `tenant` only (or no tenant), whatever the request sent."""
+    headers = [(name, value) for name, value in scope["headers"] if name.lower() != TENANT_HEADER.encode()]
+    if tenant:
+        headers.append((TENANT_HEADER.encode(), tenant.encode()))
+    query = [(k, v) for k, v in parse_qsl(scope.get("query_string", b"").decode()) if k != "tenant"]
+    return {**scope, "headers": headers, "query_string": urlencode(query).encode()}
+
+
+def build_app(server: Server, max_sessions: int, max_inflight: int, idle_s: float) -> tuple[Starlette, SessionLimiter]:
+    """Starlette app serving `server` at MCP_PATH."""
+    manager = StreamableHTTPSessionManager(app=server)
+    limiter = SessionLimiter(manager, max_sessions, max_inflight, idle_s)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        async with manager.run():
+            reaper = asyncio.create_task(limiter.reap_idle())
+            try:
+                yield
+            finally:
+                reaper.cancel()
+                await asyncio.gather(reaper, return_exceptions=True)
+
+    async def health(request) -> JSONResponse:
+        return JSONResponse({"status": "ok", **limiter.stats()})
+
+    app = Starlette(
+        routes=[Route("/health", health), Route(MCP_PATH, endpoint=limiter)],
+        lifespan=lifespan,
+    )
+    return app, limiter
+
+
+async def serve_http(server: Server, host: str, port: int, max_sessions: int, max_inflight: int, idle_s: float) -> None:
+    """Serve `server` over streamable HTTP until cancelled."""
+    app, _ = build_app(server, max_sessions, max_inflight, idle_s)
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="on")
+    await uvicorn.Server(config).serve()
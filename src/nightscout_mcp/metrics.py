@@ -0,0 +1,319 @@
+"""Latency instrumentation: per-call phase timings and latency histograms.
+
+Each tool call gets a CallTrace (held in a context variable, so tasks
+spawned by the call record into it) with time spent per phase:
+
+- upstream: waiting for Nightscout responses (concurrent requests overlap)
+- decode: JSON decoding
+- compute: statistics and local store work
+- render: formatting after the last upstream, decode or compute step
+- other: the rest of the wall time
+
+Per-tool, per-phase and per-endpoint latencies go into histograms with
+fixed buckets (for Prometheus) and a window of recent samples (for
+p50/p95/p99).
+"""
+
+import contextvars
+import json
+import math
+import os
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from collections.abc import Iterator
+
+# Cumulative histogram bucket bounds, ms
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+# Recent samples kept per series for percentiles
+SAMPLES = 1024
+PHASES = ("upstream", "decode", "compute", "render", "other")
+# Recent call traces kept for server_metrics
+RECENT_CALLS = 10
+
+
+class LatencyHistogram:
+    """Latency distribution in ms: cumulative buckets plus recent samples."""
+
+    __slots__ = ("count", "total", "buckets", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.samples: deque[float] = deque(maxlen=SAMPLES)
+
+    def observe(self, ms: float) -> None:
+        self.count += 1
+        self.total += ms
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+        self.samples.append(ms)
+
+    def percentile(self, p: float) -> float | None:
+        """Nearest-rank percentile over the recent samples."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            "p50_ms": _round(self.percentile(50)),
+            "p95_ms": _round(self.percentile(95)),
+            "p99_ms": _round(self.percentile(99)),
+        }
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 2)
+
+
+class CallTrace:
+    """Timings and counters of one tool call."""
+
+    __slots__ = ("tool", "started", "wall_ms", "phases", "requests", "bytes", "pages", "notes", "cached", "error", "_last_activity")
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.started = time.time()
+        self.wall_ms = 0.0
+        self.phases: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.requests = 0
+        self.bytes = 0
+        self.pages = 0
+        self.notes: dict = {}
+        self.cached = False
+        self.error = False
+        self._last_activity: float | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "time": round(self.started, 3),
+            "tool": self.tool,
+            "wall_ms": round(self.wall_ms, 2),
+            "phases_ms": {k: round(v, 2) for k, v in self.phases.items()},
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "pages": self.pages,
+            "cached": self.cached,
+            "error": self.error,
+            **({"notes": self.notes} if self.notes else {}),
+        }
+
+
+_current: contextvars.ContextVar[CallTrace | None] = contextvars.ContextVar("nightscout_call_trace", default=None)
+
+
+class Metrics:
+    """Registry of tool, phase and upstream request metrics.
+
+    With `prometheus_path` the Prometheus text format is rewritten after
+    every call; with `log_path` each call is appended as an NDJSON line.
+    """
+
+    def __init__(self, prometheus_path: str = "", log_path: str = ""):
+        self.prometheus_path = prometheus_path
+        self.log_path = log_path
+        self.reset()
+
+    def reset(self) -> None:
+        self.started = time.time()
+        self.tools: dict[str, LatencyHistogram] = {}
+        self.tool_errors: Counter = Counter()
+        self.tool_cached: Counter = Counter()
+        self.phases: dict[tuple[str, str], LatencyHistogram] = {}
+        self.upstream: dict[str, LatencyHistogram] = {}
+        self.upstream_bytes: Counter = Counter()
+        self.upstream_status: Counter = Counter()
+        self.recent: deque[CallTrace] = deque(maxlen=RECENT_CALLS)
+
+    @contextmanager
+    def call(self, tool: str) -> Iterator[CallTrace]:
+        """Trace a tool call; the trace is recorded when the block exits."""
+        trace = CallTrace(tool)
+        token = _current.set(trace)
+        started = time.perf_counter()
+        try:
+            yield trace
+        except BaseException:
+            trace.error = True
+            raise
+        finally:
+            _current.reset(token)
+            ended = time.perf_counter()
+            trace.wall_ms = (ended - started) * 1000
+            if trace._last_activity is not None:
+                trace.phases["render"] = (ended - trace._last_activity) * 1000
+            accounted = sum(v for k, v in trace.phases.items() if k != "other")
+            trace.phases["other"] = max(0.0, trace.wall_ms - accounted)
+            self._finish(trace)
+
+    def _finish(self, trace: CallTrace) -> None:
+        self.tools.setdefault(trace.tool, LatencyHistogram()).observe(trace.wall_ms)
+        if trace.error:
+            self.tool_errors[trace.tool] += 1
+        if trace.cached:
+            self.tool_cached[trace.tool] += 1
+        else:
+            for phase, ms in trace.phases.items():
+                if ms:
+                    self.phases.setdefault((trace.tool, phase), LatencyHistogram()).observe(ms)
+        self.recent.append(trace)
+        if self.log_path:
+            self._append_log(trace)
+        if self.prometheus_path:
+            self._write_prometheus()
+
+    def record_request(self, endpoint: str, ms: float, status: int | str, nbytes: int, decode_ms: float = 0.0) -> None:
+        """Record one upstream request, also in the current call's trace."""
+        self.upstream.setdefault(endpoint, LatencyHistogram()).observe(ms)
+        self.upstream_bytes[endpoint] += nbytes
+        self.upstream_status[(endpoint, str(status))] += 1
+        trace = _current.get()
+        if trace is not None:
+            trace.requests += 1
+            trace.bytes += nbytes
+            trace.phases["upstream"] += ms
+            trace.phases["decode"] += decode_ms
+            trace._last_activity = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add the time spent in the block to a phase of the current call."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace = _current.get()
+            if trace is not None:
+                ended = time.perf_counter()
+                trace.phases[name] += (ended - started) * 1000
+                trace._last_activity = ended
+
+    def add_pages(self, count: int = 1) -> None:
+        trace = _current.get()
+        if trace is not None:
+            trace.pages += count
+
+    def note(self, key: str, value) -> None:
+        """Attach a detail (e.g. a fetch plan) to the current call's trace."""
+        trace = _current.get()
+        if trace is not None:
+            trace.notes[key] = value
+
+    def note_append(self, key: str, value) -> None:
+        """Add a detail to a list of details in the current call's trace."""
+        trace = _current.get()
+        if trace is not None:
+            trace.notes.setdefault(key, []).append(value)
+
+    def current(self) -> CallTrace | None:
+        """Trace of the tool call running in this context, if any."""
+        return _current.get()
+
+    def snapshot(self) -> dict:
+        """All metrics as a JSON-serializable dict."""
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "tools": {
+                tool: {
+                    **hist.summary(),
+                    "errors": self.tool_errors[tool],
+                    "cached": self.tool_cached[tool],
+                    "phases_mean_ms": {
+                        phase: round(self.phases[(tool, phase)].total / max(1, hist.count - self.tool_cached[tool]), 2)
+                        for phase in PHASES
+                        if (tool, phase) in self.phases
+                    },
+                }
+                for tool, hist in sorted(self.tools.items())
+            },
+            "upstream": {
+                endpoint: {
+                    **hist.summary(),
+                    "bytes": self.upstream_bytes[endpoint],
+                    "status": {s: n for (e, s), n in sorted(self.upstream_status.items()) if e == endpoint},
+                }
+                for endpoint, hist in sorted(self.upstream.items())
+            },
+            "recent": [trace.as_dict() for trace in self.recent],
+        }
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def histogram(name: str, help_text: str, series: dict) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in series.items():
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS + (math.inf,), hist.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else _format_float(bound / 1000)
+                    lines.append(f"{name}_bucket{{{labels},le=\"{le}\"}} {cumulative}")
+                lines.append(f"{name}_sum{{{labels}}} {_format_float(hist.total / 1000)}")
+                lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        def counter(name: str, help_text: str, values: dict) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in values.items():
+                lines.append(f"{name}{{{labels}}} {value}")
+
+        histogram(
+            "nightscout_mcp_tool_duration_seconds", "Tool call latency.",
+            {f'tool="{_label(t)}"': h for t, h in sorted(self.tools.items())},
+        )
+        counter(
+            "nightscout_mcp_tool_errors_total", "Tool calls that failed.",
+            {f'tool="{_label(t)}"': self.tool_errors[t] for t in sorted(self.tools)},
+        )
+        counter(
+            "nightscout_mcp_tool_cache_hits_total", "Tool calls answered by the response cache.",
+            {f'tool="{_label(t)}"': self.tool_cached[t] for t in sorted(self.tools)},
+        )
+        histogram(
+            "nightscout_mcp_phase_duration_seconds", "Time per phase of a tool call.",
+            {f'tool="{_label(t)}",phase="{p}"': h for (t, p), h in sorted(self.phases.items())},
+        )
+        histogram(
+            "nightscout_mcp_upstream_request_duration_seconds", "Nightscout request latency.",
+            {f'endpoint="{_label(e)}"': h for e, h in sorted(self.upstream.items())},
+        )
+        counter(
+            "nightscout_mcp_upstream_responses_total", "Nightscout responses by status.",
+            {f'endpoint="{_label(e)}",status="{s}"': n for (e, s), n in sorted(self.upstream_status.items())},
+        )
+        counter(
+            "nightscout_mcp_upstream_bytes_total", "Nightscout response body bytes.",
+            {f'endpoint="{_label(e)}"': n for e, n in sorted(self.upstream_bytes.items())},
+        )
+        return "\n".join(lines) + "\n"
+
+    def _write_prometheus(self) -> None:
+        tmp = f"{self.prometheus_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            os.replace(tmp, self.prometheus_path)
+        except OSError:
+            pass
+
+    def _append_log(self, trace: CallTrace) -> None:
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace.as_dict(), default=str) + "\n")
+        except OSError:
+            pass
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_float(value: float) -> str:
+    return repr(float(value))
@@ -0,0 +1,85 @@
+"""Fetch plans: how to page through a range of entries.
+
+A plan starts from an estimate of the readings in the range (from the
+server's count endpoint, or from the CGM cadence) and picks the page
+size, the time windows fetched concurrently and their number. When the
+estimate exceeds the download budget, the plan samples instead: a few
+windows of one page each, spread evenly over the range.
+"""
+
+import math
+
+# Share of a page a window is sized to fill; density varies over a range
+WINDOW_FILL_RATIO = 0.8
+# Fewest windows a sample is spread over; pages shrink to afford them
+MIN_SAMPLES = 8
+
+
+class FetchPlan:
+    """Windows to fetch for [start, end) and the cost predicted for them."""
+
+    __slots__ = ("start", "end", "estimated", "source", "page_size", "windows", "concurrency", "sampled")
+
+    def __init__(self, start: int, end: int, estimated: int, source: str, page_size: int,
+                 windows: list[tuple[int, int]], concurrency: int, sampled: bool = False):
+        self.start = start
+        self.end = end
+        # Readings expected in the range, and where that number came from
+        self.estimated = estimated
+        self.source = source
+        self.page_size = page_size
+        # Newest first
+        self.windows = windows
+        self.concurrency = concurrency
+        self.sampled = sampled
+
+    @property
+    def predicted_requests(self) -> int:
+        if self.sampled:
+            return len(self.windows)
+        per_window = self.estimated / max(1, len(self.windows))
+        return len(self.windows) * max(1, math.ceil(per_window / self.page_size))
+
+    def as_dict(self) -> dict:
+        return {
+            "mode": "sampled" if self.sampled else "full",
+            "estimated_readings": self.estimated,
+            "estimate_source": self.source,
+            "page_size": self.page_size,
+            "windows": len(self.windows),
+            "concurrency": self.concurrency,
+            "predicted_requests": self.predicted_requests,
+        }
+
+
+def split_windows(start: int, end: int, count: int) -> list[tuple[int, int]]:
+    """[start, end) cut into `count` equal windows, newest first."""
+    count = max(1, min(count, end - start))
+    bounds = [start + (end - start) * i // count for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(count - 1, -1, -1)]
+
+
+def make_plan(start: int, end: int, estimated: int, source: str, max_page: int, concurrency: int,
+              budget: int = 0) -> FetchPlan:
+    """Plan fetching [start, end) holding about `estimated` readings."""
+    if estimated <= 0:
+        return FetchPlan(start, end, 0, source, max_page, [(start, end)], 1)
+    per_window = max(1, int(max_page * WINDOW_FILL_RATIO))
+    if budget and estimated > budget:
+        # Sample: windows holding about one page each, evenly spread over the range
+        samples = max(MIN_SAMPLES, budget // max_page)
+        page_size = max(1, min(max_page, budget // samples))
+        samples = max(1, budget // page_size)
+        width = max(1, (end - start) * page_size // estimated)
+        step = (end - start) / samples
+        windows = []
+        for i in range(samples - 1, -1, -1):
+            middle = start + int(step * (i + 0.5))
+            windows.append((max(start, middle - width // 2), min(end, middle + width - width // 2)))
+        return FetchPlan(start, end, estimated, source, page_size, windows, min(concurrency, samples), sampled=True)
+    if estimated <= per_window:
+        # One request; ask only for what is there (plus slack for late uploads)
+        page_size = min(max_page, max(100, int(estimated * 1.25)))
+        return FetchPlan(start, end, estimated, source, page_size, [(start, end)], 1)
+    windows = split_windows(start, end, math.ceil(estimated / per_window))
+    return FetchPlan(start, end, estimated, source, max_page, windows, min(concurrency, len(windows)))
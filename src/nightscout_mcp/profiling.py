@@ -0,0 +1,114 @@
+"""Opt-in profiling of slow or memory-heavy tool calls.
+
+A profiled call runs under cProfile with tracemalloc tracing. If it took
+longer than `slow_ms` or its traced memory peak exceeded `memory_bytes`,
+two files are written to the profile directory:
+
+- <time>-<tool>.prof: cProfile stats (pstats, snakeviz, ...)
+- <time>-<tool>.txt: tool, arguments, timings, the top functions by
+  cumulative time and the top allocation sites still alive at the end
+
+cProfile and tracemalloc are process-wide, so one call is profiled at a
+time; calls running concurrently with it are not profiled, and the
+profile includes whatever other tasks ran while the call was waiting.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from collections.abc import Iterator
+
+# Lines in the text report
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+# Frames kept per allocation by tracemalloc
+TRACE_FRAMES = 5
+
+
+class ProfileRun:
+    """Outcome of one profiled call."""
+
+    __slots__ = ("wall_ms", "peak_bytes", "path")
+
+    def __init__(self):
+        self.wall_ms = 0.0
+        self.peak_bytes = 0
+        self.path: str | None = None
+
+
+class Profiler:
+    """Profiles tool calls and keeps dumps of those over a threshold."""
+
+    def __init__(self, directory: str, slow_ms: float, memory_bytes: int):
+        self.directory = directory
+        self.slow_ms = slow_ms
+        self.memory_bytes = memory_bytes
+        self.active = False
+        self.dumps = 0
+
+    @contextmanager
+    def profile(self, tool: str, arguments: dict) -> Iterator[ProfileRun | None]:
+        """Profile the block; yields None if another call is being profiled."""
+        if self.active:
+            yield None
+            return
+        self.active = True
+        run = ProfileRun()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            yield run
+        finally:
+            profile.disable()
+            run.wall_ms = (time.perf_counter() - started) * 1000
+            run.peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+            try:
+                if run.wall_ms >= self.slow_ms or run.peak_bytes >= self.memory_bytes:
+                    run.path = self._dump(tool, arguments, run, profile, tracemalloc.take_snapshot())
+            finally:
+                if started_tracing:
+                    tracemalloc.stop()
+                self.active = False
+
+    def _dump(self, tool: str, arguments: dict, run: ProfileRun, profile: cProfile.Profile, snapshot: tracemalloc.Snapshot) -> str | None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")[:-3]
+        base = os.path.join(self.directory, f"{stamp}-{re.sub(r'[^A-Za-z0-9_-]', '_', tool)}")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(base + ".prof")
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(self._report(tool, arguments, run, profile, snapshot))
+        except OSError:
+            return None
+        self.dumps += 1
+        return base
+
+    def _report(self, tool: str, arguments: dict, run: ProfileRun, profile: cProfile.Profile, snapshot: tracemalloc.Snapshot) -> str:
+        out = io.StringIO()
+        out.write(f"tool: {tool}\n")
+        out.write(f"arguments: {json.dumps(arguments, ensure_ascii=False, sort_keys=True, default=str)}\n")
+        out.write(f"wall: {run.wall_ms:.1f} ms (threshold {self.slow_ms:g} ms)\n")
+        out.write(f"traced memory peak: {run.peak_bytes / 1024:.1f} KB (threshold {self.memory_bytes / 1024:.0f} KB)\n")
+        out.write(f"\n--- top {TOP_FUNCTIONS} functions by cumulative time ---\n")
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        out.write(f"\n--- top {TOP_ALLOCATIONS} allocation sites alive at the end ---\n")
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            out.write(f"{stat}\n")
+        return out.getvalue()
@@ -0,0 +1,123 @@
+"""Compact in-memory glucose series backed by typed arrays."""
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+
+# Trend direction codes; 0 is "none or unknown"
+DIRECTIONS = (
+    "",
+    "DoubleUp",
+    "SingleUp",
+    "FortyFiveUp",
+    "Flat",
+    "FortyFiveDown",
+    "SingleDown",
+    "DoubleDown",
+    "NOT COMPUTABLE",
+    "RATE OUT OF RANGE",
+    "NONE",
+)
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+
+
+class GlucoseSeries:
+    """Readings as parallel arrays, oldest first.
+
+    `dates` holds epoch milliseconds (array('q')), `sgv` mg/dL values
+    (array('H')) and `directions` trend codes (array('b')): 11 bytes per
+    reading instead of a dict per entry. Ranges are found by bisect on
+    `dates`; `views()` exposes zero-copy memoryviews of a range.
+    """
+
+    __slots__ = ("dates", "sgv", "directions")
+
+    def __init__(self):
+        self.dates = array("q")
+        self.sgv = array("H")
+        self.directions = array("b")
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict], min_sgv: float = 1) -> "GlucoseSeries":
+        """Build from entry dicts in any order.
+
+        Entries without a date or with sgv below min_sgv are skipped.
+        """
+        rows = sorted(
+            (e["date"], round(e["sgv"]), DIRECTION_CODES.get(e.get("direction") or "", 0))
+            for e in entries
+            if e.get("date") is not None and (e.get("sgv") or 0) >= min_sgv
+        )
+        series = cls()
+        if rows:
+            dates, sgv, directions = zip(*rows)
+            series.dates.extend(dates)
+            series.sgv.extend(sgv)
+            series.directions.extend(directions)
+        return series
+
+    @classmethod
+    def concat(cls, parts: Iterable["GlucoseSeries"]) -> "GlucoseSeries":
+        """Join series covering disjoint time ranges, in any order."""
+        series = cls()
+        for part in sorted((p for p in parts if len(p)), key=lambda p: p.dates[0]):
+            series.dates.extend(part.dates)
+            series.sgv.extend(part.sgv)
+            series.directions.extend(part.directions)
+        return series
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.dates, self.sgv, self.directions))
+
+    def bounds(self, start_ts: int, end_ts: int) -> tuple[int, int]:
+        """Index range of readings in [start_ts, end_ts)."""
+        return bisect_left(self.dates, start_ts), bisect_left(self.dates, end_ts)
+
+    def slice(self, start_ts: int, end_ts: int) -> "GlucoseSeries":
+        """Copy of the readings in [start_ts, end_ts)."""
+        lo, hi = self.bounds(start_ts, end_ts)
+        part = GlucoseSeries()
+        part.dates = self.dates[lo:hi]
+        part.sgv = self.sgv[lo:hi]
+        part.directions = self.directions[lo:hi]
+        return part
+
+    def views(self, start_ts: int, end_ts: int) -> tuple[memoryview, memoryview, memoryview]:
+        """Zero-copy (dates, sgv, directions) views of [start_ts, end_ts).
+
+        The views pin the arrays: release them before the series is resized.
+        """
+        lo, hi = self.bounds(start_ts, end_ts)
+        return (
+            memoryview(self.dates)[lo:hi],
+            memoryview(self.sgv)[lo:hi],
+            memoryview(self.directions)[lo:hi],
+        )
+
+    def replace_from(self, start_ts: int, other: "GlucoseSeries") -> None:
+        """Replace readings from start_ts on with those of `other` (same range or newer)."""
+        keep = bisect_left(self.dates, start_ts)
+        lo = bisect_left(other.dates, start_ts)
+        del self.dates[keep:], self.sgv[keep:], self.directions[keep:]
+        self.dates.extend(other.dates[lo:])
+        self.sgv.extend(other.sgv[lo:])
+        self.directions.extend(other.directions[lo:])
+
+    def trim_before(self, cutoff_ts: int) -> None:
+        """Drop readings older than cutoff_ts."""
+        drop = bisect_left(self.dates, cutoff_ts)
+        if drop:
+            del self.dates[:drop], self.sgv[:drop], self.directions[:drop]
+
+    def entry(self, i: int) -> dict:
+        """Reading i as an entry dict (date, sgv, direction)."""
+        return {"date": self.dates[i], "sgv": self.sgv[i], "direction": DIRECTIONS[self.directions[i]]}
+
+    def newest(self, count: int) -> list[dict]:
+        """Up to `count` most recent readings as entry dicts, newest first."""
+        n = len(self.dates)
+        return [self.entry(i) for i in range(n - 1, max(n - count, 0) - 1, -1)]
@@ -1,14 +1,44 @@
 """Nightscout MCP Server - Access CGM data from Nightscout."""
 
 import os
+import argparse
 import asyncio
+import contextvars
+import json
+import random
+import re
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import AsyncIterator
 from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
 from urllib.parse import urlparse
 import httpx
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 
+from .cache import ResponseCache, ResultCache, results_path_for
+from .capabilities import (
+    Capabilities,
+    capabilities_path_for,
+    forget_capabilities,
+    load_capabilities,
+    save_capabilities,
+)
+from .daemon import DaemonLink
+from .metrics import LatencyHistogram, Metrics
+from .planner import FetchPlan, make_plan
+from .profiling import Profiler
+from .stats import GlucoseAccumulator, GlucoseHistogram
+from .series import GlucoseSeries
+from .store import STORE_FIELDS, EntryStore, default_cache_dir, store_path_for
+from .tenants import Tenant, load_tenants_file
+from .tuning import MAX_PAGE, HostTuner, tuning_path_for
+from .warm import WarmSet
+
 # Configuration from environment
 NIGHTSCOUT_URL = os.environ.get("NIGHTSCOUT_URL", "")
 NIGHTSCOUT_API_SECRET = os.environ.get("NIGHTSCOUT_API_SECRET", "")
@@ -22,12 +52,73 @@ LOCALE = os.environ.get("LOCALE", "en").lower()
 LOCALTIME = os.environ.get("LOCALTIME", "").strip()
 
 
-def _get_display_tz() -> tuple[timezone, str]:
-    if not LOCALTIME:
-        return timezone.utc, "UTC"
-    import re
+def _env_int(env_var: str, default: int) -> int:
+    try:
+        return int(os.environ.get(env_var, "") or default)
+    except ValueError:
+        return default
+
+
+def _env_float(env_var: str, default: float) -> float:
+    try:
+        return float(os.environ.get(env_var, "") or default)
+    except ValueError:
+        return default
 
-    match = re.match(r"^(?:GMT|UTC)?\s*([+-]\d{1,2})$", LOCALTIME, re.I)
+
+def _env_flag(env_var: str, default: bool = False) -> bool:
+    val = os.environ.get(env_var, "").strip().lower()
+    if not val:
+        return default
+    return val in ("1", "true", "yes", "on")
+
+
+# HTTP connection pool (shared by all tool calls for the server lifetime)
+HTTP_TIMEOUT = _env_float("NIGHTSCOUT_HTTP_TIMEOUT", 30.0)
+HTTP_MAX_CONNECTIONS = _env_int("NIGHTSCOUT_MAX_CONNECTIONS", 10)
+HTTP_MAX_KEEPALIVE = _env_int("NIGHTSCOUT_MAX_KEEPALIVE", 5)
+HTTP_KEEPALIVE_EXPIRY = _env_float("NIGHTSCOUT_KEEPALIVE_EXPIRY", 60.0)
+# HTTP/2 needs the optional `h2` package (pip install "nightscout-mcp[http2]")
+HTTP2 = _env_flag("NIGHTSCOUT_HTTP2")
+
+# Entry pagination: time windows fetched concurrently, up to this many at once.
+# Set to 1 for servers that reject concurrent load (serial backward paging).
+FETCH_CONCURRENCY = max(1, _env_int("NIGHTSCOUT_FETCH_CONCURRENCY", 4))
+# Retries of failed upstream GETs (transport errors, 429, 502, 503, 504) with
+# jittered exponential backoff; a Retry-After of up to RETRY_AFTER_MAX_S is honored
+RETRIES = max(0, _env_int("NIGHTSCOUT_RETRIES", 2))
+RETRY_BACKOFF_MS = _env_float("NIGHTSCOUT_RETRY_BACKOFF_MS", 250)
+RETRY_AFTER_MAX_S = 30
+RETRY_STATUSES = (429, 502, 503, 504)
+# Hedged GETs: a duplicate request is sent when the first has not answered
+# within the p95 latency of its endpoint (at least HEDGE_MIN_MS); the first
+# answer wins and the other request is cancelled
+HEDGE = _env_flag("NIGHTSCOUT_HEDGE", False)
+HEDGE_MIN_MS = _env_float("NIGHTSCOUT_HEDGE_MIN_MS", 50)
+HEDGE_MIN_SAMPLES = 20
+# Responses between two recomputations of the p95
+HEDGE_REFRESH = 16
+# Time budget of a whole tool call (0 = none). Every request and retry gets
+# what is left of it, each request at most NIGHTSCOUT_HTTP_TIMEOUT
+CALL_DEADLINE_S = _env_float("NIGHTSCOUT_CALL_DEADLINE_S", 0)
+# Tune page size and requests in flight per site from observed responses
+# (AIMD, see tuning.py); learned values are kept in NIGHTSCOUT_CACHE_DIR.
+# With it, NIGHTSCOUT_FETCH_CONCURRENCY is the starting point and
+# NIGHTSCOUT_MAX_CONNECTIONS the ceiling
+ADAPTIVE_FETCH = _env_flag("NIGHTSCOUT_ADAPTIVE_FETCH", True)
+# Responses slower than this shrink the page size
+ADAPTIVE_TARGET_MS = _env_float("NIGHTSCOUT_ADAPTIVE_TARGET_MS", 2000)
+# Ask the server how many readings a range holds before paging through it
+COUNT_PREFLIGHT = _env_flag("NIGHTSCOUT_COUNT_PREFLIGHT", True)
+# Readings a statistics call may download (0 = unlimited); beyond it the
+# result is estimated from a sample spread over the period
+FETCH_BUDGET = max(0, _env_int("NIGHTSCOUT_FETCH_BUDGET", 0))
+
+
+def parse_display_tz(value: str) -> tuple[timezone, str]:
+    if not value:
+        return timezone.utc, "UTC"
+    match = re.match(r"^(?:GMT|UTC)?\s*([+-]\d{1,2})$", value.strip(), re.I)
     if not match:
         return timezone.utc, "UTC"
     hours = int(match.group(1))
@@ -37,11 +128,11 @@ def _get_display_tz() -> tuple[timezone, str]:
     return timezone(timedelta(hours=hours)), label
 
 
-DISPLAY_TZ, DISPLAY_TZ_LABEL = _get_display_tz()
+DISPLAY_TZ, DISPLAY_TZ_LABEL = parse_display_tz(LOCALTIME)
 
 
 def to_display_tz(dt: datetime) -> datetime:
-    return dt.astimezone(DISPLAY_TZ)
+    return dt.astimezone(tenant().tz)
 
 STRINGS = {
     "en": {
@@ -63,6 +154,7 @@ STRINGS = {
         "no_data_hours": "No data for the last {hours} hours",
         "not_enough_data": "Not enough data for analysis",
         "analysis_title": "Glucose Analysis: {from_date} — {to_date} ({days} days, {count} readings)",
+        "sampled_note": "Estimated from a sample of {count} of about {total} readings (NIGHTSCOUT_FETCH_BUDGET)",
         "key_metrics": "Key Metrics:",
         "avg_glucose": "Average glucose: {value}",
         "std_dev": "Standard deviation: {value}",
@@ -117,6 +209,43 @@ STRINGS = {
         "uploader": "Uploader: battery {value}%",
         "pump": "Pump: reservoir {reservoir}U, battery {battery}%",
         "device_label": "Device: {value}",
+        "diagnostics_title": "Server diagnostics:",
+        "diag_route": "Entries route: {value}",
+        "diag_store": "Entry store: {path}, {count} readings, {ranges} synced ranges",
+        "diag_store_off": "Entry store: off",
+        "diag_results": "Result cache: {entries} periods, {hits} hits, {misses} misses, {invalidations} invalidated",
+        "diag_results_off": "Result cache: off",
+        "diag_responses": "Response cache: {entries} responses ({kb} KB), {hits} hits, {misses} misses, {evictions} evicted",
+        "diag_responses_off": "Response cache: off",
+        "diag_warm": "Warm set: {entries} readings ({kb} KB), cadence {cadence}s, {polls} polls, {hits} answers",
+        "diag_warm_off": "Warm set: off",
+        "diag_profile": "Profiler: {path}, dumps of calls over {slow:g} ms or {mb:g} MB: {dumps}",
+        "diag_profile_off": "Profiler: off",
+        "diag_daemon": "Cache daemon: {path} (pid {pid}), {clients} connections, {upstream} upstream requests, {coalesced} shared between processes",
+        "diag_daemon_down": "Cache daemon: {path} unreachable, direct requests ({fallbacks} fallbacks)",
+        "diag_daemon_off": "Cache daemon: off",
+        "diag_tuning": "Adaptive fetch: pages of {page_size}, {inflight} requests in flight, {latency_ms} ms per response, {kb_per_s} KB/s ({increases} increases, {decreases} decreases)",
+        "diag_tuning_off": "Adaptive fetch: off",
+        "diag_caps": "Server: Nightscout {version}; API v3 {v3} (page cap {limit}, projection {projection}), count {count}, .json suffix {suffix}; auth: {auth}; compression: {compression}; probed {age} min ago",
+        "diag_caps_none": "Server: not probed yet",
+        "diag_retries": "Retried requests: {retries}, hedged: {hedged} ({hedge_wins} answered by the duplicate)",
+        "deadline_exceeded": "the call took longer than {seconds:g} s (NIGHTSCOUT_CALL_DEADLINE_S)",
+        "diag_tenant": "Tenant: {tenant} ({active} of {count} tenants active), requests delayed by the rate limit: {waited}",
+        "unknown_tenant": "unknown tenant '{tenant}'",
+        "tenant_required": "the tenant argument is required",
+        "tenant_not_allowed": "this session is bound to another tenant, not '{tenant}'",
+        "tenant_session_required": "open the session with the X-Nightscout-Tenant header or ?tenant=",
+        "diag_requests": "Upstream requests: {requests}, coalesced with an identical in-flight request: {coalesced}",
+        "metrics_title": "Server metrics (last {uptime} s):",
+        "metrics_tools": "Tool calls (latency p50 / p95 / p99, mean time per phase):",
+        "metrics_tool": "{tool}: {count} calls, {cached} cached, {errors} errors; {p50} / {p95} / {p99} ms",
+        "metrics_phases": "phases, ms: {phases}",
+        "metrics_upstream": "Nightscout requests (latency p50 / p95 / p99):",
+        "metrics_endpoint": "{endpoint}: {count} requests, {kb} KB; {p50} / {p95} / {p99} ms; status {status}",
+        "metrics_recent": "Recent calls:",
+        "metrics_call": "{tool}: {wall} ms, {requests} requests, {pages} pages{flags}",
+        "metrics_empty": "No tool calls recorded yet",
+        "metrics_reset": "Metrics cleared",
     },
     "ru": {
         "unknown_tool": "Неизвестный инструмент: {name}",
@@ -137,6 +266,7 @@ STRINGS = {
         "no_data_hours": "Нет данных за последние {hours} часов",
         "not_enough_data": "Недостаточно данных для анализа",
         "analysis_title": "Анализ глюкозы: {from_date} — {to_date} ({days} дней, {count} измерений)",
+        "sampled_note": "Оценка по выборке из {count} примерно {total} измерений (NIGHTSCOUT_FETCH_BUDGET)",
         "key_metrics": "Ключевые метрики:",
         "avg_glucose": "Средняя глюкоза: {value}",
         "std_dev": "Стандартное отклонение: {value}",
@@ -191,27 +321,67 @@ STRINGS = {
         "uploader": "Загрузчик: батарея {value}%",
         "pump": "Помпа: резервуар {reservoir}U, батарея {battery}%",
         "device_label": "Устройство: {value}",
+        "diagnostics_title": "Диагностика сервера:",
+        "diag_route": "Маршрут записей: {value}",
+        "diag_store": "Хранилище записей: {path}, {count} измерений, {ranges} синхр. диапазонов",
+        "diag_store_off": "Хранилище записей: выключено",
+        "diag_results": "Кэш результатов: {entries} периодов, {hits} попаданий, {misses} промахов, {invalidations} сброшено",
+        "diag_results_off": "Кэш результатов: выключен",
+        "diag_responses": "Кэш ответов: {entries} ответов ({kb} КБ), {hits} попаданий, {misses} промахов, {evictions} вытеснено",
+        "diag_responses_off": "Кэш ответов: выключен",
+        "diag_warm": "Тёплый набор: {entries} измерений ({kb} КБ), интервал {cadence} с, {polls} опросов, {hits} ответов",
+        "diag_warm_off": "Тёплый набор: выключен",
+        "diag_profile": "Профилировщик: {path}, дампов вызовов дольше {slow:g} мс или больше {mb:g} МБ: {dumps}",
+        "diag_profile_off": "Профилировщик: выключен",
+        "diag_daemon": "Демон кэша: {path} (pid {pid}), {clients} соединений, {upstream} запросов к серверу, {coalesced} общих для процессов",
+        "diag_daemon_down": "Демон кэша: {path} недоступен, прямые запросы ({fallbacks} переключений)",
+        "diag_daemon_off": "Демон кэша: выключен",
+        "diag_tuning": "Адаптивная загрузка: страницы по {page_size}, {inflight} запросов одновременно, {latency_ms} мс на ответ, {kb_per_s} КБ/с ({increases} увеличений, {decreases} уменьшений)",
+        "diag_tuning_off": "Адаптивная загрузка: выключена",
+        "diag_caps": "Сервер: Nightscout {version}; API v3 {v3} (страница до {limit}, проекция {projection}), count {count}, суффикс .json {suffix}; авторизация: {auth}; сжатие: {compression}; проверен {age} мин назад",
+        "diag_caps_none": "Сервер: ещё не проверен",
+        "diag_retries": "Повторённых запросов: {retries}, продублированных: {hedged} (дубль ответил первым: {hedge_wins})",
+        "deadline_exceeded": "вызов длился дольше {seconds:g} с (NIGHTSCOUT_CALL_DEADLINE_S)",
+        "diag_tenant": "Тенант: {tenant} (активно {active} из {count}), запросов задержано ограничением частоты: {waited}",
+        "unknown_tenant": "неизвестный тенант '{tenant}'",
+        "tenant_required": "нужен аргумент tenant",
+        "tenant_not_allowed": "эта сессия привязана к другому тенанту, не к '{tenant}'",
+        "tenant_session_required": "откройте сессию с заголовком X-Nightscout-Tenant или ?tenant=",
+        "diag_requests": "Запросов к серверу: {requests}, объединено с таким же выполняющимся запросом: {coalesced}",
+        "metrics_title": "Метрики сервера (за последние {uptime} с):",
+        "metrics_tools": "Вызовы инструментов (задержка p50 / p95 / p99, среднее время по фазам):",
+        "metrics_tool": "{tool}: {count} вызовов, {cached} из кэша, {errors} ошибок; {p50} / {p95} / {p99} мс",
+        "metrics_phases": "фазы, мс: {phases}",
+        "metrics_upstream": "Запросы к Nightscout (задержка p50 / p95 / p99):",
+        "metrics_endpoint": "{endpoint}: {count} запросов, {kb} КБ; {p50} / {p95} / {p99} мс; статус {status}",
+        "metrics_recent": "Последние вызовы:",
+        "metrics_call": "{tool}: {wall} мс, {requests} запросов, {pages} страниц{flags}",
+        "metrics_empty": "Вызовов инструментов ещё не было",
+        "metrics_reset": "Метрики сброшены",
     },
 }
 
 
 def t(key: str, **kwargs) -> str:
-    lang = "ru" if LOCALE == "ru" else "en"
+    lang = "ru" if tenant().locale == "ru" else "en"
     template = STRINGS[lang].get(key, STRINGS["en"].get(key, key))
     return template.format(**kwargs)
 
 # TIR range from environment (in mg/dL, will convert if mmol specified)
+def glucose_to_mgdl(num: float) -> float:
+    """Auto-detect units: values < 30 are taken as mmol/L and converted to mg/dL."""
+    if num < 30:
+        return num * 18.0182
+    return num
+
+
 def parse_glucose_value(env_var: str, default_mgdl: float) -> float:
     """Parse glucose value from env, auto-detect units."""
     val = os.environ.get(env_var, "")
     if not val:
         return default_mgdl
     try:
-        num = float(val)
-        # If value < 30, assume it's mmol/L and convert to mg/dL
-        if num < 30:
-            return num * 18.0182
-        return num
+        return glucose_to_mgdl(float(val))
     except ValueError:
         return default_mgdl
 
@@ -219,6 +389,104 @@ def parse_glucose_value(env_var: str, default_mgdl: float) -> float:
 GLUCOSE_LOW = parse_glucose_value("GLUCOSE_LOW", 70)   # 3.9 mmol/L
 GLUCOSE_HIGH = parse_glucose_value("GLUCOSE_HIGH", 140)  # 7.8 mmol/L
 
+# Entry fields needed for statistics and for history display
+STATS_FIELDS = ("date", "sgv")
+HISTORY_FIELDS = ("date", "sgv", "direction")
+# API v3 caps `limit` at 1000 by default (API3_MAX_LIMIT)
+V3_MAX_LIMIT = 1000
+# Use API v3 when the server supports it (Nightscout 14+)
+API_V3 = _env_flag("NIGHTSCOUT_API_V3", True)
+# What a site supports is probed once and kept on disk this long (0 = probe in every process)
+CAPABILITIES_TTL_S = _env_float("NIGHTSCOUT_CAPABILITIES_TTL_HOURS", 24) * 3600
+# With API v3, keep loaded entries and refresh them through the history feed
+V3_SYNC = _env_flag("NIGHTSCOUT_V3_SYNC", True)
+# Keep entries in a local SQLite store (NIGHTSCOUT_CACHE_DIR) between calls and restarts;
+# off by default, as it writes the patient's readings to disk
+STORE = _env_flag("NIGHTSCOUT_STORE", False)
+# Recent readings may still be backfilled by uploaders; without the v3 history
+# feed this trailing window is never treated as synced and is always refetched
+BACKFILL_GRACE_MS = int(_env_float("NIGHTSCOUT_BACKFILL_GRACE_HOURS", 2) * 3600 * 1000)
+# Keep computed results for closed periods on disk (NIGHTSCOUT_CACHE_DIR)
+RESULT_CACHE = _env_flag("NIGHTSCOUT_RESULT_CACHE", False)
+# A period is closed (immutable) once it ended this long ago
+RESULT_CACHE_GRACE_MS = int(_env_float("NIGHTSCOUT_RESULT_CACHE_GRACE_HOURS", 48) * 3600 * 1000)
+# In-memory cache of tool responses (per-tool TTLs below)
+RESPONSE_CACHE = _env_flag("NIGHTSCOUT_RESPONSE_CACHE", True)
+RESPONSE_CACHE_MAX_BYTES = int(_env_float("NIGHTSCOUT_RESPONSE_CACHE_MB", 8) * 1024 * 1024)
+# Background task keeping recent entries, device status and status in memory
+WARM_SYNC = _env_flag("NIGHTSCOUT_WARM_SYNC", False)
+WARM_HOURS = _env_float("NIGHTSCOUT_WARM_HOURS", 24)
+# Optional metrics outputs: Prometheus text file (rewritten after each call)
+# and NDJSON log (one line per call)
+METRICS_FILE = os.path.expanduser(os.environ.get("NIGHTSCOUT_METRICS_FILE", "").strip())
+METRICS_LOG = os.path.expanduser(os.environ.get("NIGHTSCOUT_METRICS_LOG", "").strip())
+# Several Nightscout sites in one process: JSON file of tenants (see tenants.py).
+# NIGHTSCOUT_TENANT picks the tenant of calls that name none (e.g. a stdio process)
+TENANTS_FILE = os.path.expanduser(os.environ.get("NIGHTSCOUT_TENANTS_FILE", "").strip())
+DEFAULT_TENANT_ID = os.environ.get("NIGHTSCOUT_TENANT", "").strip()
+# Upstream requests per second per site (0 = unlimited); tenants may override it
+RATE_LIMIT = _env_float("NIGHTSCOUT_RATE_LIMIT", 0)
+# Share upstream requests and the response cache with other nightscout-mcp
+# processes through a local daemon on a Unix socket, spawned on first use
+DAEMON = _env_flag("NIGHTSCOUT_DAEMON", False) and hasattr(asyncio, "open_unix_connection")
+DAEMON_SOCKET = os.path.expanduser(os.environ.get("NIGHTSCOUT_DAEMON_SOCKET", "").strip()) or os.path.join(default_cache_dir(), "daemon.sock")
+# Transport of the nightscout-mcp command (--transport): stdio or http (streamable HTTP).
+# In http mode one process serves many clients, sharing connections and caches
+TRANSPORT = os.environ.get("NIGHTSCOUT_TRANSPORT", "stdio").strip().lower()
+HTTP_HOST = os.environ.get("NIGHTSCOUT_HTTP_HOST", "127.0.0.1").strip()
+HTTP_PORT = _env_int("NIGHTSCOUT_HTTP_PORT", 8000)
+HTTP_MAX_SESSIONS = max(1, _env_int("NIGHTSCOUT_HTTP_MAX_SESSIONS", 64))
+HTTP_MAX_INFLIGHT = max(1, _env_int("NIGHTSCOUT_HTTP_MAX_INFLIGHT", 32))
+HTTP_SESSION_IDLE_S = _env_float("NIGHTSCOUT_HTTP_SESSION_IDLE_MINUTES", 30) * 60
+# Profile tool calls; dumps of those slower or heavier than the thresholds go here
+PROFILE_DIR = os.path.expanduser(os.environ.get("NIGHTSCOUT_PROFILE_DIR", "").strip())
+PROFILE_SLOW_MS = _env_float("NIGHTSCOUT_PROFILE_SLOW_MS", 2000)
+PROFILE_MEMORY_BYTES = int(_env_float("NIGHTSCOUT_PROFILE_MEMORY_MB", 64) * 1024 * 1024)
+# How far back the history cursor starts after the first load
+SYNC_CURSOR_MARGIN_MS = 5 * 60 * 1000
+
+# Expected CGM reading interval, used to estimate readings when counts are unavailable
+CGM_INTERVAL_MS = 5 * 60 * 1000
+# Shorter ranges are planned from the cadence; a count request would cost as much as the fetch
+PLAN_MIN_SPAN_MS = 2 * 24 * 3600 * 1000
+# Range counts remembered per client
+MAX_COUNTS = 256
+
+# Response TTLs in seconds; glucose_current expires at the next expected reading
+RESPONSE_TTLS = {
+    "glucose_history": 60,
+    "analyze": 300,
+    "analyze_monthly": 300,
+    "treatments": 60,
+    "insulin_log": 60,
+    "pump_reservoir": 60,
+    "status": 600,
+    "devices": 60,
+}
+# Tool defaults, so omitted and explicit default arguments share a cache key
+TOOL_DEFAULTS = {
+    "glucose_history": {"hours": 6, "count": 100},
+    "analyze": {"from": "7d", "to": None, "tirGoal": 70, "tirLow": None, "tirHigh": None},
+    "analyze_monthly": {"fromMonth": 1, "toMonth": 12, "tirGoal": 85, "tirLow": None, "tirHigh": None},
+    "treatments": {"hours": 24, "count": 50},
+    "insulin_log": {"hours": 24, "count": 50},
+    "devices": {"count": 5},
+}
+# Ranges relative to now are snapped to buckets of this size in cache keys
+RESPONSE_BUCKET_MS = 5 * 60 * 1000
+# Typical delay between a reading and its upload
+UPLOAD_LAG_MS = 30 * 1000
+# Shortest glucose_current TTL, used while the next reading is late
+MIN_CURRENT_TTL = 15
+
+# Warm set polling: retry delay while a reading is late or a poll failed,
+# overlap refetched for late uploads, device status entries kept (devices
+# tool maximum) and status document refresh interval
+WARM_RETRY_MS = 30 * 1000
+WARM_REFETCH_MS = 15 * 60 * 1000
+WARM_DEVICESTATUS_COUNT = 20
+WARM_STATUS_REFRESH_MS = 10 * 60 * 1000
+
 # Minimum valid glucose reading (below this is sensor error)
 # 40 mg/dL = 2.2 mmol/L - readings below this are almost certainly sensor artifacts
 GLUCOSE_MIN_VALID = 40  # mg/dL
@@ -257,55 +525,96 @@ def mgdl_to_mmol(mgdl: float) -> float:
 
 def format_glucose(mgdl: float) -> str:
     """Format glucose value based on configured units."""
-    if GLUCOSE_UNITS == "mgdl":
+    if tenant().units == "mgdl":
         return f"{int(round(mgdl))} mg/dL"
     else:
         return f"{mgdl_to_mmol(mgdl):.1f} mmol/L"
 
 def format_glucose_short(mgdl: float) -> str:
     """Format glucose value (short, no units)."""
-    if GLUCOSE_UNITS == "mgdl":
+    if tenant().units == "mgdl":
         return str(int(round(mgdl)))
     else:
         return f"{mgdl_to_mmol(mgdl):.1f}"
 
-def get_tir_range_label() -> str:
+def get_tir_range_label(low: float | None = None, high: float | None = None) -> str:
     """Get TIR range label in configured units."""
-    if GLUCOSE_UNITS == "mgdl":
-        return f"{int(GLUCOSE_LOW)}-{int(GLUCOSE_HIGH)} mg/dL"
+    low = tenant().low if low is None else low
+    high = tenant().high if high is None else high
+    if tenant().units == "mgdl":
+        return f"{int(low)}-{int(high)} mg/dL"
     else:
-        return f"{mgdl_to_mmol(GLUCOSE_LOW):.1f}-{mgdl_to_mmol(GLUCOSE_HIGH):.1f} mmol/L"
+        return f"{mgdl_to_mmol(low):.1f}-{mgdl_to_mmol(high):.1f} mmol/L"
 
 
-def filter_valid_sgv(entries: list) -> list[int]:
-    """Extract valid SGV values, filtering out sensor errors."""
-    return [
-        e["sgv"] for e in entries 
-        if e.get("sgv") and e["sgv"] >= GLUCOSE_MIN_VALID
-    ]
+def parse_tir_bounds(low: float | None, high: float | None) -> tuple[float, float]:
+    """Resolve per-request TIR bounds (auto-detected units), defaulting to env settings."""
+    low_mgdl = tenant().low if low is None else glucose_to_mgdl(float(low))
+    high_mgdl = tenant().high if high is None else glucose_to_mgdl(float(high))
+    if low_mgdl >= high_mgdl:
+        raise ValueError("TIR lower bound must be below the upper bound")
+    return low_mgdl, high_mgdl
+
 
+def is_valid_sgv(entry: dict) -> bool:
+    """Check that an entry holds a real SGV reading, not a sensor error."""
+    return bool(entry.get("sgv")) and entry["sgv"] >= GLUCOSE_MIN_VALID
 
-def calculate_stats(sgv_values: list[int]) -> dict | None:
-    """Calculate glucose statistics."""
-    if not sgv_values:
+
+def filter_valid_sgv(entries: list) -> list[int]:
+    """Extract valid SGV values, filtering out sensor errors."""
+    return [e["sgv"] for e in entries if is_valid_sgv(e)]
+
+
+def calculate_stats(
+    sgv_values: list[int] | array,
+    low: float | None = None,
+    high: float | None = None,
+) -> dict | None:
+    """Calculate glucose statistics in a single pass over the values."""
+    acc = GlucoseAccumulator(
+        tenant().low if low is None else low,
+        tenant().high if high is None else high,
+    )
+    return accumulator_stats(acc.add_values(sgv_values))
+
+
+def histogram_stats(
+    hist: GlucoseHistogram,
+    low: float | None = None,
+    high: float | None = None,
+) -> dict | None:
+    """Calculate glucose statistics from a histogram, including percentiles.
+
+    `low`/`high` override the TIR range (mg/dL) for this call.
+    """
+    acc = GlucoseAccumulator.from_histogram(
+        hist,
+        tenant().low if low is None else low,
+        tenant().high if high is None else high,
+    )
+    stats = accumulator_stats(acc)
+    if stats:
+        stats.update({
+            "p10": hist.percentile(10),
+            "p25": hist.percentile(25),
+            "median": hist.percentile(50),
+            "p75": hist.percentile(75),
+            "p90": hist.percentile(90),
+        })
+    return stats
+
+
+def accumulator_stats(acc: GlucoseAccumulator) -> dict | None:
+    """Format accumulated statistics."""
+    n = acc.count
+    if not n:
         return None
     
-    n = len(sgv_values)
-    avg = sum(sgv_values) / n
-    variance = sum((v - avg) ** 2 for v in sgv_values) / n
-    std_dev = variance ** 0.5
+    avg = acc.average()
+    std_dev = acc.variance() ** 0.5
     cv = (std_dev / avg * 100) if avg > 0 else 0
     
-    # Fixed ranges in mg/dL
-    very_low = sum(1 for v in sgv_values if v < 54)           # <3.0 mmol/L
-    low = sum(1 for v in sgv_values if 54 <= v < 70)          # 3.0-3.9 mmol/L
-    # TIR uses configurable range
-    in_range = sum(1 for v in sgv_values if GLUCOSE_LOW <= v <= GLUCOSE_HIGH)
-    # Above target: from GLUCOSE_HIGH to 180 mg/dL (10 mmol/L)
-    above_target = sum(1 for v in sgv_values if GLUCOSE_HIGH < v <= 180)
-    high = sum(1 for v in sgv_values if 180 < v <= 250)       # 10.0-13.9 mmol/L
-    very_high = sum(1 for v in sgv_values if v > 250)         # >13.9 mmol/L
-    
     return {
         "count": n,
         "avg": round(avg, 1),
@@ -313,22 +622,20 @@ def calculate_stats(sgv_values: list[int]) -> dict | None:
         "std_dev": round(std_dev, 1),
         "std_dev_formatted": format_glucose_short(std_dev),
         "cv": round(cv, 1),
-        "min": min(sgv_values),
-        "max": max(sgv_values),
-        "tir": round(in_range / n * 100, 1),
-        "very_low_pct": round(very_low / n * 100, 1),
-        "low_pct": round(low / n * 100, 1),
-        "above_target_pct": round(above_target / n * 100, 1),
-        "high_pct": round(high / n * 100, 1),
-        "very_high_pct": round(very_high / n * 100, 1),
+        "min": acc.min,
+        "max": acc.max,
+        "tir": round(acc.in_range / n * 100, 1),
+        "very_low_pct": round(acc.very_low / n * 100, 1),
+        "low_pct": round(acc.low_count / n * 100, 1),
+        "above_target_pct": round(acc.above_target / n * 100, 1),
+        "high_pct": round(acc.high_count / n * 100, 1),
+        "very_high_pct": round(acc.very_high / n * 100, 1),
         "a1c": round((avg + 46.7) / 28.7, 1),
     }
 
 
 def parse_date_to_timestamp(date_str: str) -> int:
     """Parse date string to timestamp (ms)."""
-    import re
-    
     # Relative: 7d, 2w, 3m, 1y
     match = re.match(r"^(\d+)([dwmy])$", date_str, re.I)
     if match:
@@ -351,11 +658,123 @@ def parse_date_to_timestamp(date_str: str) -> int:
 class NightscoutClient:
     """HTTP client for Nightscout API."""
     
-    def __init__(self):
-        config = parse_nightscout_url(NIGHTSCOUT_URL)
+    def __init__(self, url: str = NIGHTSCOUT_URL, api_secret: str = NIGHTSCOUT_API_SECRET, limiter=None):
+        config = parse_nightscout_url(url)
         self.base_url = config["base_url"]
         self.token = config["token"]
-        self.api_secret = NIGHTSCOUT_API_SECRET
+        self.api_secret = api_secret
+        # Upstream rate limit (tenants.RateLimiter), if any
+        self.limiter = limiter
+        self._http: httpx.AsyncClient | None = None
+        self._http_loop: asyncio.AbstractEventLoop | None = None
+        # Entries route: "v3" (fields projection), "v1-sgv" (/entries/sgv) or "v1"
+        self.entries_route: str | None = None
+        self.store: EntryStore | None = None
+        self.results: ResultCache | None = None
+        # Date (ms) of the newest reading seen, used to predict the next one
+        self.last_reading_ts: int | None = None
+        # Single-flight: in-flight GETs by request key, shared by identical calls
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        # Response times by endpoint and the hedging delay derived from them
+        self._latency: dict[str, LatencyHistogram] = {}
+        self._hedge_after: dict[str, tuple[int, float]] = {}
+        # Whether /api/v1/count works on this server (None = not tried yet)
+        self.count_supported: bool | None = None
+        self._counts: dict[tuple[int, int], int] = {}
+        # Probed capabilities (see capabilities.py) and what follows from them
+        self.caps: Capabilities | None = None
+        self._probe_task: asyncio.Future | None = None
+        self.v3_max_limit = V3_MAX_LIMIT
+        self.json_suffix = False
+        self.tuner: HostTuner | None = None
+        if ADAPTIVE_FETCH and self.base_url:
+            # NIGHTSCOUT_FETCH_CONCURRENCY=1 keeps paging serial
+            max_concurrency = HTTP_MAX_CONNECTIONS if FETCH_CONCURRENCY > 1 else 1
+            self.tuner = HostTuner(
+                tuning_path_for(self.base_url), FETCH_CONCURRENCY, max_concurrency, ADAPTIVE_TARGET_MS
+            )
+        self._sync_lock: asyncio.Lock | None = None
+        self._sync_lock_loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        """Return the pooled HTTP client, creating it on first use.
+
+        Connections are kept alive between calls, so only the first request
+        to the site pays DNS, TCP and TLS setup. The pool is bound to the
+        event loop it was created in and is recreated if the loop changes.
+        """
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._http_loop is not loop:
+            http2 = HTTP2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    http2 = False
+            self._http = httpx.AsyncClient(
+                http2=http2,
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+            )
+            self._http_loop = loop
+        return self._http
+
+    def _get_sync_lock(self) -> asyncio.Lock:
+        """Lock serializing store updates, recreated if the event loop changes."""
+        loop = asyncio.get_running_loop()
+        if self._sync_lock is None or self._sync_lock_loop is not loop:
+            self._sync_lock = asyncio.Lock()
+            self._sync_lock_loop = loop
+        return self._sync_lock
+
+    def _get_store(self) -> EntryStore | None:
+        """Return the entry store, opening it on first use.
+
+        Uses the on-disk store when NIGHTSCOUT_STORE is on; otherwise a
+        process-local one only to follow the API v3 history feed.
+        """
+        if self.store is None:
+            if STORE:
+                self.store = EntryStore(store_path_for(self.base_url))
+            elif self.entries_route == "v3" and V3_SYNC:
+                self.store = EntryStore(":memory:")
+        return self.store
+
+    def _get_results(self) -> ResultCache | None:
+        """Return the closed-period result cache, opening it on first use."""
+        if self.results is None and RESULT_CACHE and self.base_url:
+            self.results = ResultCache(results_path_for(self.base_url), RESULT_CACHE_GRACE_MS)
+        return self.results
+
+    async def _get_fresh_results(self) -> ResultCache | None:
+        """Result cache after applying pending v3 history, so late edits invalidate it."""
+        results = self._get_results()
+        if results is None:
+            return None
+        await self._detect_entries_route()
+        store = self._get_store()
+        if store is not None and self.entries_route == "v3" and V3_SYNC:
+            async with self._get_sync_lock():
+                await self._sync_history(store)
+        return results
+
+    async def aclose(self) -> None:
+        """Close pooled connections and save the learned fetch limits."""
+        if self.tuner is not None:
+            self.tuner.save()
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+        self._http_loop = None
     
     def _get_headers(self) -> dict:
         headers = {}
@@ -376,9 +795,8 @@ class NightscoutClient:
         if not self.base_url:
             raise ValueError("NIGHTSCOUT_URL environment variable is not set")
         
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}{endpoint}"
-            return await self._get_json_with_fallback(client, url, params)
+        url = f"{self.base_url}{endpoint}"
+        return await self._get_json_with_fallback(self._get_http(), url, params)
 
     async def _get_json_with_fallback(
         self,
@@ -386,62 +804,1070 @@ class NightscoutClient:
         url: str,
         params: dict | None = None,
     ) -> list | dict:
-        headers = dict(self._get_headers())
-        headers["Accept"] = "application/json"
-
-        resp = await client.get(
-            url,
-            params=self._add_token_param(params),
-            headers=headers,
-            timeout=30.0,
-        )
-        resp.raise_for_status()
+        """GET JSON from url; concurrent identical requests share one HTTP call."""
+        if self.json_suffix and "/api/v1/" in url and not url.endswith(".json"):
+            url += ".json"
+        key = request_key(url, params)
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._get_json(client, url, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget_inflight(key, done))
+        # Shielded, so one cancelled caller does not cancel the others
+        return await asyncio.shield(task)
+
+    def _forget_inflight(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller was cancelled
+
+    async def _get_json(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        params: dict | None = None,
+    ) -> list | dict:
+        """GET JSON from url, retrying transient failures (see NIGHTSCOUT_RETRIES)."""
+        endpoint = endpoint_label(url, self.base_url)
+        attempt = 0
+        while True:
+            try:
+                resp, elapsed_ms = await self._send_hedged(client, url, params, endpoint)
+                resp.raise_for_status()
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if call_time_left() == 0:
+                    raise DeadlineExceeded(t("deadline_exceeded", seconds=CALL_DEADLINE_S)) from e
+                delay = retry_delay(e, attempt)
+                left = call_time_left()
+                if delay is None or (left is not None and delay >= left):
+                    raise
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
         try:
-            return resp.json()
+            decode_started = time.perf_counter()
+            data = resp.json()
+            metrics.record_request(
+                endpoint, elapsed_ms, resp.status_code, len(resp.content),
+                (time.perf_counter() - decode_started) * 1000,
+            )
+            return data
         except ValueError:
+            metrics.record_request(endpoint, elapsed_ms, resp.status_code, len(resp.content))
             if not url.endswith(".json"):
-                return await self._get_json_with_fallback(client, url + ".json", params)
+                return await self._get_json(client, url + ".json", params)
             snippet = resp.text[:300].replace("\n", " ").strip()
             raise ValueError(f"Non-JSON response from {url}: {snippet}")
+
+    async def _send_hedged(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        params: dict | None,
+        endpoint: str,
+    ) -> tuple[httpx.Response, float]:
+        """Send a GET, and a duplicate if the first is slower than the endpoint's p95."""
+        delay_ms = self._hedge_delay(endpoint)
+        if delay_ms is None:
+            return await self._send(client, url, params, endpoint)
+        first = asyncio.ensure_future(self._send(client, url, params, endpoint))
+        second = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay_ms / 1000)
+            if done:
+                return first.result()
+            self.hedged += 1
+            second = asyncio.ensure_future(self._send(client, url, params, endpoint))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both failed: report the original request's error
+            return first.result()
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def _hedge_delay(self, endpoint: str) -> float | None:
+        """Time after which a request to `endpoint` is hedged, ms; None if it is not."""
+        # Through the daemon a duplicate would join the same upstream request
+        if not HEDGE or daemon is not None:
+            return None
+        hist = self._latency.get(endpoint)
+        if hist is None or hist.count < HEDGE_MIN_SAMPLES:
+            return None
+        cached = self._hedge_after.get(endpoint)
+        if cached is None or hist.count - cached[0] >= HEDGE_REFRESH:
+            cached = (hist.count, max(HEDGE_MIN_MS, hist.percentile(95)))
+            self._hedge_after[endpoint] = cached
+        return cached[1]
+
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        params: dict | None,
+        endpoint: str,
+    ) -> tuple[httpx.Response, float]:
+        """One GET within the call's deadline; returns the response and its time, ms."""
+        self.requests += 1
+        headers = dict(self._get_headers())
+        headers["Accept"] = "application/json"
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        timeout = request_timeout()
+        started = time.perf_counter()
+        try:
+            resp = None
+            if daemon is not None:
+                resp = await daemon.get(url, self._add_token_param(params), headers, timeout)
+            if resp is None:
+                resp = await client.get(
+                    url,
+                    params=self._add_token_param(params),
+                    headers=headers,
+                    timeout=timeout,
+                )
+        except httpx.HTTPError as e:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            metrics.record_request(endpoint, elapsed_ms, "error", 0)
+            if self.tuner is not None:
+                self.tuner.observe(elapsed_ms, 0, 0, timeout=isinstance(e, httpx.TimeoutException))
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if self.tuner is not None:
+            self.tuner.observe(elapsed_ms, resp.status_code, len(resp.content))
+        if resp.is_error:
+            metrics.record_request(endpoint, elapsed_ms, resp.status_code, len(resp.content))
+        else:
+            self._latency.setdefault(endpoint, LatencyHistogram()).observe(elapsed_ms)
+        return resp, elapsed_ms
     
-    async def fetch_entries_in_range(self, start_ts: int, end_ts: int, max_per_request: int = 10000) -> list:
-        """Fetch all entries in date range with pagination."""
+    async def fetch_series(self, start_ts: int, end_ts: int) -> GlucoseSeries:
+        """Valid sgv readings in date range as a compact GlucoseSeries."""
+        parts = [
+            GlucoseSeries.from_entries(page, GLUCOSE_MIN_VALID)
+            async for page in self.iter_entries(start_ts, end_ts, fields=HISTORY_FIELDS)
+        ]
+        return GlucoseSeries.concat(parts)
+
+    async def fetch_entries_in_range(
+        self,
+        start_ts: int,
+        end_ts: int,
+        max_per_request: int = 10000,
+        concurrency: int | None = None,
+    ) -> list:
+        """Fetch all entries in date range, newest first."""
+        pages = [page async for page in self.iter_entries(start_ts, end_ts, max_per_request, concurrency)]
+        return merge_entry_pages(pages)
+
+    async def _detect_entries_route(self) -> str:
+        """The leanest entries route the server supports.
+
+        API v3 can project fields server-side; the v1 `/entries/sgv` route
+        filters by type but returns full documents; plain `/entries` is the
+        last resort.
+        """
+        if not self.entries_route:
+            await self.ensure_capabilities()
+        return self.entries_route or "v1"
+
+    async def ensure_capabilities(self) -> Capabilities:
+        """The site's capabilities from its on-disk profile, probing it if there is none.
+
+        Concurrent callers share one probe.
+        """
+        if self.caps is not None:
+            return self.caps
+        task = self._probe_task
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = self._probe_task = asyncio.ensure_future(self._load_capabilities())
+        return await asyncio.shield(task)
+
+    async def _load_capabilities(self) -> Capabilities:
+        path = capabilities_path_for(self.base_url)
+        caps = load_capabilities(path, CAPABILITIES_TTL_S) if CAPABILITIES_TTL_S > 0 else None
+        if caps is None:
+            caps, reachable = await self.probe_capabilities()
+            # An unreachable site or a refused login says nothing about the
+            # server: nothing is applied and the next caller probes again
+            if not reachable or caps.auth == "rejected":
+                self._probe_task = None
+                return caps
+            if CAPABILITIES_TTL_S > 0:
+                save_capabilities(path, caps)
+        self._apply_capabilities(caps)
+        self.caps = caps
+        return caps
+
+    def _apply_capabilities(self, caps: Capabilities) -> None:
+        if caps.api_v3 and API_V3:
+            self.entries_route = "v3"
+        elif caps.v1_sgv:
+            self.entries_route = "v1-sgv"
+        else:
+            self.entries_route = "v1"
+        if self.count_supported is None:
+            self.count_supported = caps.count
+        self.v3_max_limit = caps.v3_max_limit or V3_MAX_LIMIT
+        self.json_suffix = caps.json_suffix
+        if self.tuner is not None:
+            self.tuner.cap_page(self._max_page(MAX_PAGE))
+
+    def forget_capabilities(self) -> None:
+        """Drop the profile on disk and in memory, so the next call probes the site again."""
+        forget_capabilities(capabilities_path_for(self.base_url))
+        self.caps = None
+        self._probe_task = None
+        self.entries_route = None
+
+    async def probe_capabilities(self) -> tuple[Capabilities, bool]:
+        """Probe the site with a few small concurrent requests.
+
+        Returns the capabilities and whether the site answered at all.
+        Ranges in the future are used where possible, so the probes
+        transfer no readings.
+        """
+        caps = Capabilities()
+        caps.auth = "token" if self.token else "api-secret" if self._get_headers() else "none"
+        caps.probed_at = time.time()
+        http = self._get_http()
+        future = now_ms() + 86400000
+
+        async def get(url: str, params: dict | None = None) -> list | dict | None:
+            try:
+                return unwrap_v3_result(await self._get_json_with_fallback(http, url, params))
+            except (httpx.HTTPError, ValueError):
+                return None
+
+        async def status() -> bool:
+            url = f"{self.base_url}/api/v1/status"
+            try:
+                resp, _ = await self._send(http, url, None, endpoint_label(url, self.base_url))
+            except httpx.HTTPError:
+                return False
+            if resp.status_code in (401, 403):
+                caps.auth = "rejected"
+                return True
+            caps.compression = resp.headers.get("content-encoding", "identity")
+            try:
+                data = resp.json()
+            except ValueError:
+                caps.json_suffix = True
+                data = await get(url + ".json")
+            if isinstance(data, dict) and isinstance(data.get("version"), str):
+                caps.server_version = data["version"]
+            return True
+
+        async def v3() -> None:
+            if not API_V3:
+                return
+            url = f"{self.base_url}/api/v3/entries"
+
+            async def accepts(limit: int) -> bool:
+                return isinstance(await get(url, {"limit": limit, "date$gte": future, "fields": "date"}), list)
+
+            # The usual cap is tried alongside, smaller ones only if it is refused
+            docs, accepted = await asyncio.gather(
+                get(url, {"limit": 1, "fields": ",".join(STATS_FIELDS)}), accepts(V3_MAX_LIMIT)
+            )
+            if not isinstance(docs, list):
+                return
+            caps.api_v3 = True
+            allowed = {*STATS_FIELDS, "identifier", "_id"}
+            caps.v3_projection = all(isinstance(doc, dict) and doc.keys() <= allowed for doc in docs)
+            if accepted:
+                caps.v3_max_limit = V3_MAX_LIMIT
+                return
+            for limit in (500, 100):
+                if await accepts(limit):
+                    caps.v3_max_limit = limit
+                    break
+
+        async def v1_sgv() -> None:
+            caps.v1_sgv = isinstance(await get(f"{self.base_url}/api/v1/entries/sgv.json", {"count": 1}), list)
+
+        async def count() -> None:
+            params = {"find[date][$gte]": future, "find[type]": "sgv"}
+            caps.count = parse_count(await get(f"{self.base_url}/api/v1/count/entries/where", params) or {}) is not None
+
+        reachable, *_ = await asyncio.gather(status(), v3(), v1_sgv(), count())
+        return caps, reachable
+
+    async def _fetch_entries_page(
+        self,
+        start_ts: int,
+        end_ts: int,
+        limit: int,
+        fields: tuple[str, ...] | None,
+        skip: int = 0,
+    ) -> list:
+        """Fetch one page of sgv entries in [start_ts, end_ts), newest first."""
+        started = time.perf_counter()
+        try:
+            entries = await self._request_entries_page(start_ts, end_ts, limit, fields, skip)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                # The server changed since it was probed
+                self.forget_capabilities()
+            raise
+        if self.tuner is not None:
+            self.tuner.observe_page(
+                len(entries), limit, (time.perf_counter() - started) * 1000, self._max_page(MAX_PAGE)
+            )
+        return entries
+
+    async def _request_entries_page(
+        self,
+        start_ts: int,
+        end_ts: int,
+        limit: int,
+        fields: tuple[str, ...] | None,
+        skip: int,
+    ) -> list:
+        metrics.add_pages()
+        route = self.entries_route or "v1"
+        http = self._get_http()
+        if route == "v3":
+            params = {
+                "limit": limit,
+                "skip": skip,
+                "date$gte": start_ts,
+                "date$lt": end_ts,
+                "type$eq": "sgv",
+                "sort$desc": "date",
+            }
+            if fields:
+                params["fields"] = ",".join(fields)
+            data = await self._get_json_with_fallback(http, f"{self.base_url}/api/v3/entries", params)
+            entries = unwrap_v3_result(data) or []
+            if fields and self.caps is not None and not self.caps.v3_projection:
+                entries = project_entries(entries, fields)
+            return entries
+
+        params = {
+            "count": limit,
+            "find[date][$gte]": start_ts,
+            "find[date][$lt]": end_ts,
+        }
+        if route == "v1-sgv":
+            url = f"{self.base_url}/api/v1/entries/sgv.json"
+        else:
+            url = f"{self.base_url}/api/v1/entries"
+            params["find[type]"] = "sgv"
+        entries = await self._get_json_with_fallback(http, url, params)
+        if fields and entries:
+            # v1 has no server-side projection; drop unused keys right away
+            entries = [{k: e[k] for k in fields if k in e} for e in entries]
+        return entries
+
+    async def count_entries(self, start_ts: int, end_ts: int) -> int | None:
+        """Number of sgv readings in [start_ts, end_ts) from the server, or None if it cannot count."""
+        if self.count_supported is False:
+            return None
+        key = (start_ts, end_ts)
+        if key in self._counts:
+            return self._counts[key]
+        params = {"find[date][$gte]": start_ts, "find[date][$lt]": end_ts, "find[type]": "sgv"}
+        try:
+            data = await self._get_json_with_fallback(
+                self._get_http(), f"{self.base_url}/api/v1/count/entries/where", params
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (400, 404, 405, 501):
+                self.count_supported = False
+            return None
+        except (httpx.TransportError, ValueError):
+            return None
+        count = parse_count(data)
+        if count is None:
+            self.count_supported = False
+            return None
+        self.count_supported = True
+        if len(self._counts) >= MAX_COUNTS:
+            self._counts.clear()
+        self._counts[key] = count
+        return count
+
+    async def estimate_entries(self, start_ts: int, end_ts: int) -> tuple[int, str]:
+        """Expected readings in [start_ts, end_ts) and the source of the estimate ("count" or "cadence")."""
+        if COUNT_PREFLIGHT and end_ts - start_ts >= PLAN_MIN_SPAN_MS:
+            count = await self.count_entries(start_ts, end_ts)
+            if count is not None:
+                return count, "count"
+        return max(0, -(-(end_ts - start_ts) // CGM_INTERVAL_MS)), "cadence"
+
+    async def plan_fetch(
+        self,
+        start_ts: int,
+        end_ts: int,
+        max_per_request: int = 10000,
+        concurrency: int | None = None,
+    ) -> FetchPlan:
+        """Plan fetching [start_ts, end_ts) from the server (see planner.make_plan)."""
+        estimated, source = await self.estimate_entries(start_ts, end_ts)
+        if self.tuner is not None:
+            # The tuner limits requests in flight as the plan runs
+            max_page = min(self._max_page(max_per_request), self.tuner.page_size)
+            concurrency = concurrency or self.tuner.max_concurrency
+        else:
+            max_page = self._max_page(max_per_request)
+            concurrency = concurrency or FETCH_CONCURRENCY
+        return make_plan(start_ts, end_ts, estimated, source, max_page, concurrency)
+
+    def _max_page(self, max_per_request: int) -> int:
+        return min(max_per_request, self.v3_max_limit) if self.entries_route == "v3" else max_per_request
+
+    def _inflight_limit(self, concurrency: int) -> int:
+        return min(concurrency, self.tuner.inflight) if self.tuner is not None else concurrency
+
+    async def _sample_histograms(self, boundaries: list[int], store: EntryStore | None) -> list[GlucoseHistogram] | None:
+        """Histograms for periods [boundaries[i], boundaries[i + 1]) from a sample, or None.
+
+        Sampling applies when the readings still to download (those not in
+        the store) exceed FETCH_BUDGET. The budget is split between periods
+        by their estimated readings; each period is sampled on its own and
+        its histogram's `sample_of` holds that estimate.
+        """
+        if not FETCH_BUDGET:
+            return None
+        gaps = store.missing_ranges(boundaries[0], boundaries[-1]) if store is not None else [(boundaries[0], boundaries[-1])]
+        needed = 0
+        for gap_start, gap_end in gaps:
+            needed += (await self.estimate_entries(gap_start, gap_end))[0]
+        if needed <= FETCH_BUDGET:
+            return None
+        periods = list(zip(boundaries, boundaries[1:]))
+        estimates = await asyncio.gather(*(self.estimate_entries(start, end) for start, end in periods))
+        total = sum(estimated for estimated, _ in estimates)
+        if total <= FETCH_BUDGET:
+            return None
+        plans = [
+            make_plan(start, end, estimated, source, self._max_page(MAX_PAGE), FETCH_CONCURRENCY,
+                      max(1, FETCH_BUDGET * estimated // total))
+            for (start, end), (estimated, source) in zip(periods, estimates)
+        ]
+        semaphore = asyncio.Semaphore(self._inflight_limit(FETCH_CONCURRENCY))
+
+        async def fetch(plan: FetchPlan, window: tuple[int, int]) -> list:
+            async with semaphore:
+                return await self._fetch_entries_page(window[0], window[1], plan.page_size, STATS_FIELDS)
+
+        async def sample(plan: FetchPlan) -> GlucoseHistogram:
+            hist = GlucoseHistogram()
+            hist.sample_of = plan.estimated
+            if not plan.estimated:
+                return hist
+            pages = await asyncio.gather(*(fetch(plan, window) for window in plan.windows))
+            with metrics.phase("compute"):
+                for page in pages:
+                    hist.add_values(round(e["sgv"]) for e in page if e.get("sgv"))
+            metrics.note_append("plans", {
+                **plan.as_dict(),
+                "actual_requests": len(pages),
+                "actual_readings": sum(len(page) for page in pages),
+            })
+            return hist
+
+        return list(await asyncio.gather(*(sample(plan) for plan in plans)))
+
+    async def iter_entries(
+        self,
+        start_ts: int,
+        end_ts: int,
+        max_per_request: int = 10000,
+        concurrency: int | None = None,
+        fields: tuple[str, ...] | None = None,
+    ) -> AsyncIterator[list]:
+        """Yield entries in date range page by page, newest first.
+
+        `fields` limits each entry to the given keys, projected server-side
+        when API v3 is available. With the entry store, pages are read from
+        local storage after downloading only the parts of the range not
+        stored yet (and, with API v3, changes from the history feed);
+        stored entries carry _id, date, sgv and direction only.
+        """
+        await self._detect_entries_route()
+        store = self._get_store()
+        if store is not None:
+            await self._sync_store(store, start_ts, end_ts, max_per_request, concurrency)
+            for page in store.iter_range(start_ts, end_ts, max_per_request):
+                yield project_entries(page, fields)
+            return
+        async for page in self._iter_entries_remote(start_ts, end_ts, max_per_request, concurrency, fields):
+            yield page
+
+    async def entries_histogram(self, start_ts: int, end_ts: int) -> GlucoseHistogram:
+        """Histogram of sgv readings in date range.
+
+        Closed periods come from the result cache. With the entry store,
+        whole synced days come from per-day rollups, so the cost grows with
+        the number of days rather than readings. If the readings still to
+        download exceed NIGHTSCOUT_FETCH_BUDGET, the histogram is built
+        from a sample (its `sample_of` is set) and not cached.
+        """
+        results = await self._get_fresh_results()
+        if results is not None:
+            hist = results.get(start_ts, end_ts)
+            if hist is not None:
+                return hist
+        hist = await self._compute_histogram(start_ts, end_ts)
+        if results is not None and hist.sample_of is None:
+            results.put(start_ts, end_ts, hist)
+        return hist
+
+    async def _compute_histogram(self, start_ts: int, end_ts: int) -> GlucoseHistogram:
+        await self._detect_entries_route()
+        store = self._get_store()
+        sampled = await self._sample_histograms([start_ts, end_ts], store)
+        if sampled is not None:
+            return sampled[0]
+        if store is not None:
+            await self._sync_store(store, start_ts, end_ts, 10000, None)
+            with metrics.phase("compute"):
+                return store.histogram(start_ts, end_ts)
+        hist = GlucoseHistogram()
+        async for page in self._iter_entries_remote(start_ts, end_ts, fields=STATS_FIELDS):
+            with metrics.phase("compute"):
+                hist.add_values(round(e["sgv"]) for e in page if e.get("sgv"))
+        return hist
+
+    async def entries_histograms(self, boundaries: list[int]) -> list[GlucoseHistogram | Exception]:
+        """Histograms for consecutive periods [boundaries[i], boundaries[i + 1]).
+
+        The whole span is synced or streamed once (as concurrent windows)
+        and readings are split into periods by timestamp. If that fails,
+        each period is fetched on its own so one bad period does not fail
+        the rest; its slot then holds the exception.
+        """
+        periods = list(zip(boundaries, boundaries[1:]))
+        if not periods:
+            return []
+        results = await self._get_fresh_results()
+        cached = [results.get(start, end) if results else None for start, end in periods]
+        missing = [i for i, hist in enumerate(cached) if hist is None]
+        if not missing:
+            return cached
+        # Compute only the span of periods not cached yet
+        first, last = missing[0], missing[-1]
+        span = boundaries[first:last + 2]
+        try:
+            await self._detect_entries_route()
+            store = self._get_store()
+            computed = await self._sample_histograms(span, store)
+            if computed is None and store is not None:
+                await self._sync_store(store, span[0], span[-1], 10000, None)
+                with metrics.phase("compute"):
+                    computed = [store.histogram(start, end) for start, end in zip(span, span[1:])]
+            elif computed is None:
+                computed = [GlucoseHistogram() for _ in span[1:]]
+                async for page in self._iter_entries_remote(span[0], span[-1], fields=STATS_FIELDS):
+                    with metrics.phase("compute"):
+                        for i, chunk in enumerate(split_by_boundaries(page, span)):
+                            if chunk:
+                                computed[i].add_values(round(e["sgv"]) for e in chunk if e.get("sgv"))
+            for i, hist in enumerate(computed, start=first):
+                if cached[i] is None:
+                    cached[i] = hist
+                    if results is not None and hist.sample_of is None:
+                        results.put(*periods[i], hist)
+            return cached
+        except Exception:
+            return list(await asyncio.gather(
+                *(self.entries_histogram(start, end) for start, end in periods),
+                return_exceptions=True,
+            ))
+
+    async def _sync_store(
+        self,
+        store: EntryStore,
+        start_ts: int,
+        end_ts: int,
+        max_per_request: int,
+        concurrency: int | None,
+    ) -> None:
+        """Bring the store up to date for [start_ts, end_ts)."""
+        history = self.entries_route == "v3" and V3_SYNC
+        async with self._get_sync_lock():
+            if history:
+                await self._sync_history(store)
+            for gap_start, gap_end in store.missing_ranges(start_ts, end_ts):
+                load_started = int(datetime.now(timezone.utc).timestamp() * 1000)
+                async for page in self._iter_entries_remote(
+                    gap_start, gap_end, max_per_request, concurrency, STORE_FIELDS
+                ):
+                    with metrics.phase("compute"):
+                        store.apply(page)
+                if history:
+                    store.mark_covered(gap_start, gap_end, load_started - SYNC_CURSOR_MARGIN_MS)
+                else:
+                    store.mark_covered(gap_start, min(gap_end, load_started - BACKFILL_GRACE_MS))
+
+    async def _sync_history(self, store: EntryStore) -> int:
+        """Pull changes since the last sync from /api/v3/entries/history.
+
+        Returns the number of changed documents applied.
+        """
+        if not store.covered:
+            return 0
+        http = self._get_http()
+        applied = 0
+        for _ in range(100):  # Safety limit
+            cursor = store.last_modified
+            url = f"{self.base_url}/api/v3/entries/history/{cursor}"
+            params = {"limit": self.v3_max_limit, "fields": ",".join(STORE_FIELDS)}
+            try:
+                data = await self._get_json_with_fallback(http, url, params)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    # The server changed since it was probed
+                    self.forget_capabilities()
+                raise
+            changes = unwrap_v3_result(data) or []
+            if not changes:
+                break
+            changed_days = store.apply(changes, from_history=True)
+            if self.results is not None:
+                self.results.invalidate_days(changed_days)
+            applied += len(changes)
+            if len(changes) < self.v3_max_limit or store.last_modified <= cursor:
+                break
+        return applied
+
+    async def _iter_entries_remote(
+        self,
+        start_ts: int,
+        end_ts: int,
+        max_per_request: int = 10000,
+        concurrency: int | None = None,
+        fields: tuple[str, ...] | None = None,
+    ) -> AsyncIterator[list]:
+        """Yield entries in date range page by page, newest first, from the server.
+
+        The range is cut into time windows planned from an estimate of its
+        readings (see plan_fetch). Up to `concurrency` windows are fetched
+        ahead while earlier ones are consumed, so memory stays bounded by a
+        few pages. If the server fails under concurrent load (429, 5xx or a
+        transport error), the rest of the range is paged serially.
+        """
+        plan = await self.plan_fetch(start_ts, end_ts, max_per_request, concurrency)
+        trace = metrics.current()
+        pages_before = trace.pages if trace is not None else 0
+        readings = 0
+        try:
+            async for page in self._iter_plan(plan, fields):
+                readings += len(page)
+                yield page
+        finally:
+            if trace is not None:
+                metrics.note_append("plans", {
+                    **plan.as_dict(),
+                    "actual_requests": trace.pages - pages_before,
+                    "actual_readings": readings,
+                })
+
+    async def _iter_plan(self, plan: FetchPlan, fields: tuple[str, ...] | None) -> AsyncIterator[list]:
+        windows = plan.windows
+        if plan.concurrency <= 1 or len(windows) <= 1:
+            async for page in self._iter_entries_serial(plan.start, plan.end, plan.page_size, fields):
+                yield page
+            return
+
+        pending: deque[tuple[tuple[int, int], asyncio.Task]] = deque()
+        next_window = 0
+        remaining_end = plan.end
+        try:
+            while pending or next_window < len(windows):
+                while next_window < len(windows) and len(pending) < self._inflight_limit(plan.concurrency):
+                    window = windows[next_window]
+                    task = asyncio.create_task(
+                        self._fetch_entries_serial(window[0], window[1], plan.page_size, fields)
+                    )
+                    pending.append((window, task))
+                    next_window += 1
+                window, task = pending.popleft()
+                try:
+                    entries = await task
+                except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                    if not is_overload(e):
+                        raise
+                    # The rest of this call is paged serially; the tuner
+                    # lowers requests in flight for the next ones
+                    break
+                remaining_end = window[0]
+                if entries:
+                    yield merge_entry_pages([entries])
+            else:
+                return
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+        async for page in self._iter_entries_serial(plan.start, remaining_end, plan.page_size, fields):
+            yield page
+
+    async def _fetch_entries_serial(
+        self,
+        start_ts: int,
+        end_ts: int,
+        max_per_request: int,
+        fields: tuple[str, ...] | None = None,
+    ) -> list:
+        """Fetch entries in range by paging backward from end_ts."""
         all_entries = []
+        async for page in self._iter_entries_serial(start_ts, end_ts, max_per_request, fields):
+            all_entries.extend(page)
+        return all_entries
+
+    async def _iter_entries_serial(
+        self,
+        start_ts: int,
+        end_ts: int,
+        max_per_request: int,
+        fields: tuple[str, ...] | None = None,
+    ) -> AsyncIterator[list]:
+        """Yield entry pages in range by paging backward from end_ts.
+
+        API v3 pages with limit/skip; v1 moves the end of the range to the
+        oldest date seen.
+        """
         current_end = end_ts
+        limit = max_per_request
+        skip = 0
+        if self.entries_route == "v3":
+            limit = min(limit, self.v3_max_limit)
+        # Safety limit: four times the pages the range takes at the CGM cadence
+        max_pages = 100 + 4 * -(-(end_ts - start_ts) // (CGM_INTERVAL_MS * limit))
         
-        for _ in range(100):  # Safety limit
-            params = {
-                "count": max_per_request,
-                "find[date][$gte]": start_ts,
-                "find[date][$lt]": current_end,
-                "find[type]": "sgv",
-            }
-            
-            async with httpx.AsyncClient() as client:
-                url = f"{self.base_url}/api/v1/entries"
-                entries = await self._get_json_with_fallback(client, url, params)
+        for _ in range(max_pages):
+            entries = await self._fetch_entries_page(start_ts, current_end, limit, fields, skip)
             
             if not entries:
                 break
             
-            all_entries.extend(entries)
+            yield entries
             oldest_date = min(e["date"] for e in entries)
             
-            if len(entries) < max_per_request or oldest_date <= start_ts:
+            if len(entries) < limit or oldest_date <= start_ts:
                 break
             
-            current_end = oldest_date
-        
-        return all_entries
+            if self.entries_route == "v3":
+                skip += len(entries)
+            else:
+                current_end = oldest_date
+
+
+def parse_count(data: list | dict) -> int | None:
+    """Total of a count response: [{"_id": ..., "count": n}, ...] or {"count": n}."""
+    data = unwrap_v3_result(data)
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or not all(isinstance(d, dict) and isinstance(d.get("count"), int) for d in data):
+        return None
+    return sum(d["count"] for d in data)
+
+
+def unwrap_v3_result(data: list | dict) -> list | dict:
+    """API v3 wraps payloads as {"status": ..., "result": ...} since Nightscout 14."""
+    if isinstance(data, dict) and "result" in data:
+        return data["result"]
+    return data
+
+
+def project_entries(entries: list, fields: tuple[str, ...] | None) -> list:
+    """Limit entries to the given keys (all keys if fields is None)."""
+    if not fields:
+        return entries
+    return [{k: e[k] for k in fields if k in e} for e in entries]
+
+
+def split_by_boundaries(entries: list, boundaries: list[int]) -> list[list]:
+    """Split entries into periods [boundaries[i], boundaries[i + 1]) in one pass over sorted dates."""
+    entries = sorted(entries, key=lambda e: e["date"])
+    dates = [e["date"] for e in entries]
+    cuts = [bisect_left(dates, b) for b in boundaries]
+    return [entries[lo:hi] for lo, hi in zip(cuts, cuts[1:])]
+
+
+def endpoint_label(url: str, base_url: str) -> str:
+    """Metrics label for a request URL: path without site, suffix or cursor."""
+    path = url[len(base_url):] if url.startswith(base_url) else urlparse(url).path
+    path = path.removesuffix(".json")
+    if path.startswith("/api/v3/entries/history/"):
+        return "/api/v3/entries/history/{lastModified}"
+    return path
+
+
+class DeadlineExceeded(Exception):
+    """The tool call used up NIGHTSCOUT_CALL_DEADLINE_S."""
+
+
+# Monotonic time by which the current tool call has to finish, if any
+_call_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("nightscout_deadline", default=None)
+
+
+# Set when the current tool call's result is incomplete (e.g. a month failed);
+# such results are not kept in the response cache
+_partial_result: contextvars.ContextVar[bool] = contextvars.ContextVar("nightscout_partial", default=False)
+
+
+def mark_partial() -> None:
+    """Keep the current tool call's result out of the response cache."""
+    _partial_result.set(True)
+
+
+def call_time_left() -> float | None:
+    """Seconds left of the current call's deadline (0 when passed), None without one."""
+    deadline = _call_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def request_timeout() -> float:
+    """Timeout of the next upstream request: HTTP_TIMEOUT capped by the call's deadline."""
+    left = call_time_left()
+    if left is None:
+        return HTTP_TIMEOUT
+    if left == 0:
+        raise DeadlineExceeded(t("deadline_exceeded", seconds=CALL_DEADLINE_S))
+    return min(HTTP_TIMEOUT, left)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(error: httpx.HTTPError, attempt: int) -> float | None:
+    """Seconds to wait before retry number `attempt + 1` after `error`, or None not to retry."""
+    if attempt >= RETRIES:
+        return None
+    if isinstance(error, httpx.HTTPStatusError):
+        if error.response.status_code not in RETRY_STATUSES:
+            return None
+        after = parse_retry_after(error.response.headers.get("retry-after"))
+        if after is not None:
+            return after if after <= RETRY_AFTER_MAX_S else None
+    # Full jitter: spreads the retries of concurrent windows
+    return random.uniform(0, RETRY_BACKOFF_MS / 1000 * 2 ** attempt)
+
+
+def is_overload(error: httpx.HTTPError) -> bool:
+    """Whether `error` suggests the server is overloaded (429, 5xx or a transport error)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def request_key(url: str, params: dict | None) -> str:
+    """Normalized key of a GET request, independent of parameter order."""
+    return json.dumps([url, sorted((params or {}).items())], default=str)
+
+
+def merge_entry_pages(pages: list[list]) -> list:
+    """Merge entry pages into one list, newest first, dropping duplicates.
+
+    Entries are the same if they share an id; projected entries carry none
+    and are the same if they share date and sgv.
+    """
+    seen = set()
+    merged = []
+    for page in pages:
+        for e in page:
+            key = e.get("_id") or e.get("identifier") or (e.get("date"), e.get("sgv"))
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(e)
+    merged.sort(key=lambda e: e["date"], reverse=True)
+    return merged
 
 
 # Create server
 server = Server("nightscout")
-client = NightscoutClient()
+responses = ResponseCache(RESPONSE_CACHE_MAX_BYTES) if RESPONSE_CACHE else None
+metrics = Metrics(METRICS_FILE, METRICS_LOG)
+daemon = DaemonLink(DAEMON_SOCKET, [
+    "--timeout", str(HTTP_TIMEOUT),
+    "--max-connections", str(HTTP_MAX_CONNECTIONS),
+    "--cache-mb", str(RESPONSE_CACHE_MAX_BYTES / 1048576),
+]) if DAEMON else None
+profiler = Profiler(PROFILE_DIR, PROFILE_SLOW_MS, PROFILE_MEMORY_BYTES) if PROFILE_DIR else None
+
+
+def make_tenant(tenant_id: str, settings: dict) -> Tenant:
+    """Tenant from tenants-file settings, with environment defaults."""
+    tz, tz_label = parse_display_tz(settings["timezone"]) if "timezone" in settings else (DISPLAY_TZ, DISPLAY_TZ_LABEL)
+    return Tenant(
+        tenant_id,
+        settings["url"],
+        settings.get("api_secret", ""),
+        settings.get("units", GLUCOSE_UNITS).lower(),
+        glucose_to_mgdl(settings["low"]) if "low" in settings else GLUCOSE_LOW,
+        glucose_to_mgdl(settings["high"]) if "high" in settings else GLUCOSE_HIGH,
+        tz,
+        tz_label,
+        settings.get("locale", LOCALE).lower(),
+        settings.get("rate_limit", RATE_LIMIT),
+        settings.get("warm_sync", WARM_SYNC),
+    )
+
+
+default_tenant = Tenant(
+    "default", NIGHTSCOUT_URL, NIGHTSCOUT_API_SECRET, GLUCOSE_UNITS, GLUCOSE_LOW, GLUCOSE_HIGH,
+    DISPLAY_TZ, DISPLAY_TZ_LABEL, LOCALE, RATE_LIMIT, WARM_SYNC,
+)
+tenants = {k: make_tenant(k, v) for k, v in load_tenants_file(TENANTS_FILE).items()} if TENANTS_FILE else {}
+if DEFAULT_TENANT_ID in tenants:
+    default_tenant = tenants[DEFAULT_TENANT_ID]
+_current_tenant: contextvars.ContextVar[Tenant] = contextvars.ContextVar("nightscout_tenant", default=default_tenant)
+
+
+def tenant() -> Tenant:
+    """Tenant of the current tool call."""
+    return _current_tenant.get()
+
+
+def tenant_client(ten: Tenant) -> NightscoutClient:
+    """The tenant's Nightscout client, created (with its warm set) on first use."""
+    if ten.client is None:
+        ten.client = NightscoutClient(ten.url, ten.api_secret, ten.limiter)
+        if ten.warm_sync:
+            ten.warm = WarmSet(int(WARM_HOURS * 3600 * 1000), UPLOAD_LAG_MS, WARM_RETRY_MS)
+    return ten.client
+
+
+def current_client() -> NightscoutClient:
+    return tenant_client(tenant())
+
+
+def session_request():
+    """HTTP request of the current call, or None over stdio."""
+    try:
+        request = server.request_context.request
+    except LookupError:
+        return None
+    return request if hasattr(request, "headers") else None
+
+
+def resolve_tenant(tenant_id: str | None) -> Tenant:
+    """Tenant for a call.
+
+    Over HTTP it is the session's tenant, fixed at initialize by http_app
+    (header or ?tenant=), else the default; a `tenant` argument naming any
+    other is refused. Over stdio the argument picks the tenant.
+    """
+    request = session_request()
+    if request is not None:
+        bound = request.headers.get("x-nightscout-tenant") or request.query_params.get("tenant")
+        if tenant_id and tenant_id != (bound or default_tenant.id):
+            raise ValueError(t("tenant_not_allowed", tenant=tenant_id))
+        tenant_id = bound
+        if not tenant_id and tenants and not default_tenant.url:
+            raise ValueError(t("tenant_session_required"))
+    if tenant_id:
+        if tenant_id in tenants:
+            return tenants[tenant_id]
+        if tenant_id == default_tenant.id:
+            return default_tenant
+        raise ValueError(t("unknown_tenant", tenant=tenant_id))
+    if tenants and not default_tenant.url:
+        raise ValueError(t("tenant_required"))
+    return default_tenant
+
+
+tenant_client(default_tenant)
+
+
+def now_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
+
+
+def warm_set(start_ts: int | None = None) -> WarmSet | None:
+    """The warm set if it can answer now (for entries since start_ts)."""
+    warm = tenant().warm
+    if warm is None:
+        return None
+    now = now_ms()
+    ready = warm.is_fresh(now) if start_ts is None else warm.covers(start_ts, now)
+    if not ready:
+        return None
+    warm.hits += 1
+    return warm
+
+
+async def refresh_warm_set(warm: WarmSet, client: NightscoutClient) -> None:
+    """One poll: latest entry, new entries, device status and (rarely) status."""
+    now = now_ms()
+    latest = await client.fetch("/api/v1/entries", {"count": 1})
+    previous = warm.latest_date()
+    warm.latest_entry = latest[0] if latest else None
+    newest = warm.latest_date()
+    since = None
+    if warm.covers_from is None:
+        since = now - warm.window_ms
+    elif newest is not None and (previous is None or newest > previous):
+        # Refetch an overlap as well, for late uploads and edits
+        since = max(now - warm.window_ms, (previous or newest) - WARM_REFETCH_MS)
+    if since is not None:
+        end_ts = max(now, newest or 0) + 1
+        warm.replace_since(since, await client.fetch_series(since, end_ts))
+    warm.trim(now)
+    warm.devicestatus = await client.fetch("/api/v1/devicestatus", {"count": WARM_DEVICESTATUS_COUNT})
+    if warm.status_at is None or now - warm.status_at >= WARM_STATUS_REFRESH_MS:
+        warm.status = await client.fetch("/api/v1/status")
+        warm.status_at = now
+    warm.synced_at = now
+    warm.polls += 1
+
+
+async def run_warm_sync(ten: Tenant) -> None:
+    """Poll just after each expected reading, learning the cadence as it goes."""
+    _current_tenant.set(ten)
+    warm = ten.warm
+    while True:
+        try:
+            await refresh_warm_set(warm, ten.client)
+            delay = warm.next_poll_delay(now_ms())
+        except Exception:
+            delay = WARM_RETRY_MS
+        await asyncio.sleep(delay / 1000)
 
 
 @server.list_tools()
 async def list_tools() -> list[Tool]:
+    tools = tool_definitions()
+    if tenants:
+        for tool in tools:
+            tool.inputSchema.setdefault("properties", {})["tenant"] = {
+                "type": "string",
+                "description": "Tenant (Nightscout site) id; over HTTP only the session's tenant is allowed",
+            }
+    return tools
+
+
+def tool_definitions() -> list[Tool]:
     return [
         Tool(
             name="glucose_current",
@@ -493,6 +1919,14 @@ async def list_tools() -> list[Tool]:
                         "minimum": 50,
                         "maximum": 100,
                     },
+                    "tirLow": {
+                        "type": "number",
+                        "description": "TIR lower bound for this request (mmol/L if < 30, else mg/dL); defaults to GLUCOSE_LOW",
+                    },
+                    "tirHigh": {
+                        "type": "number",
+                        "description": "TIR upper bound for this request (mmol/L if < 30, else mg/dL); defaults to GLUCOSE_HIGH",
+                    },
                 },
             },
         ),
@@ -529,6 +1963,14 @@ async def list_tools() -> list[Tool]:
                         "minimum": 50,
                         "maximum": 100,
                     },
+                    "tirLow": {
+                        "type": "number",
+                        "description": "TIR lower bound for this request (mmol/L if < 30, else mg/dL); defaults to GLUCOSE_LOW",
+                    },
+                    "tirHigh": {
+                        "type": "number",
+                        "description": "TIR upper bound for this request (mmol/L if < 30, else mg/dL); defaults to GLUCOSE_HIGH",
+                    },
                 },
                 "required": ["year"],
             },
@@ -605,68 +2047,212 @@ async def list_tools() -> list[Tool]:
                 },
             },
         ),
+        Tool(
+            name="diagnostics",
+            description="Show cache and local store statistics of this server",
+            inputSchema={"type": "object", "properties": {}, "required": []},
+        ),
+        Tool(
+            name="server_metrics",
+            description="Show latency metrics of this server: per-tool p50/p95/p99, time per phase (upstream, decode, compute, render) and Nightscout request statistics",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "format": {
+                        "type": "string",
+                        "enum": ["text", "json", "prometheus"],
+                        "description": "Output format",
+                        "default": "text",
+                    },
+                    "reset": {
+                        "type": "boolean",
+                        "description": "Clear the metrics after reporting them",
+                        "default": False,
+                    },
+                },
+            },
+        ),
     ]
 
 
+def is_relative_range(name: str, arguments: dict) -> bool:
+    """True if the tool's time range is measured back from now."""
+    if name in ("glucose_history", "treatments", "insulin_log"):
+        return True
+    if name == "analyze":
+        to_date = arguments.get("to")
+        return not to_date or any(
+            isinstance(v, str) and re.match(r"^\d+[dwmy]$", v, re.I)
+            for v in (arguments.get("from"), to_date)
+        )
+    return False
+
+
+def response_cache_key(name: str, arguments: dict, now_ms: int) -> str:
+    """Canonical cache key for a tool call.
+
+    Defaults are filled in, numbers and strings normalized, and ranges
+    relative to now snapped to RESPONSE_BUCKET_MS buckets, so
+    near-duplicate calls share a key.
+    """
+    args = {**TOOL_DEFAULTS.get(name, {}), **arguments}
+    for key, value in args.items():
+        if isinstance(value, float) and value.is_integer():
+            args[key] = int(value)
+        elif isinstance(value, str):
+            args[key] = value.strip().lower()
+    bucket = now_ms // RESPONSE_BUCKET_MS if is_relative_range(name, args) else None
+    return json.dumps([tenant().id, name, args, bucket], sort_keys=True, default=str)
+
+
+def shared_response_key(key: str) -> str:
+    """Response cache key valid across processes: adds the site and display settings."""
+    ten = tenant()
+    return json.dumps([current_client().base_url, ten.units, ten.low, ten.high, ten.tz_label, ten.locale, key])
+
+
+def response_ttl(name: str, now_ms: int) -> float:
+    """Seconds a response stays fresh; 0 means do not cache."""
+    if name == "glucose_current":
+        client = current_client()
+        if client.last_reading_ts is None:
+            return 0
+        expected = client.last_reading_ts + CGM_INTERVAL_MS + UPLOAD_LAG_MS
+        return max(MIN_CURRENT_TTL, (expected - now_ms) / 1000)
+    return RESPONSE_TTLS.get(name, 0)
+
+
 @server.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
+    arguments = dict(arguments or {})
+    with metrics.call(name) as trace:
+        try:
+            ten = resolve_tenant(arguments.pop("tenant", None))
+        except ValueError as e:
+            trace.error = True
+            return [TextContent(type="text", text=t("error", error=e))]
+        if tenants:
+            metrics.note("tenant", ten.id)
+        token = _current_tenant.set(ten)
+        deadline = _call_deadline.set(time.monotonic() + CALL_DEADLINE_S if CALL_DEADLINE_S > 0 else None)
+        try:
+            return await traced_call_tool(name, arguments, trace)
+        finally:
+            _call_deadline.reset(deadline)
+            _current_tenant.reset(token)
+
+
+async def traced_call_tool(name: str, arguments: dict, trace) -> list[TextContent]:
+    key = None
+    if responses is not None and (name in RESPONSE_TTLS or name == "glucose_current"):
+        key = response_cache_key(name, arguments, int(datetime.now(timezone.utc).timestamp() * 1000))
+        cached = responses.get(key)
+        if cached is not None:
+            trace.cached = True
+            return list(cached)
+        if daemon is not None:
+            texts = await daemon.cache_get(shared_response_key(key))
+            if texts is not None:
+                trace.cached = True
+                return [TextContent(type="text", text=text) for text in texts]
+    partial = _partial_result.set(False)
     try:
-        if name == "glucose_current":
-            return await glucose_current()
-        elif name == "glucose_history":
-            return await glucose_history(
-                arguments.get("hours", 6),
-                arguments.get("count", 100),
-            )
-        elif name == "analyze":
-            return await analyze(
-                arguments.get("from", "7d"),
-                arguments.get("to"),
-                arguments.get("tirGoal", 70),
-            )
-        elif name == "analyze_monthly":
-            return await analyze_monthly(
-                arguments["year"],
-                arguments.get("fromMonth", 1),
-                arguments.get("toMonth", 12),
-                arguments.get("tirGoal", 85),
-            )
-        elif name == "treatments":
-            return await treatments(
-                arguments.get("hours", 24),
-                arguments.get("count", 50),
-            )
-        elif name == "insulin_log":
-            return await insulin_log(
-                arguments.get("hours", 24),
-                arguments.get("count", 50),
-            )
-        elif name == "pump_reservoir":
-            return await pump_reservoir()
-        elif name == "status":
-            return await status()
-        elif name == "devices":
-            return await devices(arguments.get("count", 5))
+        if profiler is None:
+            result = await dispatch_tool(name, arguments)
         else:
-            return [TextContent(type="text", text=t("unknown_tool", name=name))]
+            run = None
+            try:
+                with profiler.profile(name, arguments) as run:
+                    result = await dispatch_tool(name, arguments)
+            finally:
+                if run is not None:
+                    metrics.note("profile_peak_kb", round(run.peak_bytes / 1024, 1))
+                    if run.path:
+                        metrics.note("profile", run.path)
     except Exception as e:
+        trace.error = True
         return [TextContent(type="text", text=t("error", error=e))]
+    finally:
+        incomplete = _partial_result.get()
+        _partial_result.reset(partial)
+    if key is not None and not incomplete:
+        size = len(key) + sum(len(c.text.encode("utf-8")) for c in result)
+        ttl = response_ttl(name, int(datetime.now(timezone.utc).timestamp() * 1000))
+        responses.put(key, result, size, ttl)
+        if daemon is not None and ttl > 0:
+            await daemon.cache_put(shared_response_key(key), [c.text for c in result], ttl)
+    return list(result)
+
+
+async def dispatch_tool(name: str, arguments: dict) -> list[TextContent]:
+    if name == "glucose_current":
+        return await glucose_current()
+    elif name == "glucose_history":
+        return await glucose_history(
+            arguments.get("hours", 6),
+            arguments.get("count", 100),
+        )
+    elif name == "analyze":
+        return await analyze(
+            arguments.get("from", "7d"),
+            arguments.get("to"),
+            arguments.get("tirGoal", 70),
+            arguments.get("tirLow"),
+            arguments.get("tirHigh"),
+        )
+    elif name == "analyze_monthly":
+        return await analyze_monthly(
+            arguments["year"],
+            arguments.get("fromMonth", 1),
+            arguments.get("toMonth", 12),
+            arguments.get("tirGoal", 85),
+            arguments.get("tirLow"),
+            arguments.get("tirHigh"),
+        )
+    elif name == "treatments":
+        return await treatments(
+            arguments.get("hours", 24),
+            arguments.get("count", 50),
+        )
+    elif name == "insulin_log":
+        return await insulin_log(
+            arguments.get("hours", 24),
+            arguments.get("count", 50),
+        )
+    elif name == "pump_reservoir":
+        return await pump_reservoir()
+    elif name == "status":
+        return await status()
+    elif name == "devices":
+        return await devices(arguments.get("count", 5))
+    elif name == "diagnostics":
+        return await diagnostics()
+    elif name == "server_metrics":
+        return await server_metrics(arguments.get("format", "text"), arguments.get("reset", False))
+    else:
+        return [TextContent(type="text", text=t("unknown_tool", name=name))]
 
 
 async def glucose_current() -> list[TextContent]:
-    entries = await client.fetch("/api/v1/entries", {"count": 1})
+    client = current_client()
+    warm_data = warm_set()
+    if warm_data is not None:
+        entries = [warm_data.latest_entry] if warm_data.latest_entry else []
+    else:
+        entries = await client.fetch("/api/v1/entries", {"count": 1})
     if not entries:
         return [TextContent(type="text", text=t("no_glucose"))]
     
     e = entries[0]
+    client.last_reading_ts = e["date"]
     arrow = DIRECTION_ARROWS.get(e.get("direction", ""), e.get("direction", ""))
     dt = to_display_tz(datetime.fromtimestamp(e["date"] / 1000, tz=timezone.utc))
     delta = e.get('delta', 0)
-    delta_formatted = format_glucose_short(abs(delta)) if GLUCOSE_UNITS == "mmol" else str(int(delta))
+    delta_formatted = format_glucose_short(abs(delta)) if tenant().units == "mmol" else str(int(delta))
     
     text = (
         f"🩸 {t('current_glucose', value=format_glucose(e['sgv']), arrow=arrow)}\n"
-        f"📅 {t('time_tz', time=dt.strftime('%Y-%m-%d %H:%M'), tz=DISPLAY_TZ_LABEL)}\n"
+        f"📅 {t('time_tz', time=dt.strftime('%Y-%m-%d %H:%M'), tz=tenant().tz_label)}\n"
         f"📈 {t('delta', sign='+' if delta >= 0 else '-', delta=delta_formatted)}\n"
         f"📱 {t('device', device=e.get('device', 'N/A'))}"
     )
@@ -675,18 +2261,23 @@ async def glucose_current() -> list[TextContent]:
 
 
 async def glucose_history(hours: int, count: int) -> list[TextContent]:
+    client = current_client()
     now = int(datetime.now(timezone.utc).timestamp() * 1000)
     start_ts = now - hours * 60 * 60 * 1000
     
-    entries = await client.fetch_entries_in_range(start_ts, now)
-    if not entries:
+    warm_data = warm_set(start_ts)
+    if warm_data is not None:
+        series = warm_data.series.slice(start_ts, now)
+    else:
+        series = await client.fetch_series(start_ts, now)
+    with metrics.phase("compute"):
+        stats = accumulator_stats(GlucoseAccumulator(tenant().low, tenant().high).add_values(series.sgv))
+    recent_entries = series.newest(15)
+    if not stats:
         return [TextContent(type="text", text=t("no_data_hours", hours=hours))]
     
-    sgv_values = filter_valid_sgv(entries)
-    stats = calculate_stats(sgv_values)
-    
     text = (
-        f"📊 {t('history_title', hours=hours, count=len(sgv_values))}\n\n"
+        f"📊 {t('history_title', hours=hours, count=stats['count'])}\n\n"
         f"📈 {t('statistics')}\n"
         f"• {t('average', value=stats['avg_formatted'])}\n"
         f"• {t('min_max', min=format_glucose_short(stats['min']), max=format_glucose_short(stats['max']))}\n"
@@ -695,20 +2286,26 @@ async def glucose_history(hours: int, count: int) -> list[TextContent]:
         f"📋 {t('recent_readings')}"
     )
     
-    # Filter out sensor errors for display
-    valid_entries = [e for e in entries if e.get("sgv") and e["sgv"] >= GLUCOSE_MIN_VALID]
-    for e in valid_entries[:min(count, 15)]:
+    for e in recent_entries[:min(count, 15)]:
         dt = to_display_tz(datetime.fromtimestamp(e["date"] / 1000, tz=timezone.utc))
         arrow = DIRECTION_ARROWS.get(e.get("direction", ""), "")
         text += f"\n• {dt.strftime('%m-%d %H:%M')}: {format_glucose_short(e['sgv'])} {arrow}"
     
-    if len(valid_entries) > 15:
-        text += f"\n{t('more_readings', count=len(valid_entries) - 15)}"
+    if stats["count"] > 15:
+        text += f"\n{t('more_readings', count=stats['count'] - 15)}"
     
     return [TextContent(type="text", text=text)]
 
 
-async def analyze(from_date: str, to_date: str | None, tir_goal: int) -> list[TextContent]:
+async def analyze(
+    from_date: str,
+    to_date: str | None,
+    tir_goal: int,
+    tir_low: float | None = None,
+    tir_high: float | None = None,
+) -> list[TextContent]:
+    client = current_client()
+    low, high = parse_tir_bounds(tir_low, tir_high)
     start_ts = parse_date_to_timestamp(from_date)
     end_ts = int(datetime.now(timezone.utc).timestamp() * 1000) if not to_date else parse_date_to_timestamp(to_date)
     
@@ -722,13 +2319,12 @@ async def analyze(from_date: str, to_date: str | None, tir_goal: int) -> list[Te
     elif to_date and len(to_date) == 10:  # YYYY-MM-DD
         end_ts += 86400000  # End of day
     
-    entries = await client.fetch_entries_in_range(start_ts, end_ts)
-    if len(entries) < 10:
+    hist = await client.entries_histogram(start_ts, end_ts)
+    with metrics.phase("compute"):
+        stats = histogram_stats(hist, low, high)
+    if hist.count + hist.errors < 10 or not stats:
         return [TextContent(type="text", text=t("not_enough_data"))]
     
-    sgv_values = filter_valid_sgv(entries)
-    stats = calculate_stats(sgv_values)
-    
     from_dt = to_display_tz(datetime.fromtimestamp(start_ts / 1000, tz=timezone.utc))
     to_dt = to_display_tz(datetime.fromtimestamp(end_ts / 1000, tz=timezone.utc))
     days = (end_ts - start_ts) // 86400000
@@ -736,11 +2332,15 @@ async def analyze(from_date: str, to_date: str | None, tir_goal: int) -> list[Te
     tir_status = "✅" if stats["tir"] >= tir_goal else "⚠️" if stats["tir"] >= 70 else "❌"
     cv_status = "✅" if stats["cv"] <= 33 else "⚠️" if stats["cv"] <= 36 else "❌"
     
-    tir_label = get_tir_range_label()
+    tir_label = get_tir_range_label(low, high)
     
     count_str = f"{stats['count']:,}"
     text = (
         f"📊 {t('analysis_title', from_date=from_dt.strftime('%Y-%m-%d'), to_date=to_dt.strftime('%Y-%m-%d'), days=days, count=count_str)}\n\n"
+    )
+    if hist.sample_of is not None:
+        text += f"⚠️ {t('sampled_note', count=count_str, total=f'{hist.sample_of:,}')}\n\n"
+    text += (
         f"📈 {t('key_metrics')}\n"
         f"• {t('avg_glucose', value=stats['avg_formatted'])}\n"
         f"• {t('min_max', min=format_glucose_short(stats['min']), max=format_glucose_short(stats['max']))}\n"
@@ -773,53 +2373,79 @@ async def analyze(from_date: str, to_date: str | None, tir_goal: int) -> list[Te
     return [TextContent(type="text", text=text)]
 
 
-async def analyze_monthly(year: int, from_month: int, to_month: int, tir_goal: int) -> list[TextContent]:
-    if LOCALE == "ru":
+def month_start_ts(year: int, month: int) -> int:
+    """Timestamp (ms) of the first day of a month in UTC; month 13 is January of the next year."""
+    if month > 12:
+        year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+async def analyze_monthly(
+    year: int,
+    from_month: int,
+    to_month: int,
+    tir_goal: int,
+    tir_low: float | None = None,
+    tir_high: float | None = None,
+) -> list[TextContent]:
+    client = current_client()
+    low, high = parse_tir_bounds(tir_low, tir_high)
+    if tenant().locale == "ru":
         month_names = ["", "Янв", "Фев", "Мар", "Апр", "Май", "Июн", "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"]
     else:
         month_names = ["", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
     results = []
+    year_acc = GlucoseAccumulator(low, high)
     
-    tir_label = get_tir_range_label()
+    tir_label = get_tir_range_label(low, high)
     
     text = f"📊 {t('monthly_title', year=year, goal=tir_goal)}\n"
     text += "=" * 80 + "\n"
     text += f"{t('month_header', range=tir_label)}\n"
     text += "-" * 80 + "\n"
     
-    for month in range(from_month, to_month + 1):
-        start_dt = datetime(year, month, 1, tzinfo=timezone.utc)
-        if month == 12:
-            end_dt = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
-        else:
-            end_dt = datetime(year, month + 1, 1, tzinfo=timezone.utc)
-        
-        start_ts = int(start_dt.timestamp() * 1000)
-        end_ts = int(end_dt.timestamp() * 1000)
-        
+    months = list(range(from_month, to_month + 1))
+    boundaries = [month_start_ts(year, month) for month in months]
+    if months:
+        boundaries.append(month_start_ts(year, months[-1] + 1))
+    month_hists = await client.entries_histograms(boundaries)
+    sampled = [h for h in month_hists if isinstance(h, GlucoseHistogram) and h.sample_of is not None]
+    
+    for month, hist in zip(months, month_hists):
         try:
-            entries = await client.fetch_entries_in_range(start_ts, end_ts)
-            sgv_values = filter_valid_sgv(entries)
-            stats = calculate_stats(sgv_values)
+            if isinstance(hist, Exception):
+                raise hist
+            with metrics.phase("compute"):
+                month_acc = GlucoseAccumulator.from_histogram(hist, low, high)
+                stats = accumulator_stats(month_acc)
             
             if stats and stats["count"] > 0:
                 results.append({"month": month, "stats": stats})
+                year_acc.merge(month_acc)
                 tir_emoji = "✅" if stats["tir"] >= tir_goal else "⚠️" if stats["tir"] >= 70 else "❌"
                 cv_emoji = "✅" if stats["cv"] <= 33 else "⚠️" if stats["cv"] <= 36 else "❌"
                 text += f"{month_names[month]:5} │ {stats['tir']:6.1f}% {tir_emoji}    │ {stats['avg_formatted']:>5} │ {stats['cv']:5.1f}% {cv_emoji} │ {stats['a1c']:4.1f}% │ {stats['count']:>8,}\n"
             else:
                 text += f"{month_names[month]:5} │ {t('no_data')}\n"
         except Exception as e:
+            mark_partial()
             text += f"{month_names[month]:5} │ Error: {str(e)[:40]}\n"
     
     text += "=" * 80 + "\n"
+    if sampled:
+        sample_str = f"{sum(h.count for h in sampled):,}"
+        total_str = f"{sum(h.sample_of for h in sampled):,}"
+        text += f"⚠️ {t('sampled_note', count=sample_str, total=total_str)}\n"
     
     if results:
-        avg_tir = sum(r["stats"]["tir"] for r in results) / len(results)
-        avg_cv = sum(r["stats"]["cv"] for r in results) / len(results)
-        avg_glucose = sum(r["stats"]["avg"] for r in results) / len(results)
-        avg_a1c = sum(r["stats"]["a1c"] for r in results) / len(results)
-        total_count = sum(r["stats"]["count"] for r in results)
+        # Summary over all readings of the period, from the merged monthly partials
+        with metrics.phase("compute"):
+            year_stats = accumulator_stats(year_acc)
+        avg_tir = year_stats["tir"]
+        avg_cv = year_stats["cv"]
+        avg_glucose = year_acc.average()
+        avg_a1c = year_stats["a1c"]
+        total_count = year_stats["count"]
         
         tir_status = "✅ GOAL MET" if avg_tir >= tir_goal else f"⚠️ {tir_goal - avg_tir:.1f}% to goal"
         
@@ -849,6 +2475,7 @@ async def analyze_monthly(year: int, from_month: int, to_month: int, tir_goal: i
 
 
 async def treatments(hours: int, count: int) -> list[TextContent]:
+    client = current_client()
     now = datetime.now(timezone.utc)
     start_dt = now.timestamp() * 1000 - hours * 60 * 60 * 1000
     
@@ -865,19 +2492,19 @@ async def treatments(hours: int, count: int) -> list[TextContent]:
     total_carbs = 0
     text = f"💉 {t('treatments_title', hours=hours)}\n"
     
-    for t in data:
-        dt = to_display_tz(datetime.fromisoformat(t["created_at"].replace("Z", "+00:00")))
+    for tmt in data:
+        dt = to_display_tz(datetime.fromisoformat(tmt["created_at"].replace("Z", "+00:00")))
         line = f"• {dt.strftime('%m-%d %H:%M')}: "
-        if t.get("eventType"):
-            line += f"[{t['eventType']}] "
-        if t.get("insulin"):
-            line += f"💉 {t['insulin']} U "
-            total_insulin += t["insulin"]
-        if t.get("carbs"):
-            line += f"🍞 {t['carbs']} g "
-            total_carbs += t["carbs"]
-        if t.get("notes"):
-            line += f"📝 {t['notes']}"
+        if tmt.get("eventType"):
+            line += f"[{tmt['eventType']}] "
+        if tmt.get("insulin"):
+            line += f"💉 {tmt['insulin']} U "
+            total_insulin += tmt["insulin"]
+        if tmt.get("carbs"):
+            line += f"🍞 {tmt['carbs']} g "
+            total_carbs += tmt["carbs"]
+        if tmt.get("notes"):
+            line += f"📝 {tmt['notes']}"
         text += line + "\n"
     
     text += f"\n📊 {t('totals')}"
@@ -890,6 +2517,7 @@ async def treatments(hours: int, count: int) -> list[TextContent]:
 
 
 async def insulin_log(hours: int, count: int) -> list[TextContent]:
+    client = current_client()
     now = datetime.now(timezone.utc)
     start_dt = now.timestamp() * 1000 - hours * 60 * 60 * 1000
 
@@ -924,7 +2552,12 @@ async def insulin_log(hours: int, count: int) -> list[TextContent]:
 
 
 async def pump_reservoir() -> list[TextContent]:
-    data = await client.fetch("/api/v1/devicestatus", {"count": 1})
+    client = current_client()
+    warm_data = warm_set()
+    if warm_data is not None:
+        data = warm_data.devicestatus[:1]
+    else:
+        data = await client.fetch("/api/v1/devicestatus", {"count": 1})
     if not data:
         return [TextContent(type="text", text=t("no_pump_data"))]
 
@@ -943,16 +2576,21 @@ async def pump_reservoir() -> list[TextContent]:
     time_part = ""
     if created_at:
         dt = to_display_tz(datetime.fromisoformat(created_at.replace("Z", "+00:00")))
-        time_part = f"\n📅 {t('time_tz', time=dt.strftime('%Y-%m-%d %H:%M'), tz=DISPLAY_TZ_LABEL)}"
+        time_part = f"\n📅 {t('time_tz', time=dt.strftime('%Y-%m-%d %H:%M'), tz=tenant().tz_label)}"
 
     text = f"🧪 {t('pump_reservoir_title')}\n• {t('reservoir_value', value=reservoir)}{time_part}"
     return [TextContent(type="text", text=text)]
 
 
 async def status() -> list[TextContent]:
-    data = await client.fetch("/api/v1/status")
+    client = current_client()
+    warm_data = warm_set()
+    if warm_data is not None and warm_data.status is not None:
+        data = warm_data.status
+    else:
+        data = await client.fetch("/api/v1/status")
     
-    units_label = "mmol" if GLUCOSE_UNITS == "mmol" else "mg/dl"
+    units_label = "mmol" if tenant().units == "mmol" else "mg/dl"
     text = (
         f"⚙️ {t('status_title')}\n"
         f"• {t('status_name', value=data.get('name', 'N/A'))}\n"
@@ -985,7 +2623,12 @@ async def status() -> list[TextContent]:
 
 
 async def devices(count: int) -> list[TextContent]:
-    data = await client.fetch("/api/v1/devicestatus", {"count": count})
+    client = current_client()
+    warm_data = warm_set()
+    if warm_data is not None and count <= WARM_DEVICESTATUS_COUNT:
+        data = warm_data.devicestatus[:count]
+    else:
+        data = await client.fetch("/api/v1/devicestatus", {"count": count})
     if not data:
         return [TextContent(type="text", text=t("no_device_data"))]
     
@@ -1005,11 +2648,144 @@ async def devices(count: int) -> list[TextContent]:
     return [TextContent(type="text", text=text)]
 
 
+async def diagnostics() -> list[TextContent]:
+    client = current_client()
+    text = f"🩺 {t('diagnostics_title')}\n"
+    text += f"\n{t('diag_route', value=client.entries_route or '?')}"
+    caps = client.caps
+    if caps is not None:
+        marks = {True: "✓", False: "✗"}
+        text += "\n" + t(
+            "diag_caps",
+            version=caps.server_version or "?",
+            v3=marks[bool(caps.api_v3)],
+            limit=caps.v3_max_limit,
+            projection=marks[bool(caps.v3_projection)],
+            count=marks[bool(caps.count)],
+            suffix=marks[bool(caps.json_suffix)],
+            auth=caps.auth,
+            compression=caps.compression,
+            age=round((time.time() - caps.probed_at) / 60),
+        )
+    else:
+        text += f"\n{t('diag_caps_none')}"
+    store = client._get_store()
+    if store is not None:
+        count = store.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        text += f"\n{t('diag_store', path=store.path, count=count, ranges=len(store.covered))}"
+    else:
+        text += f"\n{t('diag_store_off')}"
+    results = client._get_results()
+    if results is not None:
+        text += f"\n{t('diag_results', **results.stats())}"
+    else:
+        text += f"\n{t('diag_results_off')}"
+    if responses is not None:
+        info = responses.stats()
+        text += f"\n{t('diag_responses', kb=round(info.pop('bytes') / 1024, 1), **info)}"
+    else:
+        text += f"\n{t('diag_responses_off')}"
+    warm = tenant().warm
+    text += f"\n{t('diag_warm', **warm.stats())}" if warm is not None else f"\n{t('diag_warm_off')}"
+    if profiler is not None:
+        text += f"\n{t('diag_profile', path=profiler.directory, slow=PROFILE_SLOW_MS, mb=round(PROFILE_MEMORY_BYTES / 1048576, 1), dumps=profiler.dumps)}"
+    else:
+        text += f"\n{t('diag_profile_off')}"
+    if daemon is not None:
+        info = await daemon.stats()
+        if info is not None:
+            text += f"\n{t('diag_daemon', path=daemon.socket_path, **info)}"
+        else:
+            text += f"\n{t('diag_daemon_down', path=daemon.socket_path, fallbacks=daemon.fallbacks)}"
+    else:
+        text += f"\n{t('diag_daemon_off')}"
+    if client.tuner is not None:
+        text += f"\n{t('diag_tuning', **client.tuner.stats())}"
+    else:
+        text += f"\n{t('diag_tuning_off')}"
+    text += f"\n{t('diag_requests', requests=client.requests, coalesced=client.coalesced)}"
+    text += f"\n{t('diag_retries', retries=client.retries, hedged=client.hedged, hedge_wins=client.hedge_wins)}"
+    if tenants:
+        ten = tenant()
+        waited = ten.limiter.waited if ten.limiter is not None else 0
+        text += f"\n{t('diag_tenant', tenant=ten.id, count=len(tenants), active=sum(x.client is not None for x in tenants.values()), waited=waited)}"
+    return [TextContent(type="text", text=text)]
+
+
+async def server_metrics(fmt: str = "text", reset: bool = False) -> list[TextContent]:
+    if fmt == "prometheus":
+        text = metrics.prometheus()
+    elif fmt == "json":
+        text = json.dumps(metrics.snapshot(), ensure_ascii=False, indent=2)
+    else:
+        text = format_metrics(metrics.snapshot())
+    if reset:
+        metrics.reset()
+        if fmt == "text":
+            text += f"\n\n{t('metrics_reset')}"
+    return [TextContent(type="text", text=text)]
+
+
+def format_metrics(snapshot: dict) -> str:
+    """Text rendering of Metrics.snapshot()."""
+    text = f"📈 {t('metrics_title', uptime=snapshot['uptime_s'])}\n"
+    if not snapshot["tools"]:
+        return text + f"\n{t('metrics_empty')}"
+    text += f"\n{t('metrics_tools')}"
+    for tool, info in snapshot["tools"].items():
+        text += f"\n• {t('metrics_tool', tool=tool, **info, p50=info['p50_ms'], p95=info['p95_ms'], p99=info['p99_ms'])}"
+        if info["phases_mean_ms"]:
+            phases = ", ".join(f"{phase} {ms}" for phase, ms in info["phases_mean_ms"].items())
+            text += f"\n  {t('metrics_phases', phases=phases)}"
+    if snapshot["upstream"]:
+        text += f"\n\n{t('metrics_upstream')}"
+        for endpoint, info in snapshot["upstream"].items():
+            status = ", ".join(f"{code}×{n}" for code, n in info["status"].items())
+            line = t(
+                "metrics_endpoint", endpoint=endpoint, count=info["count"], kb=round(info["bytes"] / 1024, 1),
+                p50=info["p50_ms"], p95=info["p95_ms"], p99=info["p99_ms"], status=status,
+            )
+            text += f"\n• {line}"
+    text += f"\n\n{t('metrics_recent')}"
+    for call in reversed(snapshot["recent"]):
+        flags = " (cache)" if call["cached"] else ""
+        flags += " (error)" if call["error"] else ""
+        text += f"\n• {t('metrics_call', tool=call['tool'], wall=call['wall_ms'], requests=call['requests'], pages=call['pages'], flags=flags)}"
+    return text
+
+
 def main():
     """Main entry point."""
+    parser = argparse.ArgumentParser(prog="nightscout-mcp", description="MCP server for Nightscout CGM data")
+    parser.add_argument("--transport", choices=("stdio", "http"), default=TRANSPORT, help="stdio (default) or streamable HTTP")
+    parser.add_argument("--host", default=HTTP_HOST, help=f"HTTP listen address (default {HTTP_HOST})")
+    parser.add_argument("--port", type=int, default=HTTP_PORT, help=f"HTTP port (default {HTTP_PORT})")
+    args = parser.parse_args()
+
     async def run():
-        async with stdio_server() as (read_stream, write_stream):
-            await server.run(read_stream, write_stream, server.create_initialization_options())
+        warm_tasks = []
+        if default_tenant.url:
+            # Probe the default site while the client connects; tenants are probed on first use
+            warm_tasks.append(asyncio.create_task(tenant_client(default_tenant).ensure_capabilities()))
+        for ten in {default_tenant, *tenants.values()}:
+            if ten.warm_sync and ten.url:
+                tenant_client(ten)
+                warm_tasks.append(asyncio.create_task(run_warm_sync(ten)))
+        try:
+            if args.transport == "http":
+                from .http_app import serve_http
+
+                await serve_http(server, args.host, args.port, HTTP_MAX_SESSIONS, HTTP_MAX_INFLIGHT, HTTP_SESSION_IDLE_S)
+            else:
+                async with stdio_server() as (read_stream, write_stream):
+                    await server.run(read_stream, write_stream, server.create_initialization_options())
+        finally:
+            for task in warm_tasks:
+                task.cancel()
+            await asyncio.gather(*warm_tasks, return_exceptions=True)
+            for ten in {default_tenant, *tenants.values()}:
+                if ten.client is not None:
+                    await ten.client.aclose()
     
     asyncio.run(run())
 
@@ -0,0 +1,382 @@
+"""Glucose statistics: mergeable histograms and single-pass accumulators."""
+
+import json
+import math
+from array import array
+from collections import Counter
+from collections.abc import Iterable
+
+try:
+    import numpy as np
+except ImportError:  # optional fast path: pip install "nightscout-mcp[fast]"
+    np = None
+
+# Histogram bins cover every integer mg/dL value in [HIST_MIN, HIST_MAX];
+# rare readings above HIST_MAX are kept exactly in an overflow dict
+HIST_MIN = 40
+HIST_MAX = 400
+HIST_BINS = HIST_MAX - HIST_MIN + 1
+
+# Below this many values the plain Python loop beats converting to an array
+FAST_PATH_MIN_VALUES = 64
+
+
+def as_sgv_array(values: Iterable[float]) -> "np.ndarray | None":
+    """Convert SGV values to a NumPy array, or None without NumPy.
+
+    Whole-number values give an int64 array; if any value has a fraction
+    the array stays float64, so nothing is truncated. Small sized inputs
+    also return None: array setup would cost more than the pure-Python loop.
+    """
+    if np is None:
+        return None
+    if isinstance(values, np.ndarray):
+        arr = values
+    elif hasattr(values, "__len__"):
+        if len(values) < FAST_PATH_MIN_VALUES:
+            return None
+        if isinstance(values, array):
+            arr = np.frombuffer(values, dtype=np.dtype(values.typecode))
+        elif isinstance(sum(values), int):
+            # All Python ints (summing them is cheaper than a float array)
+            return np.fromiter(values, dtype=np.int64, count=len(values))
+        else:
+            arr = np.fromiter(values, dtype=np.float64, count=len(values))
+    else:
+        arr = np.fromiter(values, dtype=np.float64)
+    if arr.dtype.kind in "iub":
+        return arr.astype(np.int64, copy=False)
+    whole = arr.astype(np.int64)
+    return whole if np.array_equal(whole, arr) else arr.astype(np.float64, copy=False)
+
+
+class GlucoseHistogram:
+    """Counts of valid SGV readings per integer mg/dL value.
+
+    Histograms add together, so per-day rollups can be summed into any
+    range, and every statistic (mean, SD, percentiles, time in any range)
+    is derived exactly from the counts.
+    """
+
+    def __init__(self):
+        self.counts = array("I", bytes(4 * HIST_BINS))
+        self.overflow: dict[int, int] = {}
+        # Readings rejected as sensor errors (below HIST_MIN)
+        self.errors = 0
+        # Estimated readings in the whole range when built from a sample
+        self.sample_of: int | None = None
+
+    @classmethod
+    def from_values(cls, values: Iterable[int]) -> "GlucoseHistogram":
+        hist = cls()
+        hist.add_values(values)
+        return hist
+
+    @classmethod
+    def from_record(cls, counts: bytes, overflow: str, errors: int) -> "GlucoseHistogram":
+        """Rebuild a histogram saved with `to_record()`."""
+        hist = cls()
+        hist.counts = array("I", counts)
+        hist.overflow = {int(v): c for v, c in json.loads(overflow).items()}
+        hist.errors = errors
+        return hist
+
+    def to_record(self) -> tuple[bytes, str, int]:
+        """Compact (counts, overflow, errors) form for storage."""
+        return self.counts.tobytes(), json.dumps(self.overflow), self.errors
+
+    def add(self, value: float, count: int = 1) -> None:
+        if not isinstance(value, int):
+            # Bins are whole mg/dL: fractional values go to the nearest one
+            value = round(value)
+        if value < HIST_MIN:
+            self.errors += count
+        elif value <= HIST_MAX:
+            self.counts[value - HIST_MIN] += count
+        else:
+            self.overflow[value] = self.overflow.get(value, 0) + count
+
+    def add_values(self, values: Iterable[int]) -> None:
+        arr = as_sgv_array(values)
+        if arr is not None:
+            self._add_array(arr)
+            return
+        counts = self.counts
+        for value in values:
+            if HIST_MIN <= value <= HIST_MAX and isinstance(value, int):
+                counts[value - HIST_MIN] += 1
+            else:
+                self.add(value)
+
+    def _add_array(self, arr: "np.ndarray") -> None:
+        if arr.dtype.kind == "f":
+            # Same rounding as add(): half to even, like Python's round()
+            arr = np.rint(arr).astype(np.int64)
+        in_bins = arr[(arr >= HIST_MIN) & (arr <= HIST_MAX)]
+        if len(in_bins):
+            # Add in place through a zero-copy view of the counts buffer
+            view = np.frombuffer(self.counts, dtype=np.uint32)
+            view += np.bincount(in_bins - HIST_MIN, minlength=HIST_BINS).astype(np.uint32)
+        self.errors += int(np.count_nonzero(arr < HIST_MIN))
+        above = arr[arr > HIST_MAX]
+        if len(above):
+            for value, c in zip(*np.unique(above, return_counts=True)):
+                self.overflow[int(value)] = self.overflow.get(int(value), 0) + int(c)
+
+    def merge(self, other: "GlucoseHistogram") -> "GlucoseHistogram":
+        """Add another histogram into this one; returns self."""
+        if np is not None:
+            view = np.frombuffer(self.counts, dtype=np.uint32)
+            view += np.frombuffer(other.counts, dtype=np.uint32)
+            for value, c in other.overflow.items():
+                self.overflow[value] = self.overflow.get(value, 0) + c
+            self.errors += other.errors
+            return self
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        for value, c in other.overflow.items():
+            self.overflow[value] = self.overflow.get(value, 0) + c
+        self.errors += other.errors
+        return self
+
+    def items(self) -> Iterable[tuple[int, int]]:
+        """(value, count) pairs in ascending value order, non-zero counts only."""
+        for i, c in enumerate(self.counts):
+            if c:
+                yield HIST_MIN + i, c
+        for value in sorted(self.overflow):
+            yield value, self.overflow[value]
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts) + sum(self.overflow.values())
+
+    def total(self) -> int:
+        return sum(v * c for v, c in self.items())
+
+    def mean(self) -> float:
+        n = self.count
+        return self.total() / n if n else 0.0
+
+    def variance(self) -> float:
+        """Population variance, computed from exact integer sums."""
+        n = self.count
+        if not n:
+            return 0.0
+        total = 0
+        squares = 0
+        for v, c in self.items():
+            total += v * c
+            squares += v * v * c
+        return (n * squares - total * total) / (n * n)
+
+    def min(self) -> int | None:
+        return next((v for v, _ in self.items()), None)
+
+    def max(self) -> int | None:
+        if self.overflow:
+            return max(self.overflow)
+        for i in range(HIST_BINS - 1, -1, -1):
+            if self.counts[i]:
+                return HIST_MIN + i
+        return None
+
+    def count_between(self, low: float | None = None, high: float | None = None, *, low_inclusive: bool = True, high_inclusive: bool = True) -> int:
+        """Number of readings within the given bounds (None means unbounded)."""
+        result = 0
+        for v, c in self.items():
+            if low is not None and (v < low if low_inclusive else v <= low):
+                continue
+            if high is not None and (v > high if high_inclusive else v >= high):
+                break
+            result += c
+        return result
+
+    def percentile(self, p: float) -> float | None:
+        """Percentile with linear interpolation between ranks (numpy's default)."""
+        n = self.count
+        if not n:
+            return None
+        position = (n - 1) * p / 100
+        lower_rank = int(position)
+        fraction = position - lower_rank
+        lower = upper = None
+        seen = 0
+        for v, c in self.items():
+            seen += c
+            if lower is None and seen > lower_rank:
+                lower = v
+            if seen > lower_rank + 1 or (seen > lower_rank and lower_rank + 1 >= n):
+                upper = v
+                break
+        if upper is None:
+            upper = lower
+        return lower + (upper - lower) * fraction
+
+
+class GlucoseAccumulator:
+    """Single-pass glucose statistics that can be merged.
+
+    Keeps count, exact integer sum, Welford running variance, min/max and
+    the time-in-range bucket counters for fixed TIR bounds, so partials
+    for pages, days or months combine with `merge()`.
+    """
+
+    __slots__ = (
+        "low", "high", "count", "total", "mean", "m2", "min", "max",
+        "very_low", "low_count", "in_range", "above_target", "high_count", "very_high",
+    )
+
+    def __init__(self, low: float, high: float):
+        self.low = low
+        self.high = high
+        self.count = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: int | None = None
+        self.max: int | None = None
+        self.very_low = 0       # <54 mg/dL
+        self.low_count = 0      # 54-69 mg/dL
+        self.in_range = 0       # low..high
+        self.above_target = 0   # high..180 mg/dL
+        self.high_count = 0     # 181-250 mg/dL
+        self.very_high = 0      # >250 mg/dL
+
+    @classmethod
+    def from_histogram(cls, hist: GlucoseHistogram, low: float, high: float) -> "GlucoseAccumulator":
+        acc = cls(low, high)
+        for value, count in hist.items():
+            acc.add(value, count)
+        return acc
+
+    def add(self, value: int, count: int = 1) -> None:
+        """Add `count` readings of `value` (weighted Welford update)."""
+        n = self.count + count
+        delta = value - self.mean
+        self.mean += delta * count / n
+        self.m2 += delta * (value - self.mean) * count
+        self.count = n
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value < 54:
+            self.very_low += count
+        elif value < 70:
+            self.low_count += count
+        if self.low <= value <= self.high:
+            self.in_range += count
+        if self.high < value <= 180:
+            self.above_target += count
+        elif 180 < value <= 250:
+            self.high_count += count
+        elif value > 250:
+            self.very_high += count
+
+    def add_values(self, values: Iterable[int]) -> "GlucoseAccumulator":
+        arr = as_sgv_array(values)
+        if arr is not None:
+            if len(arr):
+                self.merge(self._from_array(arr))
+            return self
+        # Counting runs in C; the Welford update then runs once per distinct value
+        for value, count in Counter(values).items():
+            self.add(value, count)
+        return self
+
+    def _from_array(self, arr: "np.ndarray") -> "GlucoseAccumulator":
+        """Vectorized partial for a non-empty int64 or float64 array."""
+        if arr.dtype.kind == "f":
+            return self._from_float_array(arr)
+        part = GlucoseAccumulator(self.low, self.high)
+        n = len(arr)
+        total = int(arr.sum())
+        squares = int(np.dot(arr, arr))
+        part.count = n
+        part.total = total
+        part.mean = total / n
+        # Exact integer sums, one rounding step
+        part.m2 = (n * squares - total * total) / n
+        part.min = int(arr.min())
+        part.max = int(arr.max())
+
+        # Cumulative counts over a bincount of the values: le[i] = #(v <= min + i - 1)
+        le = np.concatenate(([0], np.cumsum(np.bincount(arr - part.min))))
+
+        def count_le(x: float) -> int:
+            idx = math.floor(x) - part.min + 1
+            return int(le[min(max(idx, 0), len(le) - 1)])
+
+        def count_lt(x: float) -> int:
+            return count_le(math.ceil(x) - 1)
+
+        part.very_low = count_lt(54)
+        part.low_count = count_lt(70) - part.very_low
+        part.in_range = max(0, count_le(self.high) - count_lt(self.low))
+        part.above_target = max(0, count_le(180) - count_le(self.high))
+        part.high_count = count_le(250) - count_le(180)
+        part.very_high = n - count_le(250)
+        return part
+
+    def _from_float_array(self, arr: "np.ndarray") -> "GlucoseAccumulator":
+        """Vectorized partial for values with fractions: plain comparisons, no bins."""
+        part = GlucoseAccumulator(self.low, self.high)
+        n = len(arr)
+        part.count = n
+        part.total = float(arr.sum())
+        part.mean = part.total / n
+        deviations = arr - part.mean
+        part.m2 = float(np.dot(deviations, deviations))
+        part.min = _scalar(arr.min())
+        part.max = _scalar(arr.max())
+        part.very_low = int(np.count_nonzero(arr < 54))
+        part.low_count = int(np.count_nonzero(arr < 70)) - part.very_low
+        part.in_range = int(np.count_nonzero((arr >= self.low) & (arr <= self.high)))
+        part.above_target = int(np.count_nonzero((arr > self.high) & (arr <= 180)))
+        part.high_count = int(np.count_nonzero((arr > 180) & (arr <= 250)))
+        part.very_high = int(np.count_nonzero(arr > 250))
+        return part
+
+    def merge(self, other: "GlucoseAccumulator") -> "GlucoseAccumulator":
+        """Combine another partial into this one (Chan et al.); returns self."""
+        if (other.low, other.high) != (self.low, self.high):
+            raise ValueError("Cannot merge accumulators with different TIR bounds")
+        if not other.count:
+            return self
+        if not self.count:
+            for name in self.__slots__[2:]:
+                setattr(self, name, getattr(other, name))
+            return self
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.mean += delta * other.count / n
+        self.count = n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.very_low += other.very_low
+        self.low_count += other.low_count
+        self.in_range += other.in_range
+        self.above_target += other.above_target
+        self.high_count += other.high_count
+        self.very_high += other.very_high
+        return self
+
+    def average(self) -> float:
+        """Mean from the exact integer sum."""
+        return self.total / self.count if self.count else 0.0
+
+    def variance(self) -> float:
+        """Population variance."""
+        return self.m2 / self.count if self.count else 0.0
+
+
+def _scalar(value: "np.floating") -> int | float:
+    """A NumPy float as the Python number it came from (int if whole)."""
+    value = float(value)
+    return int(value) if value.is_integer() else value
@@ -0,0 +1,263 @@
+"""Local SQLite store for CGM entries with synced-range tracking."""
+
+import hashlib
+import os
+import sqlite3
+from collections.abc import Iterator
+
+from .stats import GlucoseHistogram
+
+DAY_MS = 86400000
+
+# Entry fields requested from the server when filling the store
+STORE_FIELDS = ("_id", "identifier", "date", "sgv", "direction", "type", "srvModified", "isValid")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    date INTEGER NOT NULL,
+    sgv INTEGER NOT NULL,
+    direction TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_date ON entries (date);
+CREATE TABLE IF NOT EXISTS ranges (
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    day INTEGER PRIMARY KEY,
+    counts BLOB NOT NULL,
+    overflow TEXT NOT NULL,
+    errors INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def default_cache_dir() -> str:
+    """Directory for on-disk data (NIGHTSCOUT_CACHE_DIR or ~/.cache/nightscout-mcp)."""
+    path = os.environ.get("NIGHTSCOUT_CACHE_DIR", "").strip()
+    if path:
+        return os.path.expanduser(path)
+    base = os.environ.get("XDG_CACHE_HOME", "").strip() or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "nightscout-mcp")
+
+
+def connect_private(path: str) -> sqlite3.Connection:
+    """Open a SQLite file readable by its owner only (journal and WAL files get the same mode)."""
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    os.chmod(path, 0o600)
+    return sqlite3.connect(path, timeout=30.0)
+
+
+def site_key(base_url: str) -> str:
+    """Short stable key for a Nightscout site, used in file names."""
+    return hashlib.sha256(base_url.encode("utf-8")).hexdigest()[:16]
+
+
+def store_path_for(base_url: str) -> str:
+    return os.path.join(default_cache_dir(), f"entries-{site_key(base_url)}.sqlite3")
+
+
+class EntryStore:
+    """SQLite copy of sgv entries: (date, sgv, direction) per reading.
+
+    Tracks which [start, end) ranges have been loaded from the server and
+    the API v3 history cursor, so only gaps and changes are fetched again.
+    Pass ":memory:" for a process-local store.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            try:
+                self.db = connect_private(path)
+            except (OSError, sqlite3.Error):
+                path = ":memory:"
+        if path == ":memory:":
+            self.db = sqlite3.connect(path)
+        self.path = path
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+    @property
+    def covered(self) -> list[tuple[int, int]]:
+        """Sorted, non-overlapping [start, end) ranges already loaded."""
+        return [tuple(r) for r in self.db.execute("SELECT start, end FROM ranges ORDER BY start")]
+
+    @property
+    def last_modified(self) -> int:
+        """History cursor: highest srvModified applied so far."""
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'last_modified'").fetchone()
+        return int(row[0]) if row else 0
+
+    @last_modified.setter
+    def last_modified(self, value: int) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_modified', ?)",
+            (str(int(value)),),
+        )
+        self.db.commit()
+
+    def missing_ranges(self, start_ts: int, end_ts: int) -> list[tuple[int, int]]:
+        """Return the parts of [start_ts, end_ts) that are not loaded yet."""
+        gaps = []
+        cursor = start_ts
+        for covered_start, covered_end in self.covered:
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end_ts:
+                break
+            if covered_start > cursor:
+                gaps.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end_ts:
+            gaps.append((cursor, end_ts))
+        return gaps
+
+    def mark_covered(self, start_ts: int, end_ts: int, loaded_since: int | None = None) -> None:
+        """Record a loaded range; loaded_since seeds the history cursor on first load.
+
+        The cursor must not come from srvModified of the loaded documents:
+        an old range would then replay every change made since it.
+        """
+        if end_ts <= start_ts:
+            return
+        ranges = sorted(self.covered + [(start_ts, end_ts)])
+        merged = [ranges[0]]
+        for range_start, range_end in ranges[1:]:
+            if range_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+            else:
+                merged.append((range_start, range_end))
+        with self.db:
+            self.db.execute("DELETE FROM ranges")
+            self.db.executemany("INSERT INTO ranges (start, end) VALUES (?, ?)", merged)
+        if loaded_since is not None and not self.last_modified:
+            self.last_modified = loaded_since
+
+    def apply(self, docs: list, from_history: bool = False) -> set[int]:
+        """Insert, update or delete entries from a page or history batch.
+
+        Returns the start timestamps of the UTC days that changed.
+        """
+        upserts = []
+        deletes = []
+        days = set()
+        cursor = last_modified = self.last_modified
+        for doc in docs:
+            key = doc.get("identifier") or doc.get("_id")
+            modified = doc.get("srvModified")
+            if from_history and modified and modified > cursor:
+                cursor = modified
+            if doc.get("isValid") is False or doc.get("type", "sgv") != "sgv":
+                if key is not None:
+                    deletes.append((str(key),))
+                continue
+            if "date" not in doc or not doc.get("sgv"):
+                continue
+            if key is None:
+                key = f"{doc['date']}:{doc['sgv']}"
+            upserts.append((str(key), doc["date"], round(doc["sgv"]), doc.get("direction")))
+            days.add(doc["date"] - doc["date"] % DAY_MS)
+        with self.db:
+            if deletes:
+                for (key,) in deletes:
+                    row = self.db.execute("SELECT date FROM entries WHERE id = ?", (key,)).fetchone()
+                    if row:
+                        days.add(row[0] - row[0] % DAY_MS)
+                self.db.executemany("DELETE FROM entries WHERE id = ?", deletes)
+            if upserts:
+                self.db.executemany("INSERT OR REPLACE INTO entries (id, date, sgv, direction) VALUES (?, ?, ?, ?)", upserts)
+            if days:
+                # Rollups of changed days are rebuilt on next use
+                self.db.executemany("DELETE FROM daily_rollups WHERE day = ?", [(d,) for d in days])
+        if cursor != last_modified:
+            self.last_modified = cursor
+        return days
+
+    def iter_range(self, start_ts: int, end_ts: int, page_size: int) -> Iterator[list]:
+        """Yield entries in [start_ts, end_ts) newest first, page_size rows at a time."""
+        query = (
+            "SELECT id, date, sgv, direction FROM entries "
+            "WHERE date >= ? AND (date, id) < (?, ?) "
+            "ORDER BY date DESC, id DESC LIMIT ?"
+        )
+        # (date, id) < (end_ts, "") is exactly date < end_ts
+        last_date, last_id = end_ts, ""
+        while True:
+            rows = self.db.execute(query, (start_ts, last_date, last_id, page_size)).fetchall()
+            if not rows:
+                return
+            yield [{"_id": r[0], "date": r[1], "sgv": r[2], "direction": r[3]} for r in rows]
+            if len(rows) < page_size:
+                return
+            last_date, last_id = rows[-1][1], rows[-1][0]
+
+    def _histogram_from_entries(self, start_ts: int, end_ts: int) -> GlucoseHistogram:
+        hist = GlucoseHistogram()
+        rows = self.db.execute(
+            "SELECT sgv, COUNT(*) FROM entries WHERE date >= ? AND date < ? GROUP BY sgv",
+            (start_ts, end_ts),
+        )
+        for value, count in rows:
+            hist.add(value, count)
+        return hist
+
+    def _is_covered(self, start_ts: int, end_ts: int, covered: list[tuple[int, int]]) -> bool:
+        return any(s <= start_ts and end_ts <= e for s, e in covered)
+
+    def histogram(self, start_ts: int, end_ts: int) -> GlucoseHistogram:
+        """Histogram of readings in [start_ts, end_ts).
+
+        Whole UTC days that are fully synced come from per-day rollups
+        (built once and kept until an entry of that day changes); partial
+        days at the edges are counted from the entries directly.
+        """
+        hist = GlucoseHistogram()
+        first_day = -(-start_ts // DAY_MS) * DAY_MS
+        last_day = end_ts - end_ts % DAY_MS
+        if first_day >= last_day:
+            return hist.merge(self._histogram_from_entries(start_ts, end_ts))
+
+        covered = self.covered
+        stored = {
+            day: (counts, overflow, errors)
+            for day, counts, overflow, errors in self.db.execute(
+                "SELECT day, counts, overflow, errors FROM daily_rollups WHERE day >= ? AND day < ?",
+                (first_day, last_day),
+            )
+        }
+        new_rollups = []
+        uncovered = []
+        for day in range(first_day, last_day, DAY_MS):
+            if day in stored:
+                day_hist = GlucoseHistogram.from_record(*stored[day])
+            elif self._is_covered(day, day + DAY_MS, covered):
+                day_hist = self._histogram_from_entries(day, day + DAY_MS)
+                new_rollups.append((day, *day_hist.to_record()))
+            else:
+                uncovered.append(day)
+                continue
+            hist.merge(day_hist)
+        if new_rollups:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO daily_rollups (day, counts, overflow, errors) VALUES (?, ?, ?, ?)",
+                    new_rollups,
+                )
+        for day in uncovered:
+            hist.merge(self._histogram_from_entries(day, day + DAY_MS))
+        if start_ts < first_day:
+            hist.merge(self._histogram_from_entries(start_ts, first_day))
+        if last_day < end_ts:
+            hist.merge(self._histogram_from_entries(last_day, end_ts))
+        return hist
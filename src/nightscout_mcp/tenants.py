@@ -0,0 +1,131 @@
+"""Tenant registry: several Nightscout sites served by one process.
+
+The tenants file is JSON mapping a tenant id to its site and display
+settings; any setting left out falls back to the environment:
+
+    {
+      "tenants": {
+        "alice": {"url": "https://TOKEN@alice.example.com", "units": "mmol",
+                  "low": 3.9, "high": 10, "timezone": "GMT+3", "locale": "ru"},
+        "bob": {"url": "https://bob.example.com", "api_secret": "<sha1>",
+                "units": "mgdl", "rate_limit": 2}
+      }
+    }
+
+Each tenant gets its own Nightscout client (connection pool, entry store
+and result cache, both keyed by site URL) and its own upstream rate limit.
+"""
+
+import asyncio
+import json
+import re
+import time
+from datetime import timezone
+
+TENANT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+SETTINGS = {
+    "url": str,
+    "api_secret": str,
+    "units": str,
+    "low": (int, float),
+    "high": (int, float),
+    "timezone": str,
+    "locale": str,
+    "rate_limit": (int, float),
+    "warm_sync": bool,
+}
+
+
+class RateLimiter:
+    """Token bucket: `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.waited = 0
+        self._lock: asyncio.Lock | None = None
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def acquire(self) -> None:
+        """Wait for a token; waiters are served in order."""
+        async with self._get_lock():
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                self.waited += 1
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1.0
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
+
+class Tenant:
+    """One Nightscout site with its display settings and lazily created client."""
+
+    def __init__(
+        self,
+        tenant_id: str,
+        url: str,
+        api_secret: str,
+        units: str,
+        low: float,
+        high: float,
+        tz: timezone,
+        tz_label: str,
+        locale: str,
+        rate_limit: float = 0,
+        warm_sync: bool = False,
+    ):
+        self.id = tenant_id
+        self.url = url
+        self.api_secret = api_secret
+        self.units = units
+        # TIR bounds, mg/dL
+        self.low = low
+        self.high = high
+        self.tz = tz
+        self.tz_label = tz_label
+        self.locale = locale
+        self.limiter = RateLimiter(rate_limit) if rate_limit > 0 else None
+        self.warm_sync = warm_sync
+        # Set by the server on first use
+        self.client = None
+        self.warm = None
+
+
+def load_tenants_file(path: str) -> dict[str, dict]:
+    """Tenant settings by id from a tenants file; raises ValueError if malformed."""
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: invalid JSON: {e}") from e
+    tenants = data.get("tenants") if isinstance(data, dict) else None
+    if not isinstance(tenants, dict):
+        raise ValueError(f'{path}: expected {{"tenants": {{"<id>": {{...}}}}}}')
+    result = {}
+    for tenant_id, settings in tenants.items():
+        if not TENANT_ID.match(tenant_id):
+            raise ValueError(f"{path}: invalid tenant id {tenant_id!r}")
+        if not isinstance(settings, dict):
+            raise ValueError(f"{path}: tenant {tenant_id!r}: expected an object")
+        for key, value in settings.items():
+            expected = SETTINGS.get(key)
+            if expected is None:
+                raise ValueError(f"{path}: tenant {tenant_id!r}: unknown setting {key!r}")
+            if not isinstance(value, expected) or (expected is not bool and isinstance(value, bool)):
+                raise ValueError(f"{path}: tenant {tenant_id!r}: invalid {key!r}")
+        if not settings.get("url"):
+            raise ValueError(f"{path}: tenant {tenant_id!r}: url is required")
+        result[tenant_id] = settings
+    return result
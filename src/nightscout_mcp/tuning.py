@@ -0,0 +1,143 @@
+"""Adaptive page size and requests in flight per Nightscout site (AIMD)."""
+
+import json
+import os
+import time
+
+from .store import default_cache_dir, site_key
+
+MIN_PAGE = 100
+MAX_PAGE = 10000
+PAGE_STEP = 500
+# Multiplicative decrease factors
+BACKOFF = 0.5
+SLOW_BACKOFF = 0.75
+# Weight of the newest sample in the moving averages
+EWMA_WEIGHT = 0.2
+# Minimum time between two writes of the state file, s
+SAVE_INTERVAL_S = 30
+# Learned limits older than this are discarded, s
+STATE_TTL_S = 7 * 86400
+
+
+def tuning_path_for(base_url: str) -> str:
+    return os.path.join(default_cache_dir(), f"tuning-{site_key(base_url)}.json")
+
+
+class HostTuner:
+    """Page size and requests in flight for one site, tuned from its responses."""
+
+    def __init__(self, path: str | None, concurrency: int, max_concurrency: int, target_ms: float):
+        self.path = path
+        self.target_ms = target_ms
+        self.max_concurrency = max(1, max_concurrency)
+        self.page_size = MAX_PAGE
+        self.concurrency = float(max(1, min(concurrency, self.max_concurrency)))
+        # Moving averages of response time and transfer rate
+        self.latency_ms: float | None = None
+        self.bytes_per_ms: float | None = None
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._saved = 0.0
+        self._dirty = False
+        self._load()
+
+    @property
+    def inflight(self) -> int:
+        return max(1, int(self.concurrency))
+
+    def observe(self, elapsed_ms: float, status: int, nbytes: int, timeout: bool = False) -> None:
+        """Record one upstream response; status 0 means a transport error."""
+        self.latency_ms = _ewma(self.latency_ms, elapsed_ms)
+        if status and nbytes and elapsed_ms > 0:
+            self.bytes_per_ms = _ewma(self.bytes_per_ms, nbytes / elapsed_ms)
+        if timeout:
+            self._decrease(BACKOFF, BACKOFF)
+        elif status == 0 or status == 429 or status >= 500:
+            self._decrease(BACKOFF, 1.0)
+        elif elapsed_ms > self.target_ms:
+            self._decrease(1.0, SLOW_BACKOFF)
+        elif status < 400 and self.concurrency < self.max_concurrency:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self.increases += 1
+            self._changed()
+
+    def observe_page(self, returned: int, limit: int, elapsed_ms: float, ceiling: int) -> None:
+        """Record a page of entries; full, fast pages let the page size grow up to `ceiling`."""
+        if returned >= limit and limit >= self.page_size and elapsed_ms < self.target_ms / 2 and self.page_size < ceiling:
+            self.page_size = min(ceiling, self.page_size + PAGE_STEP)
+            self.increases += 1
+            self._changed()
+
+    def cap_page(self, ceiling: int) -> None:
+        """Apply the route's own page cap (API v3: 1000), so decreases take effect right away."""
+        self.page_size = max(MIN_PAGE, min(self.page_size, ceiling))
+
+    def _decrease(self, concurrency_factor: float, page_factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency_ms or 0) / 1000:
+            return
+        self._last_decrease = now
+        self.concurrency = max(1.0, self.concurrency * concurrency_factor)
+        self.page_size = max(MIN_PAGE, int(self.page_size * page_factor))
+        self.decreases += 1
+        self._changed()
+
+    def _changed(self) -> None:
+        self._dirty = True
+        if time.monotonic() - self._saved >= SAVE_INTERVAL_S:
+            self.save()
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if time.time() - float(state["updated"]) > STATE_TTL_S:
+                return
+            page_size = int(state["page_size"])
+            concurrency = float(state["concurrency"])
+        except (OSError, ValueError, TypeError, KeyError):
+            return
+        self.page_size = max(MIN_PAGE, min(MAX_PAGE, page_size))
+        self.concurrency = max(1.0, min(float(self.max_concurrency), concurrency))
+        latency_ms = state.get("latency_ms")
+        if isinstance(latency_ms, (int, float)):
+            self.latency_ms = float(latency_ms)
+
+    def save(self) -> None:
+        """Write the learned limits if they changed (atomically; errors are ignored)."""
+        self._saved = time.monotonic()
+        if not self.path or not self._dirty:
+            return
+        state = {
+            "page_size": self.page_size,
+            "concurrency": round(self.concurrency, 3),
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "updated": time.time(),
+        }
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            return
+        self._dirty = False
+
+    def stats(self) -> dict:
+        return {
+            "page_size": self.page_size,
+            "inflight": self.inflight,
+            "latency_ms": round(self.latency_ms or 0.0, 1),
+            "kb_per_s": round((self.bytes_per_ms or 0.0) * 1000 / 1024, 1),
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+def _ewma(average: float | None, value: float) -> float:
+    return value if average is None else average + EWMA_WEIGHT * (value - average)
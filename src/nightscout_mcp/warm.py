@@ -0,0 +1,90 @@
+"""Warm set: recent data kept in memory by a background poller."""
+
+from statistics import median
+
+from .series import GlucoseSeries
+
+# Used until enough readings are seen to learn the upload cadence
+DEFAULT_CADENCE_MS = 5 * 60 * 1000
+# Learned cadence is clamped to this range
+MIN_CADENCE_MS = 60 * 1000
+MAX_CADENCE_MS = 15 * 60 * 1000
+# Number of recent reading intervals the cadence is learned from
+CADENCE_SAMPLES = 12
+
+
+class WarmSet:
+    """Last `window_ms` of readings, latest device status and status document.
+
+    Readings are kept as a compact GlucoseSeries. The set answers only
+    while it is fresh: a poll succeeded within one upload cadence plus
+    `lag_ms` and `retry_ms`.
+    """
+
+    def __init__(self, window_ms: int, lag_ms: int, retry_ms: int):
+        self.window_ms = window_ms
+        self.lag_ms = lag_ms
+        self.retry_ms = retry_ms
+        self.series = GlucoseSeries()
+        # Start of the range the series is complete for
+        self.covers_from: int | None = None
+        self.latest_entry: dict | None = None
+        self.devicestatus: list = []
+        self.status: dict | None = None
+        self.status_at: int | None = None
+        self.synced_at: int | None = None
+        self.polls = 0
+        self.hits = 0
+
+    def cadence_ms(self) -> int:
+        """Median interval between recent readings, ignoring duplicates."""
+        recent = self.series.dates[-(CADENCE_SAMPLES + 1):]
+        gaps = [b - a for a, b in zip(recent, recent[1:]) if b > a]
+        if not gaps:
+            return DEFAULT_CADENCE_MS
+        return int(min(max(median(gaps), MIN_CADENCE_MS), MAX_CADENCE_MS))
+
+    def latest_date(self) -> int | None:
+        dates = list(self.series.dates[-1:])
+        if self.latest_entry and self.latest_entry.get("date"):
+            dates.append(self.latest_entry["date"])
+        return max(dates) if dates else None
+
+    def next_poll_delay(self, now_ms: int) -> int:
+        """Milliseconds until just after the next reading is due."""
+        latest = self.latest_date()
+        if latest is None:
+            return self.retry_ms
+        due = latest + self.cadence_ms() + self.lag_ms
+        return due - now_ms if due > now_ms else self.retry_ms
+
+    def is_fresh(self, now_ms: int) -> bool:
+        if self.synced_at is None:
+            return False
+        return now_ms - self.synced_at <= self.cadence_ms() + self.lag_ms + self.retry_ms
+
+    def covers(self, start_ts: int, now_ms: int) -> bool:
+        """True if readings since start_ts can be served from memory."""
+        return self.is_fresh(now_ms) and self.covers_from is not None and start_ts >= self.covers_from
+
+    def replace_since(self, since_ts: int, fetched: GlucoseSeries) -> None:
+        """Replace the readings from since_ts on with a freshly fetched series."""
+        self.series.replace_from(since_ts, fetched)
+        if self.covers_from is None or since_ts < self.covers_from:
+            self.covers_from = since_ts
+
+    def trim(self, now_ms: int) -> None:
+        """Drop readings older than the window."""
+        cutoff = now_ms - self.window_ms
+        self.series.trim_before(cutoff)
+        if self.covers_from is not None and self.covers_from < cutoff:
+            self.covers_from = cutoff
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.series),
+            "kb": round(self.series.nbytes / 1024, 1),
+            "cadence": round(self.cadence_ms() / 1000),
+            "polls": self.polls,
+            "hits": self.hits,
+        }
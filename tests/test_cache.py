@@ -0,0 +1,66 @@
+"""ResultCache: histograms of closed periods and their invalidation."""
+
+import time
+
+from nightscout_mcp.cache import ResultCache
+from nightscout_mcp.stats import GlucoseHistogram
+from nightscout_mcp.store import DAY_MS, EntryStore
+
+GRACE_MS = 2 * DAY_MS
+# Midnight UTC thirty days ago: periods from here are long closed
+BASE = int(time.time() * 1000) // DAY_MS * DAY_MS - 30 * DAY_MS
+
+
+def histogram(*values: int) -> GlucoseHistogram:
+    return GlucoseHistogram.from_values(values)
+
+
+def test_closed_period_is_reused():
+    cache = ResultCache(":memory:", GRACE_MS)
+    cache.put(BASE, BASE + DAY_MS, histogram(100, 150, 200))
+    hist = cache.get(BASE, BASE + DAY_MS)
+    assert hist is not None and dict(hist.items()) == {100: 1, 150: 1, 200: 1}
+    assert cache.get(BASE, BASE + 2 * DAY_MS) is None
+    assert (cache.hits, cache.misses, cache.stores) == (1, 1, 1)
+
+
+def test_open_period_is_not_stored():
+    cache = ResultCache(":memory:", GRACE_MS)
+    now = int(time.time() * 1000)
+    cache.put(now - DAY_MS, now, histogram(100))
+    assert cache.stats()["entries"] == 0
+    assert cache.get(now - DAY_MS, now) is None
+
+
+def test_invalidate_days_drops_only_overlapping_periods():
+    cache = ResultCache(":memory:", GRACE_MS)
+    cache.put(BASE, BASE + DAY_MS, histogram(100))
+    cache.put(BASE + DAY_MS, BASE + 2 * DAY_MS, histogram(110))
+    cache.put(BASE, BASE + 7 * DAY_MS, histogram(120))
+    cache.put(BASE + 3 * DAY_MS, BASE + 4 * DAY_MS, histogram(130))
+    cache.invalidate_days({BASE + DAY_MS})
+    assert cache.get(BASE, BASE + DAY_MS) is not None
+    assert cache.get(BASE + DAY_MS, BASE + 2 * DAY_MS) is None
+    assert cache.get(BASE, BASE + 7 * DAY_MS) is None
+    assert cache.get(BASE + 3 * DAY_MS, BASE + 4 * DAY_MS) is not None
+    assert cache.invalidations == 2
+
+
+def test_history_change_invalidates_its_day():
+    store = EntryStore(":memory:")
+    cache = ResultCache(":memory:", GRACE_MS)
+    store.apply([{"_id": "a", "date": BASE + DAY_MS + 1000, "sgv": 100}])
+    cache.put(BASE, BASE + DAY_MS, histogram(90))
+    cache.put(BASE + DAY_MS, BASE + 2 * DAY_MS, histogram(100))
+    cache.invalidate_days(store.apply([{"_id": "a", "isValid": False, "srvModified": 1}], from_history=True))
+    assert cache.get(BASE, BASE + DAY_MS) is not None
+    assert cache.get(BASE + DAY_MS, BASE + 2 * DAY_MS) is None
+
+
+def test_results_survive_reopening(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    cache = ResultCache(path, GRACE_MS)
+    cache.put(BASE, BASE + DAY_MS, histogram(100, 300, 420))
+    cache.close()
+    hist = ResultCache(path, GRACE_MS).get(BASE, BASE + DAY_MS)
+    assert hist is not None and hist.max() == 420 and hist.count == 3
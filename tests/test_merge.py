@@ -0,0 +1,37 @@
+"""merge_entry_pages: pages from concurrent windows into one newest-first list."""
+
+from nightscout_mcp.server import STATS_FIELDS, merge_entry_pages
+
+MINUTE = 60000
+
+
+def window(start: int, end: int, fields: tuple[str, ...] | None = None) -> list[dict]:
+    """Readings every 5 minutes in [start, end) minutes, newest first, as the server pages them."""
+    entries = []
+    for minute in range(end - 5, start - 1, -5):
+        entry = {"_id": f"id{minute}", "date": minute * MINUTE, "sgv": 100 + minute % 50, "type": "sgv"}
+        entries.append({k: entry[k] for k in fields} if fields else entry)
+    return entries
+
+
+def test_overlapping_projected_windows_count_each_reading_once():
+    pages = [window(60, 120, STATS_FIELDS), window(0, 90, STATS_FIELDS)]
+    assert "_id" not in pages[0][0]
+    merged = merge_entry_pages(pages)
+    assert len(merged) == len(window(0, 120))
+    assert [e["date"] for e in merged] == sorted((e["date"] for e in merged), reverse=True)
+
+
+def test_overlapping_full_windows_are_merged_by_id():
+    merged = merge_entry_pages([window(0, 60), window(30, 90), window(60, 120)])
+    assert [e["_id"] for e in merged] == [e["_id"] for e in window(0, 120)]
+
+
+def test_same_date_different_value_is_kept():
+    pages = [[{"date": 5 * MINUTE, "sgv": 100}], [{"date": 5 * MINUTE, "sgv": 101}]]
+    assert len(merge_entry_pages(pages)) == 2
+
+
+def test_empty_pages():
+    assert merge_entry_pages([]) == []
+    assert merge_entry_pages([[], []]) == []
@@ -0,0 +1,95 @@
+"""Single-pass statistics against the original multi-pass formulas."""
+
+import random
+
+import pytest
+
+from nightscout_mcp import server as ns
+from nightscout_mcp import stats
+
+TIR_RANGES = [(70, 140), (3.9 * 18.0182, 10.0 * 18.0182), (70, 180), (80, 260)]
+
+
+def reference_stats(sgv_values: list, low: float, high: float) -> dict:
+    """calculate_stats as it was before the accumulator, with the TIR range as arguments."""
+    n = len(sgv_values)
+    avg = sum(sgv_values) / n
+    variance = sum((v - avg) ** 2 for v in sgv_values) / n
+    std_dev = variance ** 0.5
+    cv = (std_dev / avg * 100) if avg > 0 else 0
+    return {
+        "count": n,
+        "avg": round(avg, 1),
+        "avg_formatted": ns.format_glucose_short(avg),
+        "std_dev": round(std_dev, 1),
+        "std_dev_formatted": ns.format_glucose_short(std_dev),
+        "cv": round(cv, 1),
+        "min": min(sgv_values),
+        "max": max(sgv_values),
+        "tir": round(sum(1 for v in sgv_values if low <= v <= high) / n * 100, 1),
+        "very_low_pct": round(sum(1 for v in sgv_values if v < 54) / n * 100, 1),
+        "low_pct": round(sum(1 for v in sgv_values if 54 <= v < 70) / n * 100, 1),
+        "above_target_pct": round(sum(1 for v in sgv_values if high < v <= 180) / n * 100, 1),
+        "high_pct": round(sum(1 for v in sgv_values if 180 < v <= 250) / n * 100, 1),
+        "very_high_pct": round(sum(1 for v in sgv_values if v > 250) / n * 100, 1),
+        "a1c": round((avg + 46.7) / 28.7, 1),
+    }
+
+
+def synthetic_values(n: int, seed: int, fractional: bool) -> list:
+    rng = random.Random(seed)
+    values = []
+    level = 120.0
+    for _ in range(n):
+        level += rng.gauss(0, 4) + (130 - level) * 0.02
+        level = min(max(level, 40), 420)
+        values.append(round(level, 1) if fractional else int(round(level)))
+    return values
+
+
+@pytest.fixture(params=["python", "numpy"])
+def path(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(stats, "np", None)
+    elif stats.np is None:
+        pytest.skip("NumPy is not installed")
+    return request.param
+
+
+@pytest.mark.parametrize("n", [10, 1000, 20000])
+@pytest.mark.parametrize("fractional", [False, True])
+@pytest.mark.parametrize("low,high", TIR_RANGES)
+def test_calculate_stats_matches_reference(path, n, fractional, low, high):
+    values = synthetic_values(n, seed=n, fractional=fractional)
+    assert ns.calculate_stats(values, low, high) == reference_stats(values, low, high)
+
+
+def test_fractional_values_are_not_truncated(path):
+    values = [120.6] * 70 + [100] * 10
+    result = ns.calculate_stats(values, 70, 180)
+    assert result["avg"] == 118.0
+    assert result["max"] == 120.6
+    assert result == reference_stats(values, 70, 180)
+
+
+def test_merged_partials_match_one_pass(path):
+    values = synthetic_values(5000, seed=7, fractional=False)
+    merged = stats.GlucoseAccumulator(70, 180)
+    for i in range(0, len(values), 700):
+        merged.merge(stats.GlucoseAccumulator(70, 180).add_values(values[i:i + 700]))
+    assert ns.accumulator_stats(merged) == reference_stats(values, 70, 180)
+
+
+def test_histogram_matches_reference(path):
+    values = synthetic_values(5000, seed=3, fractional=False)
+    hist = stats.GlucoseHistogram.from_values(values)
+    assert hist.count == len(values)
+    assert hist.mean() == pytest.approx(sum(values) / len(values))
+    assert (hist.min(), hist.max()) == (min(values), max(values))
+    assert hist.count_between(70, 180) == sum(1 for v in values if 70 <= v <= 180)
+
+
+def test_histogram_rounds_fractional_values(path):
+    values = [120.4, 120.6] * 40
+    hist = stats.GlucoseHistogram.from_values(values)
+    assert dict(hist.items()) == {120: 40, 121: 40}
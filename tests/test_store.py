@@ -0,0 +1,96 @@
+"""EntryStore: loaded-range tracking, history changes and daily rollups."""
+
+import os
+import stat
+
+from nightscout_mcp.store import DAY_MS, EntryStore
+
+MINUTE = 60000
+
+
+def reading(minute: int, sgv: int = 120, **extra) -> dict:
+    return {"_id": f"id{minute}", "date": minute * MINUTE, "sgv": sgv, "type": "sgv", **extra}
+
+
+def stored_dates(store: EntryStore, start: int, end: int) -> list[int]:
+    return [e["date"] for page in store.iter_range(start, end, 100) for e in page]
+
+
+def test_missing_ranges_and_merging():
+    store = EntryStore(":memory:")
+    assert store.missing_ranges(0, 100) == [(0, 100)]
+    store.mark_covered(10, 20)
+    store.mark_covered(40, 50)
+    assert store.missing_ranges(0, 100) == [(0, 10), (20, 40), (50, 100)]
+    assert store.missing_ranges(12, 18) == []
+    # Touching and overlapping ranges merge into one
+    store.mark_covered(20, 45)
+    assert store.covered == [(10, 50)]
+    assert store.missing_ranges(0, 60) == [(0, 10), (50, 60)]
+    store.mark_covered(30, 30)
+    assert store.covered == [(10, 50)]
+
+
+def test_history_cursor_is_seeded_once():
+    store = EntryStore(":memory:")
+    store.mark_covered(0, 10, loaded_since=500)
+    store.mark_covered(10, 20, loaded_since=900)
+    assert store.last_modified == 500
+
+
+def test_history_updates_and_deletes():
+    store = EntryStore(":memory:")
+    store.apply([reading(m) for m in range(0, 60, 5)])
+    store.mark_covered(0, 60 * MINUTE)
+    changed = store.apply(
+        [
+            reading(10, sgv=180, srvModified=1000),
+            {"_id": "id20", "date": 20 * MINUTE, "isValid": False, "srvModified": 1200},
+            {"_id": "id25", "type": "mbg", "srvModified": 1100},
+        ],
+        from_history=True,
+    )
+    assert changed == {0}
+    assert store.last_modified == 1200
+    entries = {e["_id"]: e for page in store.iter_range(0, 60 * MINUTE, 100) for e in page}
+    assert entries["id10"]["sgv"] == 180
+    assert "id20" not in entries and "id25" not in entries
+    assert len(entries) == 10
+
+
+def test_deleting_unknown_entry_changes_nothing():
+    store = EntryStore(":memory:")
+    store.apply([reading(0)])
+    assert store.apply([{"_id": "gone", "isValid": False}], from_history=True) == set()
+    assert stored_dates(store, 0, MINUTE) == [0]
+
+
+def test_iter_range_pages_newest_first_without_gaps():
+    store = EntryStore(":memory:")
+    # Two readings share a date: paging must not skip or repeat either
+    store.apply([reading(m) for m in range(0, 500, 5)] + [{"_id": "dup", "date": 250 * MINUTE, "sgv": 90}])
+    dates = [e["date"] for page in store.iter_range(100 * MINUTE, 400 * MINUTE, 7) for e in page]
+    assert len(dates) == 61
+    assert dates == sorted(dates, reverse=True)
+    assert dates[0] < 400 * MINUTE and dates[-1] >= 100 * MINUTE
+
+
+def test_rollups_follow_history_changes():
+    store = EntryStore(":memory:")
+    day_minutes = DAY_MS // MINUTE
+    store.apply([reading(m, sgv=100) for m in range(0, 2 * day_minutes, 5)])
+    store.mark_covered(0, 2 * DAY_MS)
+    assert store.histogram(0, 2 * DAY_MS).mean() == 100
+    store.apply([reading(5, sgv=388, srvModified=1)], from_history=True)
+    hist = store.histogram(0, 2 * DAY_MS)
+    assert hist.count == 2 * day_minutes // 5
+    assert hist.max() == 388
+
+
+def test_store_file_is_owner_only(tmp_path):
+    path = tmp_path / "cache" / "entries.sqlite3"
+    store = EntryStore(str(path))
+    store.apply([reading(0)])
+    store.close()
+    assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
@@ -0,0 +1,96 @@
+"""Tenant isolation of HTTP sessions."""
+
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from nightscout_mcp import server as ns
+from nightscout_mcp.http_app import MCP_PATH, TENANT_HEADER, build_app
+
+ACCEPT = {"accept": "application/json, text/event-stream"}
+
+
+class Unreachable:
+    """Client stand-in recording which tenant a call reached."""
+
+    def __init__(self, tenant_id: str, reached: list[str]):
+        self.tenant_id = tenant_id
+        self.reached = reached
+
+    def __getattr__(self, name: str):
+        self.reached.append(self.tenant_id)
+        raise RuntimeError("no network in tests")
+
+
+@pytest.fixture
+def reached(monkeypatch):
+    """Tenants alice and bob, no usable default; returns the tenants reached."""
+    reached: list[str] = []
+    tenants = {k: ns.make_tenant(k, {"url": f"https://{k}.example"}) for k in ("alice", "bob")}
+    for ten in tenants.values():
+        ten.client = Unreachable(ten.id, reached)
+    monkeypatch.setattr(ns, "tenants", tenants)
+    monkeypatch.setattr(ns, "default_tenant", ns.Tenant(
+        "default", "", "", "mg/dl", 70, 180, ns.DISPLAY_TZ, ns.DISPLAY_TZ_LABEL, "en",
+    ))
+    monkeypatch.setattr(ns, "responses", None)
+    monkeypatch.setattr(ns, "daemon", None)
+    return reached
+
+
+@pytest.fixture
+def client():
+    app, _ = build_app(ns.server, max_sessions=10, max_inflight=10, idle_s=600)
+    with TestClient(app) as client:
+        yield client
+
+
+def rpc(client: TestClient, session: str | None, method: str, params: dict, headers: dict | None = None) -> dict:
+    headers = {**ACCEPT, **(headers or {})}
+    if session:
+        headers["mcp-session-id"] = session
+    body = {"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+    response = client.post(MCP_PATH, json=body, headers=headers)
+    assert response.status_code == 200, response.text
+    for line in response.text.splitlines():
+        if line.startswith("data:"):
+            return {**json.loads(line[5:]), "session": response.headers.get("mcp-session-id")}
+    return {**response.json(), "session": response.headers.get("mcp-session-id")}
+
+
+def open_session(client: TestClient, headers: dict | None = None) -> str:
+    params = {"protocolVersion": "2025-06-18", "capabilities": {}, "clientInfo": {"name": "test", "version": "0"}}
+    session = rpc(client, None, "initialize", params, headers)["session"]
+    notice = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+    client.post(MCP_PATH, json=notice, headers={**ACCEPT, "mcp-session-id": session})
+    return session
+
+
+def call(client: TestClient, session: str, arguments: dict, headers: dict | None = None) -> str:
+    result = rpc(client, session, "tools/call", {"name": "status", "arguments": arguments}, headers)
+    return result["result"]["content"][0]["text"]
+
+
+def test_session_uses_its_own_tenant(client, reached):
+    bob = open_session(client, {TENANT_HEADER: "bob"})
+    call(client, bob, {})
+    call(client, bob, {"tenant": "bob"})
+    assert reached == ["bob", "bob"]
+
+
+def test_other_session_cannot_reach_a_tenant(client, reached):
+    open_session(client, {TENANT_HEADER: "alice"})
+    bob = open_session(client, {TENANT_HEADER: "bob"})
+    assert "bound to another tenant" in call(client, bob, {"tenant": "alice"})
+    # Naming the tenant on later requests does not rebind the session
+    assert "bound to another tenant" in call(client, bob, {"tenant": "alice"}, {TENANT_HEADER: "alice"})
+    assert reached == []
+
+
+def test_unbound_session_cannot_name_a_tenant(client, reached):
+    session = open_session(client)
+    assert "bound to another tenant" in call(client, session, {"tenant": "alice"})
+    assert "X-Nightscout-Tenant" in call(client, session, {})
+    assert "X-Nightscout-Tenant" in call(client, session, {}, {TENANT_HEADER: "alice"})
+    assert reached == []
@@ -0,0 +1,49 @@
+"""Tool calls through call_tool: response caching."""
+
+import asyncio
+
+import pytest
+
+from nightscout_mcp import server as ns
+from nightscout_mcp.cache import ResponseCache
+from nightscout_mcp.stats import GlucoseHistogram
+
+
+@pytest.fixture
+def monthly(monkeypatch):
+    """analyze_monthly over a client whose second month fails; returns the call count."""
+    calls = []
+
+    async def entries_histograms(boundaries):
+        calls.append(boundaries)
+        hists = [GlucoseHistogram.from_values([100, 150, 200]) for _ in boundaries[:-1]]
+        if len(hists) > 1:
+            hists[1] = RuntimeError("timed out")
+        return hists
+
+    monkeypatch.setattr(ns, "responses", ResponseCache(1 << 20))
+    monkeypatch.setattr(ns, "daemon", None)
+    monkeypatch.setattr(ns.current_client(), "entries_histograms", entries_histograms)
+    return calls
+
+
+def call(name: str, arguments: dict) -> str:
+    return asyncio.run(ns.call_tool(name, arguments))[0].text
+
+
+def test_result_with_failed_month_is_not_cached(monthly):
+    args = {"year": 2024, "fromMonth": 1, "toMonth": 3}
+    assert "Error: timed out" in call("analyze_monthly", args)
+    assert "Error: timed out" in call("analyze_monthly", args)
+    assert len(monthly) == 2
+    assert len(ns.responses) == 0
+    assert not ns._partial_result.get()
+
+
+def test_complete_result_is_cached(monthly):
+    args = {"year": 2024, "fromMonth": 1, "toMonth": 1}
+    first = call("analyze_monthly", args)
+    assert "Error" not in first
+    assert call("analyze_monthly", args) == first
+    assert len(monthly) == 1
+    assert len(ns.responses) == 1